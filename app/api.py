@@ -0,0 +1,528 @@
+"""
+HTTP API над db.py (tornado) - для ERP и портала партнёров
+
+    python manage.py serve-api [--port 8502] [--processes 1]
+
+Маршруты (все ответы - JSON, списки можно получить в Arrow IPC: заголовок
+Accept: application/vnd.apache.arrow.stream или параметр ?format=arrow):
+
+    GET    /api/health
+    GET    /api/products?type=&search=&has_time=1|0&sort=&offset=&limit=
+    GET    /api/products/search?q=&limit=&type=&has_time=
+    POST   /api/products                      объект или список объектов
+    GET    /api/products/{id}
+    PUT    /api/products/{id}                 изменяемые поля
+    DELETE /api/products/{id}
+    GET    /api/products/{id}/production-times
+    POST   /api/products/{id}/production-times {"workshop_id" | "workshop_name", "production_time"}
+    DELETE /api/production-times/{id}
+    GET    /api/workshops
+    GET    /api/product-types
+    GET    /api/material-types
+    POST   /api/calculate                     {"product_type", "material", "param1", "param2", "quantity"}
+                                              или {"items": [...]} - пакетный расчёт
+    GET    /metrics                           метрики в формате Prometheus
+
+Обработчики асинхронные: вызовы db.py (psycopg2, блокирующие) выполняются
+в пуле потоков размером с пул подключений, цикл событий не ждёт базу. На GET
+tornado ставит ETag (хэш тела) и отвечает 304 на If-None-Match; тела
+редко меняющихся справочников сериализуются один раз на версию кэша.
+Изменения из других процессов сбрасывают кэш через notifications.py
+(LISTEN/NOTIFY). Ошибки базы не превращаются в пустые ответы: если база
+недоступна - 503 (и /api/health тоже 503), прочие ошибки - 500.
+"""
+import io
+import os
+import sys
+import json
+import decimal
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2
+import psycopg2.errors
+from psycopg2 import pool as pg_pool
+import tornado.web
+import tornado.ioloop
+import tornado.httpserver
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import db
+import metrics
+import db_async
+import calculator
+import notifications
+
+ARROW_MIME = 'application/vnd.apache.arrow.stream'
+JSON_MIME = 'application/json; charset=utf-8'
+
+DEFAULT_PORT = int(os.getenv('API_PORT', '8502'))
+MAX_LIMIT = int(os.getenv('API_MAX_LIMIT', '10000'))
+
+# id в таблицах - integer; больший id из пути не найдётся (а Postgres ответил бы ошибкой)
+MAX_ID = 2 ** 31 - 1
+
+# колонки Products_import -> имена полей API
+_PRODUCT_COLUMNS = {column: field for field, column in db.PRODUCT_FIELDS.items()}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    """Пул потоков для вызовов db.py (по умолчанию - размер пула подключений)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=int(os.getenv('API_THREADS', str(db.db.pool_max))),
+                thread_name_prefix='api-db',
+            )
+        return _executor
+
+
+def _json_default(value):
+    if hasattr(value, 'item'):
+        # numpy/pandas скаляры
+        return value.item()
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def _records(df):
+    """
+    DataFrame -> список словарей (NaN/NA -> None). Через to_json - он
+    сериализует колонки в C, в разы быстрее поэлементного to_dict.
+    """
+    if df.empty:
+        return []
+    return json.loads(df.to_json(orient='records', force_ascii=False, double_precision=15))
+
+
+def to_json(data):
+    return json.dumps(data, ensure_ascii=False, default=_json_default).encode('utf-8')
+
+
+def to_arrow(data):
+    """DataFrame или список словарей -> Arrow IPC stream"""
+    import pandas as pd
+    import pyarrow as pa
+
+    if isinstance(data, pd.DataFrame):
+        table = pa.Table.from_pandas(data, preserve_index=False)
+    else:
+        table = pa.Table.from_pylist(data)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+# тела справочников: (объект из кэша db, формат) -> байты; объект в кэше db
+# меняется только после сброса, так что сериализуем один раз на версию
+_bodies = {}
+_bodies_lock = threading.Lock()
+
+
+def _cached_body(name, value, fmt, build):
+    with _bodies_lock:
+        cached = _bodies.get((name, fmt))
+        if cached is not None and cached[0] is value:
+            return cached[1]
+    body = build()
+    with _bodies_lock:
+        _bodies[(name, fmt)] = (value, body)
+    return body
+
+
+class APIError(tornado.web.HTTPError):
+    """Ошибка с текстом для клиента"""
+
+    def __init__(self, status_code, message):
+        super().__init__(status_code, reason=None, log_message=message)
+        self.message = message
+
+
+# ошибки, означающие «база недоступна» (а не ошибку в запросе) -> 503
+_UNAVAILABLE_ERRORS = (psycopg2.OperationalError, psycopg2.InterfaceError, pg_pool.PoolError)
+
+
+def _strict_call(func, *args, **kwargs):
+    """Вызов db.py, в котором ошибка базы пробрасывается, а не становится пустым результатом"""
+    with db.raise_errors():
+        return func(*args, **kwargs)
+
+
+def _api_error(error):
+    """ValueError (ошибка во входных данных) -> 400, недоступность базы -> 503"""
+    if isinstance(error, ValueError):
+        return APIError(400, str(error))
+    if isinstance(error, _UNAVAILABLE_ERRORS):
+        return APIError(503, 'база данных недоступна')
+    return None
+
+
+class BaseHandler(tornado.web.RequestHandler):
+
+    def set_default_headers(self):
+        self.set_header('Content-Type', JSON_MIME)
+        # ответы можно хранить, но перед использованием проверять по ETag
+        self.set_header('Cache-Control', 'no-cache')
+        # один и тот же URL отдаёт JSON или Arrow в зависимости от Accept
+        self.set_header('Vary', 'Accept')
+
+    def prepare(self):
+        # все аргументы пути - id строк (\d+ в make_app)
+        for value in self.path_args:
+            if int(value) > MAX_ID:
+                raise APIError(404, f'запись {value} не найдена')
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Блокирующий вызов db.py в пуле потоков. Ошибки базы не подменяются
+        пустым результатом (db.raise_errors): недоступность -> 503, прочие -> 500;
+        ValueError (ошибка во входных данных) -> 400
+        """
+        loop = tornado.ioloop.IOLoop.current()
+        try:
+            return await loop.run_in_executor(executor(), lambda: _strict_call(func, *args, **kwargs))
+        except Exception as e:
+            error = _api_error(e)
+            if error is None:
+                raise
+            raise error from e
+
+    async def gather(self, *calls):
+        """Независимые вызовы db.py параллельно (см. db_async.gather), ошибки - как в run"""
+        calls = [(_strict_call, call) if callable(call) else (_strict_call, *call) for call in calls]
+        try:
+            return await db_async.agather(*calls, pool=executor())
+        except Exception as e:
+            error = _api_error(e)
+            if error is None:
+                raise
+            raise error from e
+
+    def wants_arrow(self):
+        if self.get_query_argument('format', '') == 'arrow':
+            return True
+        return ARROW_MIME in self.request.headers.get('Accept', '')
+
+    def body_json(self):
+        try:
+            return json.loads(self.request.body or b'null')
+        except ValueError:
+            raise APIError(400, 'тело запроса - не JSON')
+
+    def int_argument(self, name, default=None, minimum=None, maximum=None):
+        value = self.get_query_argument(name, None)
+        if value in (None, ''):
+            return default
+        try:
+            value = int(value)
+        except ValueError:
+            raise APIError(400, f'{name} должен быть целым числом')
+        if minimum is not None and value < minimum:
+            raise APIError(400, f'{name} должен быть не меньше {minimum}')
+        if maximum is not None:
+            value = min(value, maximum)
+        return value
+
+    def bool_argument(self, name):
+        value = self.get_query_argument(name, '').lower()
+        if value in ('', 'all'):
+            return None
+        if value in ('1', 'true', 'yes'):
+            return True
+        if value in ('0', 'false', 'no'):
+            return False
+        raise APIError(400, f'{name}: ожидается 1 или 0')
+
+    def send(self, data, status=200, cache_name=None, cache_value=None):
+        """JSON или Arrow (для списков и DataFrame); cache_name - справочник из кэша db"""
+        self.set_status(status)
+        arrow = self.wants_arrow() and not isinstance(data, dict)
+        fmt = 'arrow' if arrow else 'json'
+        if arrow:
+            self.set_header('Content-Type', ARROW_MIME)
+
+        def build():
+            if arrow:
+                return to_arrow(data)
+            return to_json(_records(data) if hasattr(data, 'to_dict') else data)
+
+        if cache_name is not None:
+            self.finish(_cached_body(cache_name, cache_value, fmt, build))
+        else:
+            self.finish(build())
+
+    def write_error(self, status_code, **kwargs):
+        self.set_header('Content-Type', JSON_MIME)
+        error = kwargs.get('exc_info', (None, None))[1]
+        message = error.message if isinstance(error, APIError) else self._reason
+        self.finish(to_json({'error': message}))
+
+    def log_exception(self, typ, value, tb):
+        # ошибки клиента - не в лог сервера
+        if isinstance(value, APIError) and value.status_code < 500:
+            return
+        super().log_exception(typ, value, tb)
+
+    def on_finish(self):
+        route = getattr(self, 'route', type(self).__name__)
+        metrics.registry.observe(
+            'function', f"api.{self.request.method} {route}", self.request.request_time(),
+            error='api' if self.get_status() >= 500 else None,
+        )
+
+
+def _batch_response(handler, result, not_found=False):
+    """Ответ по db.BatchResult: ошибки -> 400 (или 404, если продукт не найден)"""
+    if result.failed:
+        status = 404 if not_found and all('не найден' in reason for _, reason in result.failed) else 400
+        raise APIError(status, '; '.join(reason for _, reason in result.failed))
+
+
+def _product_dict(row):
+    return {_PRODUCT_COLUMNS.get(key, key): value for key, value in row.items()}
+
+
+# ---- обработчики -------------------------------------------------------------
+
+class HealthHandler(BaseHandler):
+    route = '/api/health'
+
+    async def get(self):
+        # настоящий запрос к базе, а не закэшированный счётчик
+        try:
+            await self.run(db.ping)
+        except Exception as e:
+            self.send({'status': 'unavailable', 'error': getattr(e, 'message', str(e))}, status=503)
+            return
+        count = await self.run(db.count_products)
+        self.send({'status': 'ok', 'products': count})
+
+
+class ProductsHandler(BaseHandler):
+    route = '/api/products'
+
+    async def get(self):
+        limit = self.int_argument('limit', 50, minimum=1, maximum=MAX_LIMIT)
+        offset = self.int_argument('offset', 0, minimum=0)
+        df, total = await self.run(
+            db.query_products,
+            filter_type=self.get_query_argument('type', None) or None,
+            search=self.get_query_argument('search', None) or None,
+            has_time=self.bool_argument('has_time'),
+            sort=self.get_query_argument('sort', 'id'),
+            offset=offset,
+            limit=limit,
+        )
+        self.set_header('X-Total-Count', str(total))
+        if self.wants_arrow():
+            self.send(df)
+        else:
+            self.send({'total': total, 'offset': offset, 'limit': limit, 'items': _records(df)})
+
+    async def post(self):
+        payload = self.body_json()
+        many = isinstance(payload, list)
+        records = payload if many else [payload]
+        if not records or not all(isinstance(record, dict) for record in records):
+            raise APIError(400, 'ожидается объект продукта или список объектов')
+
+        result = await self.run(db.add_products_many, records)
+        _batch_response(self, result)
+        self.send({'ids': result.ok} if many else {'id': result.ok[0]}, status=201)
+
+
+class ProductSearchHandler(BaseHandler):
+    route = '/api/products/search'
+
+    async def get(self):
+        query = self.get_query_argument('q', '')
+        if not query.strip():
+            raise APIError(400, 'не задан q')
+        df = await self.run(
+            db.search_products, query,
+            limit=self.int_argument('limit', 50, minimum=1, maximum=MAX_LIMIT),
+            filter_type=self.get_query_argument('type', None) or None,
+            has_time=self.bool_argument('has_time'),
+        )
+        self.send(df if self.wants_arrow() else {'items': _records(df)})
+
+
+class ProductHandler(BaseHandler):
+    route = '/api/products/{id}'
+
+    async def get(self, product_id):
+        row, production_time = await self.gather(
+            (db.get_product_by_id, int(product_id)),
+            (db.get_production_time_for_product_id, int(product_id)),
+        )
+        if row is None:
+            raise APIError(404, f'продукт {product_id} не найден')
+        product = _product_dict(row)
+        product['production_time_h'] = production_time
+        self.send(product)
+
+    async def put(self, product_id):
+        payload = self.body_json()
+        if not isinstance(payload, dict):
+            raise APIError(400, 'ожидается объект с полями продукта')
+        fields = {key: value for key, value in payload.items() if key in db.PRODUCT_FIELDS}
+        if not fields:
+            raise APIError(400, f"нет изменяемых полей ({', '.join(db.PRODUCT_FIELDS)})")
+
+        result = await self.run(db.update_products_many, [{'id': int(product_id), **fields}])
+        _batch_response(self, result, not_found=True)
+        self.send({'id': int(product_id), 'updated': True})
+
+    async def delete(self, product_id):
+        result = await self.run(db.delete_products_many, [int(product_id)])
+        _batch_response(self, result, not_found=True)
+        self.set_status(204)
+        self.finish()
+
+
+class ProductionTimesHandler(BaseHandler):
+    route = '/api/products/{id}/production-times'
+
+    async def get(self, product_id):
+        rows = await self.run(db.get_production_times_for_product_id, int(product_id))
+        self.send(rows if self.wants_arrow() else {'items': rows})
+
+    async def post(self, product_id):
+        payload = self.body_json()
+        if not isinstance(payload, dict):
+            raise APIError(400, 'ожидается объект записи времени производства')
+        record = {key: payload[key] for key in ('workshop_id', 'workshop_name', 'production_time')
+                  if key in payload}
+        record['product_id'] = int(product_id)
+
+        # продукт и цех проверяются до вставки (строка попадает в failed);
+        # внешний ключ ловим на случай удаления между проверкой и вставкой
+        try:
+            result = await self.run(db.add_production_times_many, [record])
+        except psycopg2.errors.ForeignKeyViolation:
+            raise APIError(404, 'продукт или цех не найден')
+        _batch_response(self, result, not_found=True)
+        self.send({'id': result.ok[0]}, status=201)
+
+
+class ProductionTimeHandler(BaseHandler):
+    route = '/api/production-times/{id}'
+
+    async def delete(self, record_id):
+        result = await self.run(db.delete_production_times_many, [int(record_id)])
+        _batch_response(self, result, not_found=True)
+        self.set_status(204)
+        self.finish()
+
+
+class ReferenceHandler(BaseHandler):
+    """Справочники из кэша db: тело сериализуется один раз на версию кэша"""
+
+    def initialize(self, name, loader):
+        self.route = f'/api/{name}'
+        self.name = name
+        self.loader = loader
+
+    async def get(self):
+        rows = await self.run(self.loader)
+        data = rows if self.wants_arrow() else {'items': rows}
+        self.send(data, cache_name=self.name, cache_value=rows)
+
+
+def _calculate_batch(items, factors):
+    import pandas as pd
+
+    plan = pd.DataFrame(items, columns=calculator.BATCH_COLUMNS)
+    result = calculator.calculate_raw_material_batch(plan, factors=factors)
+    return result, calculator.summarize_batch(result)
+
+
+class CalculateHandler(BaseHandler):
+    route = '/api/calculate'
+
+    async def post(self):
+        payload = self.body_json()
+        if not isinstance(payload, dict):
+            raise APIError(400, 'ожидается объект с параметрами расчёта')
+        factors = await self.run(calculator.get_factor_table)
+
+        if 'items' in payload:
+            items = payload['items']
+            if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+                raise APIError(400, 'items - список объектов с параметрами расчёта')
+            # большой план считается в пуле потоков, а не в цикле событий
+            result, summary = await self.run(_calculate_batch, items, factors)
+            if self.wants_arrow():
+                self.send(result)
+            else:
+                self.send({**summary, 'items': _records(result)})
+            return
+
+        missing = [name for name in calculator.BATCH_COLUMNS if name not in payload]
+        if missing:
+            raise APIError(400, f"не заполнены поля: {', '.join(missing)}")
+        try:
+            param1, param2 = float(payload['param1']), float(payload['param2'])
+            quantity = int(payload['quantity'])
+        except (TypeError, ValueError, OverflowError):
+            raise APIError(400, 'param1, param2 - числа, quantity - целое')
+        if param1 < 0 or param2 < 0 or quantity < 1:
+            raise APIError(400, calculator.BATCH_ERRORS['params'])
+
+        try:
+            raw_material = calculator.calculate(payload['product_type'], payload['material'],
+                                                param1, param2, quantity, factors)
+        except (ValueError, OverflowError) as e:
+            raise APIError(400, str(e))
+        self.send({'raw_material': raw_material})
+
+
+class MetricsHandler(BaseHandler):
+    route = '/metrics'
+
+    def get(self):
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.finish(metrics.prometheus_text(db.get_cache_stats()))
+
+
+def make_app():
+    return tornado.web.Application([
+        (r'/api/health', HealthHandler),
+        (r'/api/products', ProductsHandler),
+        (r'/api/products/search', ProductSearchHandler),
+        (r'/api/products/(\d+)', ProductHandler),
+        (r'/api/products/(\d+)/production-times', ProductionTimesHandler),
+        (r'/api/production-times/(\d+)', ProductionTimeHandler),
+        (r'/api/workshops', ReferenceHandler, {'name': 'workshops', 'loader': db.get_workshop_list}),
+        (r'/api/product-types', ReferenceHandler, {'name': 'product-types', 'loader': db.get_product_types}),
+        (r'/api/material-types', ReferenceHandler, {'name': 'material-types', 'loader': db.get_material_types}),
+        (r'/api/calculate', CalculateHandler),
+        (r'/metrics', MetricsHandler),
+    ], compress_response=True)
+
+
+def serve(port=DEFAULT_PORT, address='', processes=1):
+    """
+    Запускает сервер. processes > 1 - несколько процессов на одном порту
+    (у каждого свой пул подключений, DB_POOL_MAX на процесс); 0 - по числу ядер.
+    """
+    server = tornado.httpserver.HTTPServer(make_app(), xheaders=True)
+    server.bind(port, address)
+    server.start(processes)
+    # слушатель изменений - в каждом процессе после fork
+    notifications.start()
+    print(f"🌐 API слушает порт {port} (процесс {os.getpid()})")
+    tornado.ioloop.IOLoop.current().start()
+
+
+if __name__ == '__main__':
+    serve()
@@ -1,146 +1,111 @@
+import time
+_script_started = time.perf_counter()
+
 import streamlit as st
-import pandas as pd
 import sys
 import os
-
-sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-import db as db
+import re
+import logging
 import base64
 
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'WARNING'),
+    format='%(asctime)s %(levelname)s %(name)s %(message)s'
+)
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import metrics
+import profiling
+import startup
+import exporter
+
+# тяжёлые модули (pandas, numpy, pyarrow, psycopg2) импортируются при первом
+# обращении - шапка и меню успевают отрисоваться раньше
+pd = startup.lazy_import('pandas')
+db = startup.lazy_import('db')
+calculator = startup.lazy_import('calculator')
+db_async = startup.lazy_import('db_async')
+
+# файл метрик в формате Prometheus (например, для textfile-коллектора node_exporter)
+if os.getenv('METRICS_FILE'):
+    metrics.start_file_exporter(
+        os.getenv('METRICS_FILE'),
+        float(os.getenv('METRICS_FILE_INTERVAL', '15')),
+        cache_stats=lambda: db.get_cache_stats(),
+    )
+
+
+# статические ресурсы читаются один раз на процесс, а не на каждом перезапуске
+@st.cache_resource(show_spinner=False)
 def get_base64_logo(path):
     with open(path, "rb") as f:
         data = f.read()
     return base64.b64encode(data).decode()
 
 
-# ✅ Настройки страницы
-st.set_page_config(
-    page_title='Комфорт',
-    page_icon='resources/logo.ico',
-    layout="wide",
-    initial_sidebar_state="expanded"
-)
-
-# ✅ Тёмная тема + фиксированный хедер
-st.markdown("""
-    <style>
-    /* Общий фон */
-    .main {
-        background-color: #1E1E1E;
-        color: #E0E0E0;
-    }
-
-    /* Боковая панель */
-    section[data-testid="stSidebar"] {
-        background-color: #252526 !important;
-        color: #E0E0E0 !important;
-        border-right: 1px solid #3C3C3C;
-    }
+@st.cache_resource(show_spinner=False)
+def load_css(path):
+    """Стили из файла без комментариев и лишних пробелов"""
+    with open(path, encoding="utf-8") as f:
+        css = f.read()
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};:,>])\s*", r"\1", css)
+    return f"<style>{css.strip()}</style>"
 
-    /* Заголовки */
-    h1, h2, h3, h4 {
-        color: #8AB4F8 !important;
-        font-weight: 600;
-    }
 
-    /* Кнопки */
-    .stButton > button {
-        background-color: #3A3D41 !important;
-        color: #E0E0E0 !important;
-        border-radius: 6px;
-        border: 1px solid #5A5A5A;
-        padding: 8px 16px;
-    }
+# прогрев кэшей и подключений в фоне - один раз на процесс
+@st.cache_resource(show_spinner=False)
+def start_warmup():
+    return startup.start_warmup()
 
-    .stButton > button:hover {
-        background-color: #4C4F54 !important;
-        border-color: #7A7A7A;
-    }
 
-    /* Таблицы */
-    .stDataFrame {
-        background-color: #1E1E1E !important;
-    }
+start_warmup()
 
-    /* Карточки */
-    .metric-card {
-        background-color: #2D2D30;
-        padding: 15px;
-        border-radius: 10px;
-        border: 1px solid #3C3C3C;
-        margin-bottom: 15px;
-    }
 
-    .success-box {
-        background-color: #1F3D2D;
-        border-left: 4px solid #4CAF50;
-        padding: 15px;
-        border-radius: 10px;
-        margin-top: 10px;
-    }
+# слушатель изменений в базе (LISTEN/NOTIFY) - сбрасывает кэш db.py, когда
+# данные поменяли другие сессии, процессы API или загрузка из файлов
+@st.cache_resource(show_spinner=False)
+def start_notifications():
+    import notifications
+    return notifications.start()
 
-    .info-box {
-        background-color: #2D2D30;
-        padding: 10px;
-        border-radius: 10px;
-        border: 1px solid #3C3C3C;
-    }
 
-    /* Поля ввода */
-    .stTextInput > div > div > input,
-    .stNumberInput > div > div > input,
-    .stSelectbox > div > div {
-        background-color: #2D2D30 !important;
-        color: #E0E0E0 !important;
-        border: 1px solid #3C3C3C !important;
-    }
+start_notifications()
 
-    /* Разделители */
-    hr {
-        border: 1px solid #3C3C3C !important;
-    }
 
-    /* ✅ Фиксированный хедер */
-    .fixed-header {
-        position: fixed;
-        top: 55px;
-        left: 0;
-        width: 100%;
-        z-index: 9999;
-        background-color: #1E1E1E;
-        padding: 10px 20px;
-        border-bottom: 1px solid #3C3C3C;
-        display: flex;
-        justify-content: center;
-        align-items: center;
-        gap: 15px;
-    }
+# ✅ Настройки страницы
+st.set_page_config(
+    page_title='Комфорт',
+    page_icon='resources/logo.ico',
+    layout="wide",
+    initial_sidebar_state="expanded"
+)
 
-    /* ✅ Отступ для основного контента */
-    .block-container {
-        padding-top: 130px !important;
-    }
-    </style>
-""", unsafe_allow_html=True)
+# ✅ Тёмная тема + фиксированный хедер
+st.markdown(load_css("resources/style.css"), unsafe_allow_html=True)
 
 
 
 
 # ✅ Инициализация состояния
-if 'edit_product_id' not in st.session_state:
-    st.session_state.edit_product_id = None
-if 'show_add_form' not in st.session_state:
-    st.session_state.show_add_form = False
-if 'current_page' not in st.session_state:
-    st.session_state.current_page = 'products'
-if 'calculation_result' not in st.session_state:
-    st.session_state.calculation_result = None
+SESSION_DEFAULTS = {
+    'edit_product_id': None,
+    'show_add_form': False,
+    'current_page': 'products',
+    'calculation_result': None,
+    'export': None,
+}
 
+for key, value in SESSION_DEFAULTS.items():
+    st.session_state.setdefault(key, value)
 
-def main_header():
-    logo_base64 = get_base64_logo("resources/logo.png")
 
-    st.markdown(f"""
+@st.cache_resource(show_spinner=False)
+def header_html(logo_path):
+    logo_base64 = get_base64_logo(logo_path)
+
+    return f"""
         <div class="fixed-header" style="
             display:flex;
             align-items:center;
@@ -152,10 +117,11 @@ def main_header():
                 Компания «Комфорт»
             </h2>
         </div>
-    """, unsafe_allow_html=True)
-
+    """
 
 
+def main_header():
+    st.markdown(header_html("resources/logo.png"), unsafe_allow_html=True)
 
     # Отступ под фиксированный хедер
     st.markdown("<div style='height:70px;'></div>", unsafe_allow_html=True)
@@ -172,7 +138,8 @@ def sidebar_navigation():
         menu = {
             "Продукция": "products",
             "Цеха производства": "workshops",
-            "Расчёт сырья": "calculation"
+            "Расчёт сырья": "calculation",
+            "Производительность": "performance"
         }
 
         for label, key in menu.items():
@@ -196,6 +163,108 @@ def sidebar_navigation():
 
 
 # ✅ Страница продукции
+def display_export(query):
+    """Выгрузка всего списка по текущим фильтрам в файл"""
+    with st.expander("📤 Выгрузить список в файл"):
+        st.caption(
+            "В файл попадают все товары по текущим фильтрам и сортировке, а не только эта страница "
+            "(поиск по названию - по подстроке, без нечёткого совпадения)"
+        )
+        fmt = st.radio(
+            "Формат",
+            list(exporter.FORMATS),
+            format_func=lambda f: exporter.FORMATS[f]["title"],
+            horizontal=True,
+            key="export_format",
+        )
+        filters = {key: query[key] for key in ("filter_type", "search", "has_time", "sort")}
+        request = {**filters, "fmt": fmt}
+
+        if st.button("Подготовить файл"):
+            with st.spinner("Выгрузка..."):
+                try:
+                    result = exporter.export_products(fmt, **filters)
+                except Exception as e:
+                    st.error(f"Ошибка выгрузки: {e}")
+                    return
+
+            previous = st.session_state.export
+            if previous:
+                exporter.remove(previous["path"])
+            st.session_state.export = {**result, "request": request}
+
+        export = st.session_state.export
+        if export and export["request"] == request:
+            # файл могла удалить exporter.cleanup (старые выгрузки)
+            try:
+                with open(export["path"], "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                st.session_state.export = None
+                return
+            st.caption(f"Строк: {export['rows']}, подготовлено за {export['seconds']:.1f} с")
+            st.download_button(
+                "⬇️ " + export["file_name"],
+                data=data,
+                file_name=export["file_name"],
+                mime=export["mime"],
+            )
+
+
+PRODUCT_SORT_OPTIONS = {
+    "По ID": "id",
+    "По названию": "name",
+    "Сначала дешёвые": "min_price",
+    "Сначала дорогие": "-min_price",
+    "По времени пр-ва": "-production_time_h",
+}
+HAS_TIME_OPTIONS = {"Все": None, "С указанием": True, "Без указания": False}
+PAGE_SIZES = [25, 50, 100, 200]
+
+# ключи виджетов фильтров и их значения по умолчанию (в порядке аргументов load_products_list)
+PRODUCT_FILTER_DEFAULTS = {
+    "products_filter_type": "Все",
+    "products_search": "",
+    "products_fuzzy": True,
+    "products_time_filter": "Все",
+    "products_sort": "По ID",
+    "products_page_size": 50,
+    "products_page": 1,
+}
+
+
+def load_products_list(filter_type, search_query, fuzzy_search, time_filter, sort_label, page_size, page):
+    """Список продукции по значениям фильтров; вызывается и в потоке db_async"""
+    # строка из одних пробелов - не поиск
+    search_query = (search_query or "").strip()
+    query = dict(
+        filter_type=None if filter_type == "Все" else filter_type,
+        search=search_query or None,
+        has_time=HAS_TIME_OPTIONS[time_filter],
+        sort=PRODUCT_SORT_OPTIONS[sort_label],
+        limit=page_size,
+    )
+
+    if search_query and fuzzy_search:
+        # ранжированный поиск: самые релевантные сверху, без постраничного вывода
+        filtered = db.search_products(
+            search_query,
+            limit=page_size,
+            filter_type=query["filter_type"],
+            has_time=query["has_time"],
+        )
+        return {"query": query, "filtered": filtered, "fuzzy": True}
+
+    filtered, total = db.query_products(offset=(page - 1) * page_size, **query)
+    pages = max(1, -(-total // page_size))
+    if page > pages:
+        page = pages
+        filtered, total = db.query_products(offset=(page - 1) * page_size, **query)
+
+    return {"query": query, "filtered": filtered, "fuzzy": False,
+            "total": total, "page": page, "pages": pages}
+
+
 def display_products_page():
     st.header("📦 Продукция")
 
@@ -203,14 +272,23 @@ def display_products_page():
         display_product_form()
         return
 
+    # счётчик, типы и сам список независимы - загружаем параллельно; фильтры
+    # берутся из состояния виджетов (значения с прошлого перезапуска)
+    prefetched_filters = tuple(
+        st.session_state.get(key, default) for key, default in PRODUCT_FILTER_DEFAULTS.items()
+    )
     with st.spinner("Загрузка данных..."):
-        products_df = db.get_products_with_production_time()
+        total_products, types, prefetched = db_async.gather(
+            db.count_products,
+            db.get_unique_product_types,
+            (load_products_list, *prefetched_filters),
+        )
 
-    if products_df.empty:
+    if total_products == 0:
         st.warning("В базе данных нет продукции. Добавьте первый продукт.")
         return
 
-    st.metric("Всего продукции", len(products_df))
+    st.metric("Всего продукции", total_products)
     st.markdown("---")
 
     # ✅ Фильтры (оставлены на месте)
@@ -218,39 +296,57 @@ def display_products_page():
     col1, col2, col3 = st.columns([2, 2, 1])
 
     with col1:
-        types = db.get_unique_product_types()
-        filter_type = st.selectbox("Тип продукции", ["Все"] + types)
+        filter_type = st.selectbox("Тип продукции", ["Все"] + types, key="products_filter_type")
 
     with col2:
-        search_query = st.text_input("Поиск по названию")
+        search_query = st.text_input("Поиск по названию или артикулу", key="products_search")
+        fuzzy_search = st.checkbox("Нечёткий поиск (с опечатками)", value=True, key="products_fuzzy")
 
     with col3:
-        time_filter = st.selectbox("Время пр-ва", ["Все", "С указанием", "Без указания"])
+        time_filter = st.selectbox("Время пр-ва", list(HAS_TIME_OPTIONS), key="products_time_filter")
 
-    filtered = products_df.copy()
+    col1, col2, col3 = st.columns([2, 1, 1])
 
-    if filter_type != "Все":
-        filtered = filtered[filtered["product_type"] == filter_type]
+    with col1:
+        sort_label = st.selectbox("Сортировка", list(PRODUCT_SORT_OPTIONS), key="products_sort")
+
+    with col2:
+        page_size = st.selectbox("На странице", PAGE_SIZES, index=1, key="products_page_size")
+
+    with col3:
+        page = st.number_input("Страница", min_value=1, value=1, step=1, key="products_page")
+
+    filters = (filter_type, search_query, fuzzy_search, time_filter, sort_label, page_size, page)
+    if filters == prefetched_filters:
+        listing = prefetched
+    else:
+        # значение виджета поменялось при отрисовке (например, тип пропал из списка)
+        with st.spinner("Загрузка данных..."):
+            listing = load_products_list(*filters)
 
-    if search_query:
-        filtered = filtered[filtered["name"].str.contains(search_query, case=False)]
+    query, filtered = listing["query"], listing["filtered"]
+    if listing["fuzzy"]:
+        st.success(f"Найдено: {len(filtered)} наиболее подходящих товаров")
+    else:
+        st.success(f"Найдено: {listing['total']} товаров (страница {listing['page']} из {listing['pages']})")
 
-    if time_filter == "С указанием":
-        filtered = filtered[filtered["production_time_h"] > 0]
-    elif time_filter == "Без указания":
-        filtered = filtered[filtered["production_time_h"] == 0]
+    bulk_edit = st.toggle("🧰 Массовое редактирование", key="bulk_edit_mode")
 
-    st.success(f"Найдено: {len(filtered)} товаров")
+    if bulk_edit:
+        display_bulk_edit(filtered)
+        return
 
     st.dataframe(filtered, use_container_width=True, hide_index=True, height=400)
 
+    display_export(query)
+
     st.markdown("---")
     st.subheader("⚙️ Управление продуктами")
 
     col1, col2 = st.columns(2)
 
     with col1:
-        product_options = {row["name"]: row["id"] for _, row in filtered.iterrows()}
+        product_options = dict(zip(filtered["name"], filtered["id"].tolist()))
         selected = st.selectbox("Выберите продукт", ["Выберите..."] + list(product_options.keys()))
 
     with col2:
@@ -271,14 +367,102 @@ def display_products_page():
                     st.rerun()
 
             with tab3:
-                manage_production_time(selected)
+                manage_production_time(pid, selected)
+
+
+def show_batch_result(result, action):
+    if result.committed and not result.failed:
+        st.success(f"{action}: {len(result.ok)} шт.")
+    elif result.committed:
+        st.warning(f"{action}: {len(result.ok)} шт., с ошибками: {len(result.failed)}")
+    else:
+        st.error(f"{action}: изменения не сохранены, ошибок: {len(result.failed)}")
+
+    if result.failed:
+        st.dataframe(
+            pd.DataFrame(result.failed, columns=["Строка", "Причина"]),
+            hide_index=True
+        )
+
+
+# ✅ Массовое редактирование показанных продуктов
+def display_bulk_edit(filtered):
+    if filtered.empty:
+        st.info("Нет продуктов для редактирования.")
+        return
+
+    st.caption(
+        "Изменения применяются к продуктам на текущей странице одной транзакцией. "
+        "Можно править ячейки, удалять строки и добавлять новые."
+    )
+
+    editable = filtered.drop(columns=["score"], errors="ignore")
+    edited = st.data_editor(
+        editable,
+        key="bulk_editor",
+        num_rows="dynamic",
+        disabled=["id", "production_time_h"],
+        use_container_width=True,
+        hide_index=True,
+        height=400,
+    )
+
+    fields = list(db.PRODUCT_FIELDS)
+
+    if st.button("💾 Сохранить изменения", type="primary"):
+        original = editable.set_index("id")[fields]
+        kept = edited[edited["id"].notna()].astype({"id": int}).set_index("id")[fields]
+        added = edited[edited["id"].isna()][fields]
+
+        deleted_ids = [pid for pid in original.index if pid not in kept.index]
+        # пустые ячейки с обеих сторон - не изменение (NaN != NaN)
+        before = original.loc[kept.index]
+        differs = kept.ne(before) & ~(kept.isna() & before.isna())
+        changed = kept[differs.any(axis=1)]
+
+        if not changed.empty:
+            show_batch_result(db.update_products_many(changed.reset_index()), "Обновлено")
+        if not added.empty:
+            show_batch_result(db.add_products_many(added), "Добавлено")
+        if deleted_ids:
+            show_batch_result(db.delete_products_many(deleted_ids), "Удалено")
+        if changed.empty and added.empty and not deleted_ids:
+            st.info("Изменений нет")
+
+    st.markdown("---")
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("#### 💰 Изменить цену")
+        percent = st.number_input("Изменение, %", value=0.0, step=1.0, key="bulk_percent")
+        if st.button("Применить ко всем показанным", key="bulk_reprice"):
+            updates = pd.DataFrame({
+                "id": filtered["id"],
+                "min_price": (filtered["min_price"] * (1 + percent / 100)).round(2),
+            })
+            show_batch_result(db.update_products_many(updates), "Цена изменена")
+
+    with col2:
+        st.markdown("#### 🏭 Назначить цех")
+        workshop = st.selectbox("Цех", db.get_available_workshops(), key="bulk_workshop")
+        hours = st.number_input("Время (ч)", min_value=0.0, step=0.5, key="bulk_hours")
+        if st.button("Добавить всем показанным", key="bulk_add_time"):
+            records = pd.DataFrame({
+                "product_id": filtered["id"],
+                "workshop_name": workshop,
+                "production_time": hours,
+            })
+            show_batch_result(db.add_production_times_many(records), "Время добавлено")
 
 
 # ✅ Управление временем производства
-def manage_production_time(product_name):
+def manage_production_time(product_id, product_name):
     st.markdown(f"### ⏱️ Время производства: {product_name}")
 
-    times = db.get_production_times_for_product(product_name)
+    times, workshops = db_async.gather(
+        (db.get_production_times_for_product_id, product_id),
+        db.get_workshop_ids,
+    )
 
     if times:
         df = pd.DataFrame(times)
@@ -295,18 +479,21 @@ def manage_production_time(product_name):
     st.markdown("---")
     st.subheader("Добавить время")
 
-    with st.form(f"add_time_{product_name}"):
+    if not workshops:
+        st.info("Нет цехов - добавить время производства нельзя.")
+        return
+
+    with st.form(f"add_time_{product_id}"):
         col1, col2 = st.columns(2)
 
         with col1:
-            workshops = db.get_available_workshops()
-            workshop = st.selectbox("Цех", workshops)
+            workshop = st.selectbox("Цех", sorted(workshops))
 
         with col2:
             time = st.number_input("Время (ч)", min_value=0.0, step=0.5)
 
         if st.form_submit_button("Добавить"):
-            db.add_production_time(product_name, workshop, time)
+            db.add_production_time_by_id(product_id, workshops[workshop], time)
             st.success("Добавлено!")
             st.rerun()
 
@@ -317,13 +504,15 @@ def display_product_form():
 
     if is_edit:
         st.header("✏️ Редактирование продукта")
-        data = db.get_product_by_id(st.session_state.edit_product_id)
+        data, types, materials = db_async.gather(
+            (db.get_product_by_id, st.session_state.edit_product_id),
+            db.get_unique_product_types,
+            db.get_unique_materials,
+        )
     else:
         st.header("➕ Добавление нового продукта")
         data = {}
-
-    types = db.get_unique_product_types()
-    materials = db.get_unique_materials()
+        types, materials = db_async.gather(db.get_unique_product_types, db.get_unique_materials)
 
     with st.form("product_form"):
         col1, col2 = st.columns(2)
@@ -381,15 +570,12 @@ def display_workshops_page():
 def display_calculation_page():
     st.header("📐 Калькулятор материалов")
 
+    # коэффициенты всех пар тип × материал - из памяти, без запросов к базе
     with st.spinner("Загрузка данных..."):
-        product_types_data = db.get_product_types()
-        material_types_data = db.get_material_types()
+        factors = calculator.get_factor_table()
 
-    product_types_options = [pt['name'] for pt in product_types_data]
-    product_types_dict = {pt['name']: pt['coefficient'] for pt in product_types_data}
-
-    material_types_options = [mt['name'] for mt in material_types_data]
-    material_types_dict = {mt['name']: mt['loss_percent'] for mt in material_types_data}
+    product_types_options = factors.types.tolist()
+    material_types_options = factors.materials.tolist()
 
     param_labels = {
         "Гостиные": ("Площадь (м²)", "Коэффициент плотности"),
@@ -455,31 +641,204 @@ def display_calculation_page():
         submitted = st.form_submit_button("📊 Рассчитать", type="primary")
 
         if submitted:
-            type_coeff = product_types_dict[selected_product_type]
-            loss_percent = material_types_dict[selected_material]
+            total_raw = calculator.calculate(
+                selected_product_type, selected_material, param1, param2, quantity, factors
+            )
 
-            base_raw = param1 * param2 * type_coeff
-            total_raw = base_raw * quantity * (1 + loss_percent / 100)
+            st.success(f"✅ Необходимое количество сырья: **{total_raw} ед.**")
 
-            total_raw = int(total_raw + 0.999)
+    display_batch_calculation(factors)
 
-            st.success(f"✅ Необходимое количество сырья: **{total_raw} ед.**")
 
+# ✅ Пакетный расчёт по производственному плану
+def display_batch_calculation(factors):
+    st.markdown("---")
+    st.subheader("📄 Расчёт по производственному плану")
 
-# ✅ Рендер страниц
-main_header()
-sidebar_navigation()
+    st.caption(
+        "CSV с колонками: " + ", ".join(calculator.BATCH_COLUMNS) +
+        " (разделитель «;» или «,»)"
+    )
 
-if st.session_state.current_page == "products":
-    display_products_page()
-elif st.session_state.current_page == "workshops":
-    display_workshops_page()
-elif st.session_state.current_page == "calculation":
-    display_calculation_page()
+    uploaded = st.file_uploader("Файл плана", type=["csv"], key="batch_plan_file")
+    if uploaded is None:
+        return
+
+    try:
+        plan = calculator.read_batch_csv(uploaded)
+        result = calculator.calculate_raw_material_batch(plan, factors=factors)
+    except Exception as e:
+        st.error(f"Не удалось обработать файл: {e}")
+        return
+
+    summary = calculator.summarize_batch(result)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Строк в плане", summary["rows"])
+    col2.metric("Всего сырья, ед.", summary["total_raw_material"])
+    col3.metric("Строк с ошибками", summary["invalid_rows"])
+
+    if summary["invalid_rows"]:
+        st.warning("Строки с ошибками не учтены в итоге")
+
+    st.dataframe(result.head(1000), hide_index=True, use_container_width=True)
+    if len(result) > 1000:
+        st.caption(f"Показаны первые 1000 строк из {len(result)}")
+
+    st.download_button(
+        "⬇️ Скачать результат (CSV)",
+        data=result.to_csv(sep=";", index=False).encode("utf-8-sig"),
+        file_name="raw_material_plan.csv",
+        mime="text/csv",
+    )
+
+
+# ✅ Страница производительности
+def display_performance_page():
+    st.header("⏱️ Производительность")
+
+    snapshot = metrics.registry.snapshot()
+    cache_stats = db.get_cache_stats()
+    statements = snapshot["statements"]
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("SQL-запросов", sum(s["calls"] for s in statements.values()))
+    col2.metric("Ошибок SQL", sum(s["errors"] for s in statements.values()))
+    col3.metric("Выдано подключений", snapshot["counters"].get("db_connections", 0))
+    col4.metric("Попадания в кэш", f"{cache_stats['hit_rate']:.0%}")
+
+    functions = snapshot["functions"]
+    first_paint = startup.first_paint()
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Первая отрисовка", f"{first_paint:.2f} с" if first_paint is not None else "—")
+    for column, (title, name) in zip((col2, col3, col4), (
+            ("Накладные расходы перезапуска, p50", "app.rerun_overhead"),
+            ("Перезапуск целиком, p50", "app.rerun_total"),
+            ("Прогрев", "app.warmup"))):
+        stat = functions.get(name)
+        column.metric(title, f"{stat['p50_ms']:.0f} мс" if stat else "—")
+
+    columns = {
+        "calls": "вызовов", "p50_ms": "p50, мс", "p95_ms": "p95, мс", "max_ms": "макс, мс",
+        "total_ms": "всего, мс", "rows": "строк", "errors": "ошибок",
+    }
+
+    st.subheader("🐢 Самые медленные запросы")
+    if statements:
+        slowest = (
+            pd.DataFrame.from_dict(statements, orient="index")
+            .rename_axis("запрос").reset_index()
+            .sort_values("p95_ms", ascending=False)
+            .head(20)
+            .rename(columns=columns)
+        )
+        st.dataframe(slowest, hide_index=True, use_container_width=True)
+    else:
+        st.info("Запросов пока не было")
+
+    st.subheader("🔁 Стоимость перезапусков")
+    if snapshot["runs"]:
+        runs = pd.DataFrame(snapshot["runs"][::-1]).rename(columns={
+            "at": "время", "name": "страница", "total_ms": "всего, мс", "queries": "запросов",
+            "sql_ms": "SQL, мс", "rows": "строк", "db_connections": "подключений", "errors": "ошибок",
+        })
+        st.dataframe(runs, hide_index=True, use_container_width=True, height=250)
+
+    st.subheader("🧩 Функции db.py")
+    if snapshot["functions"]:
+        functions = (
+            pd.DataFrame.from_dict(snapshot["functions"], orient="index")
+            .rename_axis("функция").reset_index()
+            .sort_values("total_ms", ascending=False)
+            .rename(columns=columns)
+        )
+        st.dataframe(functions, hide_index=True, use_container_width=True)
+
+    st.subheader("💾 Кэш")
+    st.dataframe(pd.DataFrame([cache_stats]), hide_index=True, use_container_width=True)
+
+    import notifications
+    listener = notifications.status()
+    if not listener["running"]:
+        st.caption("🔕 Слушатель изменений не запущен - кэш обновляется только по TTL")
+    elif not listener["connected"]:
+        st.caption(f"⚠️ Слушатель изменений переподключается: {listener['last_error']}")
+    else:
+        event = listener["last_event"]
+        last = f", последнее - {event['table']} {event['op']}" if event else ""
+        st.caption(f"🔔 Уведомлений об изменениях: {listener['received']}{last}")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.download_button(
+            "⬇️ Метрики (Prometheus)",
+            data=metrics.prometheus_text(cache_stats),
+            file_name="metrics.prom",
+            mime="text/plain",
+        )
+    with col2:
+        if st.button("🧹 Сбросить метрики"):
+            metrics.registry.reset()
+            st.rerun()
+
+
+# ✅ Профили перезапусков (режим профилирования)
+def display_profiles():
+    with st.sidebar.expander("🔬 Профили перезапусков", expanded=False):
+        saved = profiling.profiles()
+        if not saved:
+            st.caption("Профилей пока нет")
+            return
+
+        for profile in saved:
+            st.markdown(
+                f"**{profile['at']}** · {profile['page']} · {profile['mode']} · "
+                f"{profile['duration_ms']:.0f} мс"
+            )
+            if profile["summary"]:
+                st.dataframe(
+                    pd.DataFrame(profile["summary"], columns=["функция", "мс"]),
+                    hide_index=True, use_container_width=True,
+                )
+            st.download_button(
+                "⬇️ " + profile["filename"],
+                data=profile["data"],
+                file_name=profile["filename"],
+                key=f"profile_{profile['id']}",
+            )
+
+        if st.button("🧹 Очистить профили"):
+            profiling.clear()
+            st.rerun()
+
+
+# ✅ Рендер страниц
+# профилирование: APP_PROFILE=cprofile|sampling в .env или ?profile=... в адресе
+profile_mode = profiling.requested_mode(st.query_params.get("profile"), os.getenv("APP_PROFILE"))
+
+with profiling.profile_run(st.session_state.current_page, profile_mode), \
+        metrics.run_scope(st.session_state.current_page):
+    main_header()
+    sidebar_navigation()
+
+    page_started = time.perf_counter()
+    if st.session_state.current_page == "products":
+        display_products_page()
+    elif st.session_state.current_page == "workshops":
+        display_workshops_page()
+    elif st.session_state.current_page == "calculation":
+        display_calculation_page()
+    elif st.session_state.current_page == "performance":
+        display_performance_page()
+
+if profile_mode:
+    display_profiles()
 
 # ✅ Футер
 st.markdown("<hr>", unsafe_allow_html=True)
 st.markdown(
     "<div style='text-align:center; color:#777; padding:10px;'>© 2006–2025</div>",
     unsafe_allow_html=True
-)
\ No newline at end of file
+)
+
+startup.record_rerun(_script_started, page_started, time.perf_counter())
@@ -0,0 +1,7 @@
+"""
+Замеры производительности (запускать из папки app)
+
+    python -m bench.fetch --rows 1000000     - режимы выборки get_products
+    python -m bench.synth --products 100000  - синтетический каталог в тестовой базе
+    python -m bench.suite                    - замеры db.py и калькулятора по размерам
+"""
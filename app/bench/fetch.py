@@ -0,0 +1,162 @@
+"""
+Сравнение режимов выборки db.get_products(): 'pandas' (pd.read_sql),
+'arrow' (COPY + pyarrow), 'stream' (кадр из порций серверного курсора)
+и 'iter' (db.iter_products - порции обрабатываются и не накапливаются)
+
+    python -m bench.fetch [--rows 1000000] [--repeat 3] [--keep]
+
+Если в Products_import меньше --rows строк, недостающие добавляются
+синтетическими (id после максимального) и удаляются после замера
+(--keep - оставить). Каждый режим меряется в отдельном процессе, чтобы
+пиковая память одного не влияла на другой.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ('pandas', 'arrow', 'stream', 'iter')
+
+
+def peak_rss_mb():
+    """Пиковый RSS текущего процесса, МБ"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux - КБ, macOS - байты
+        return peak / 1024 / (1024 if sys.platform == 'darwin' else 1)
+    except ImportError:
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+
+
+def fill_products(rows):
+    """
+    Дополняет Products_import синтетическими строками до rows.
+    Возвращает id, начиная с которого строки добавлены (None - не добавлялись).
+    """
+    import db
+
+    with db.db.cursor() as cursor:
+        cursor.execute('SELECT COUNT(*), COALESCE(MAX("id"), 0) FROM public."Products_import"')
+        count, max_id = cursor.fetchone()
+        if count >= rows:
+            return None
+
+        # типы и материалы берём из существующих данных, чтобы распределение было похожим
+        cursor.execute("""
+            WITH dict AS (
+                SELECT
+                    COALESCE(array_agg(DISTINCT "Product type"), ARRAY['Шкафы']) AS types,
+                    COALESCE(array_agg(DISTINCT "Main material"), ARRAY['МДФ']) AS materials
+                FROM public."Products_import"
+            )
+            INSERT INTO public."Products_import"
+                ("id", "Product type", "Product name", "Article",
+                 "Minimum cost for a partner", "Main material")
+            SELECT
+                %(start)s + g,
+                types[1 + g %% array_length(types, 1)],
+                'Изделие ' || g,
+                9000000 + g,
+                round((1000 + random() * 50000)::numeric, 2),
+                materials[1 + g %% array_length(materials, 1)]
+            FROM dict, generate_series(0, %(missing)s - 1) g
+        """, {'start': max_id + 1, 'missing': rows - count})
+
+    print(f"➕ Добавлено {rows - count} синтетических строк (id >= {max_id + 1})")
+    return max_id + 1
+
+
+def drop_products(start_id):
+    import db
+
+    with db.db.cursor() as cursor:
+        cursor.execute('DELETE FROM public."Products_import" WHERE "id" >= %s', (start_id,))
+    print("➖ Синтетические строки удалены")
+
+
+def fetch(mode):
+    """(строк, МБ самого большого кадра в памяти) для режима mode"""
+    import db
+
+    if mode == 'iter':
+        rows, frame_mb = 0, 0.0
+        for chunk in db.iter_products():
+            rows += len(chunk)
+            frame_mb = max(frame_mb, chunk.memory_usage(deep=True).sum() / 1024 / 1024)
+        return rows, frame_mb
+
+    if mode == 'stream':
+        df = db.get_products(stream=True)
+    else:
+        df = db.get_products(fetch=mode, stream=False)
+    return len(df), df.memory_usage(deep=True).sum() / 1024 / 1024
+
+
+def worker(mode, repeat):
+    """Замер одного режима в текущем процессе; печатает JSON с результатом"""
+    import db
+
+    # подключение и импорты - до замера
+    db.get_workshops(fetch='pandas' if mode in ('stream', 'iter') else mode)
+    baseline = peak_rss_mb()
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows, frame_mb = fetch(mode)
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    print(json.dumps({
+        'mode': mode,
+        'rows': rows,
+        'best_s': best,
+        'rows_per_s': rows / best if best else 0,
+        'peak_rss_mb': peak_rss_mb(),
+        'peak_delta_mb': peak_rss_mb() - baseline,
+        'frame_mb': frame_mb,
+    }))
+
+
+def run_mode(mode, repeat):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', mode, '--repeat', str(repeat)],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    # последняя строка - JSON, выше могут быть сообщения db
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замер режимов выборки продукции')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--keep', action='store_true', help='не удалять синтетические строки')
+    parser.add_argument('--worker', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker(args.worker, args.repeat)
+        return
+
+    start_id = fill_products(args.rows)
+    try:
+        results = [run_mode(mode, args.repeat) for mode in MODES]
+    finally:
+        if start_id is not None and not args.keep:
+            drop_products(start_id)
+
+    print(f"\n{'режим':<8} {'строк':>9} {'время, с':>9} {'строк/с':>11} {'пик RSS, МБ':>12} {'прирост, МБ':>12} {'кадр, МБ':>9}")
+    for r in results:
+        print(f"{r['mode']:<8} {r['rows']:>9} {r['best_s']:>9.2f} {r['rows_per_s']:>11.0f} "
+              f"{r['peak_rss_mb']:>12.0f} {r['peak_delta_mb']:>12.0f} {r['frame_mb']:>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""
+Нагрузочный замер HTTP API (api.py)
+
+    python -m bench.load_api [--url http://localhost:8502] [--concurrency 32] [--duration 10]
+    python -m bench.load_api --spawn [--processes 2]   # поднять сервер самому
+
+Смесь запросов как у ERP/портала: страницы списка, справочники с
+If-None-Match, карточка продукта, поиск и расчёт сырья. Печатает запросов
+в секунду и p50/p95/p99 по каждому виду запросов.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import subprocess
+
+import numpy as np
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# вид запроса -> вес в смеси
+MIX = {
+    'products_page': 30,
+    'product': 25,
+    'product_types': 15,
+    'workshops': 10,
+    'search': 10,
+    'calculate': 10,
+}
+
+
+async def _get_json(client, url):
+    response = await client.fetch(url)
+    return json.loads(response.body)
+
+
+async def prepare(client, base):
+    """Id продуктов и справочники для запросов"""
+    page = await _get_json(client, f"{base}/api/products?limit=1000")
+    types = await _get_json(client, f"{base}/api/product-types")
+    materials = await _get_json(client, f"{base}/api/material-types")
+    return {
+        'ids': [item['id'] for item in page['items']] or [0],
+        'total': page['total'],
+        'types': [item['name'] for item in types['items']],
+        'materials': [item['name'] for item in materials['items']],
+    }
+
+
+def make_request(kind, base, data, etags, rng):
+    if kind == 'products_page':
+        offset = rng.randrange(max(data['total'] - 50, 1))
+        return HTTPRequest(f"{base}/api/products?limit=50&offset={offset}&sort=-production_time_h")
+    if kind == 'product':
+        return HTTPRequest(f"{base}/api/products/{rng.choice(data['ids'])}")
+    if kind in ('product_types', 'workshops'):
+        path = kind.replace('_', '-')
+        headers = {'If-None-Match': etags[kind]} if kind in etags else {}
+        return HTTPRequest(f"{base}/api/{path}", headers=headers)
+    if kind == 'search':
+        return HTTPRequest(f"{base}/api/products/search?q={rng.choice(['шкаф', 'стол', 'дуб', 'кровать'])}&limit=20")
+    body = {
+        'product_type': rng.choice(data['types']),
+        'material': rng.choice(data['materials']),
+        'param1': round(rng.uniform(0.5, 5), 1),
+        'param2': round(rng.uniform(0.5, 5), 1),
+        'quantity': rng.randint(1, 50),
+    }
+    return HTTPRequest(f"{base}/api/calculate", method='POST', body=json.dumps(body))
+
+
+async def worker(client, base, data, deadline, results, etags, seed):
+    rng = random.Random(seed)
+    kinds, weights = list(MIX), list(MIX.values())
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        request = make_request(kind, base, data, etags, rng)
+        started = time.perf_counter()
+        response = await client.fetch(request, raise_error=False)
+        elapsed = time.perf_counter() - started
+
+        stat = results.setdefault(kind, {'times': [], 'errors': 0, 'not_modified': 0})
+        stat['times'].append(elapsed)
+        if response.code == 304:
+            stat['not_modified'] += 1
+        elif response.code >= 400 or response.code == 599:
+            stat['errors'] += 1
+        elif 'Etag' in response.headers and kind in ('product_types', 'workshops'):
+            etags[kind] = response.headers['Etag']
+
+
+async def run_load(base, concurrency, duration):
+    client = AsyncHTTPClient(max_clients=concurrency)
+    data = await prepare(client, base)
+    results, etags = {}, {}
+
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(worker(client, base, data, deadline, results, etags, seed)
+                           for seed in range(concurrency)))
+    return results, time.perf_counter() - started
+
+
+def print_report(results, elapsed):
+    total = sum(len(stat['times']) for stat in results.values())
+    print(f"\n{'запрос':<16} {'число':>8} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'304':>6} {'ошибок':>7}")
+    for kind, stat in sorted(results.items()):
+        times = np.array(stat['times']) * 1000
+        print(f"{kind:<16} {len(times):>8} {np.percentile(times, 50):>9.1f} {np.percentile(times, 95):>9.1f} "
+              f"{np.percentile(times, 99):>9.1f} {stat['not_modified']:>6} {stat['errors']:>7}")
+    print(f"\n✅ {total} запросов за {elapsed:.1f} с - {total / elapsed:.0f} запросов/с")
+
+
+def wait_for_server(base, process, timeout=30):
+    import urllib.request
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("❌ Сервер API завершился при запуске")
+        try:
+            urllib.request.urlopen(f"{base}/api/health", timeout=1)
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit("❌ Сервер API не ответил")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Нагрузочный замер HTTP API')
+    parser.add_argument('--url', default=None, help='адрес API (по умолчанию http://localhost:--port)')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--concurrency', type=int, default=32, help='одновременных запросов')
+    parser.add_argument('--duration', type=float, default=10.0, help='секунд')
+    parser.add_argument('--spawn', action='store_true', help='запустить сервер API на время замера')
+    parser.add_argument('--processes', type=int, default=1, help='процессов сервера (с --spawn)')
+    args = parser.parse_args(argv)
+
+    base = (args.url or f"http://localhost:{args.port}").rstrip('/')
+    process = None
+    if args.spawn:
+        process = subprocess.Popen(
+            [sys.executable, 'manage.py', 'serve-api', '--port', str(args.port),
+             '--processes', str(args.processes)],
+            cwd=APP_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        wait_for_server(base, process)
+
+    try:
+        results, elapsed = asyncio.run(run_load(base, args.concurrency, args.duration))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print_report(results, elapsed)
+
+
+if __name__ == '__main__':
+    main()
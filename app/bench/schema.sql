@@ -0,0 +1,37 @@
+-- Базовые таблицы для тестовой базы замеров (как в отчёте 1 / tableConnections.pdf).
+-- Индексы, ключи и триггеры добавляют миграции из app/migrations.
+
+CREATE TABLE public."Product_type_import" (
+    "id" integer PRIMARY KEY,
+    "Product type" text,
+    "Product type coefficient" real
+);
+
+CREATE TABLE public."Material_type_import" (
+    "id" integer PRIMARY KEY,
+    "Type material" text,
+    "Percentage of raw material losses" real
+);
+
+CREATE TABLE public."Products_import" (
+    "id" integer PRIMARY KEY,
+    "Product type" text,
+    "Product name" text,
+    "Article" bigint,
+    "Minimum cost for a partner" numeric,
+    "Main material" text
+);
+
+CREATE TABLE public."Workshops_import" (
+    "id" integer PRIMARY KEY,
+    "Workshop name" text,
+    "Workshop type" text,
+    "Number of people for production" integer
+);
+
+CREATE TABLE public."Product_workshops_import" (
+    "id" integer PRIMARY KEY,
+    "Product name" text,
+    "Workshop name" text,
+    "Production time, h" real
+);
@@ -0,0 +1,447 @@
+"""
+Замеры функций db.py и калькулятора на синтетических каталогах разного размера
+
+    python -m bench.suite [--sizes 1000 10000 100000] [--fanout 6.5]
+                          [--cases get_products add_product ...] [--repeat 20]
+                          [--output bench/reports/x.json] [--compare старый.json]
+
+Для каждого размера тестовая база (BENCH_DB_NAME) заполняется bench.synth,
+затем каждый случай выполняется до --repeat раз (но не дольше --budget
+секунд, минимум 3 раза). Отчёт - JSON (p50/p95/среднее, пропускная
+способность, пиковый RSS) и таблица в консоли; --compare печатает
+изменение p50 относительно прошлого отчёта.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import threading
+import subprocess
+import contextlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import psutil
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench import synth
+
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# изменение p50, после которого строка помечается в сравнении
+REGRESSION_THRESHOLD = 0.10
+
+
+class PeakRSS:
+    """Пиковый RSS процесса за время блока with (опрос в фоновом потоке)"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = 0
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = self._process.memory_info().rss
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self._process.memory_info().rss)
+
+    @property
+    def mb(self):
+        return self.peak / 1024 / 1024
+
+
+# ---- случаи ------------------------------------------------------------------
+# Каждый случай - функция (ctx) -> dict(run, setup, teardown, unit).
+# run() возвращает число обработанных единиц (строк или операций) и
+# только он попадает в замер; setup() вызывается перед каждым повтором.
+
+def _product_payload(ctx):
+    i = int(ctx['rng'].integers(10 ** 9))
+    product_type = ctx['product_types'][i % len(ctx['product_types'])]
+    return {
+        'product_type': product_type,
+        'name': f"Бенчмарк {i}",
+        'article': 5000000 + i % 1000000,
+        'min_price': float(1000 + i % 50000),
+        'main_material': ctx['materials'][i % len(ctx['materials'])],
+    }
+
+
+def _random_product(ctx):
+    return int(ctx['rng'].integers(ctx['size']))
+
+
+def case_get_products(ctx):
+    import db
+    return {'run': lambda: len(db.get_products(fetch='arrow', stream=False)), 'unit': 'rows'}
+
+
+def case_get_products_pandas(ctx):
+    import db
+    return {'run': lambda: len(db.get_products(fetch='pandas', stream=False)), 'unit': 'rows'}
+
+
+def case_get_products_stream(ctx):
+    import db
+    return {'run': lambda: len(db.get_products(stream=True)), 'unit': 'rows'}
+
+
+def case_iter_products(ctx):
+    import db
+    # порции не накапливаются - пиковая память не зависит от размера каталога
+    return {'run': lambda: sum(len(chunk) for chunk in db.iter_products(with_production_time=True)),
+            'unit': 'rows'}
+
+
+def case_get_products_with_production_time(ctx):
+    import db
+    return {'run': lambda: len(db.get_products_with_production_time()), 'unit': 'rows'}
+
+
+def case_refresh_products(ctx, churn=100):
+    import db
+    # полная загрузка кадра - до замера; каждый повтор вливает дельту из churn продуктов
+    db.refresh_products()
+
+    def setup():
+        db.update_products_many([
+            {'id': _random_product(ctx), 'min_price': float(ctx['rng'].integers(1000, 50000))}
+            for _ in range(churn)
+        ])
+    return {'setup': setup, 'run': lambda: (db.refresh_products(), churn)[1], 'unit': 'rows'}
+
+
+def case_get_workshops(ctx):
+    import db
+    return {'run': lambda: len(db.get_workshops()), 'unit': 'rows'}
+
+
+def case_query_products(ctx):
+    import db
+
+    def run():
+        offset = int(ctx['rng'].integers(max(ctx['size'] - 50, 1)))
+        df, _ = db.query_products(sort='-production_time_h', offset=offset, limit=50)
+        return len(df)
+    return {'run': run, 'unit': 'rows'}
+
+
+def case_search_products(ctx):
+    import db
+    return {'run': lambda: len(db.search_products('шкаф купе', limit=50)), 'unit': 'rows'}
+
+
+def case_get_product_by_id(ctx):
+    import db
+    return {'run': lambda: int(db.get_product_by_id(_random_product(ctx)) is not None), 'unit': 'ops'}
+
+
+def case_get_production_time(ctx):
+    import db
+    return {'run': lambda: (db.get_production_time_for_product_id(_random_product(ctx)), 1)[1],
+            'unit': 'ops'}
+
+
+def case_get_production_times(ctx):
+    import db
+    return {'run': lambda: (db.get_production_times_for_product_id(_random_product(ctx)), 1)[1],
+            'unit': 'ops'}
+
+
+def case_add_product(ctx):
+    import db
+    created = []
+
+    def run():
+        created.append(db.add_product(_product_payload(ctx)))
+        return 1
+    return {'run': run, 'unit': 'ops', 'teardown': lambda: db.delete_products_many(created)}
+
+
+def case_update_product(ctx):
+    import db
+
+    def run():
+        db.update_product(_random_product(ctx), _product_payload(ctx))
+        return 1
+    return {'run': run, 'unit': 'ops'}
+
+
+def case_delete_product(ctx):
+    import db
+    pending = []
+    return {
+        'setup': lambda: pending.append(db.add_product(_product_payload(ctx))),
+        'run': lambda: (db.delete_product(pending.pop()), 1)[1],
+        'unit': 'ops',
+    }
+
+
+def case_add_products_many(ctx, batch=1000):
+    import db
+    created = []
+
+    def run():
+        result = db.add_products_many([_product_payload(ctx) for _ in range(batch)])
+        created.extend(result.ok)
+        return batch
+    return {'run': run, 'unit': 'rows', 'teardown': lambda: db.delete_products_many(created)}
+
+
+def case_add_production_time(ctx):
+    import db
+    created = []
+
+    def run():
+        workshop_id = ctx['workshop_ids'][int(ctx['rng'].integers(len(ctx['workshop_ids'])))]
+        created.append(db.add_production_time_by_id(_random_product(ctx), workshop_id, 1.5))
+        return 1
+    return {'run': run, 'unit': 'ops', 'teardown': lambda: db.delete_production_times_many(created)}
+
+
+def case_delete_production_time(ctx):
+    import db
+    pending = []
+
+    def setup():
+        workshop_id = ctx['workshop_ids'][0]
+        pending.append(db.add_production_time_by_id(_random_product(ctx), workshop_id, 1.5))
+    return {'setup': setup, 'run': lambda: (db.delete_production_time(pending.pop()), 1)[1],
+            'unit': 'ops'}
+
+
+def case_calculate_raw_material(ctx, calls=10000):
+    import calculator
+
+    def run():
+        for i in range(calls):
+            calculator.calculate_raw_material(1.5 + i % 7, 2.0, 3.5, 0.8, 10)
+        return calls
+    return {'run': run, 'unit': 'ops'}
+
+
+def case_calculate(ctx, calls=10000):
+    import calculator
+
+    # таблица коэффициентов и память расчётов - как на странице калькулятора
+    factors = calculator.get_factor_table()
+    types, materials = factors.types.tolist(), factors.materials.tolist()
+
+    def run():
+        for i in range(calls):
+            calculator.calculate(types[i % len(types)], materials[i % len(materials)],
+                                 1.5 + i % 7, 2.0, 10, factors)
+        return calls
+    return {'run': run, 'unit': 'ops'}
+
+
+def case_calculate_raw_material_batch(ctx):
+    import calculator
+
+    rng = ctx['rng']
+    size = ctx['size']
+    plan = pd.DataFrame({
+        'product_type': pd.Categorical(rng.choice(ctx['product_types'], size)),
+        'material': pd.Categorical(rng.choice(ctx['materials'], size)),
+        'param1': rng.uniform(0.5, 5, size),
+        'param2': rng.uniform(0.5, 5, size),
+        'quantity': rng.integers(1, 100, size),
+    })
+    factors = calculator.FactorTable(ctx['type_rows'], ctx['material_rows'])
+    return {'run': lambda: len(calculator.calculate_raw_material_batch(plan, factors=factors)),
+            'unit': 'rows'}
+
+
+CASES = {
+    'get_products': case_get_products,
+    'get_products_pandas': case_get_products_pandas,
+    'get_products_stream': case_get_products_stream,
+    'iter_products': case_iter_products,
+    'get_products_with_production_time': case_get_products_with_production_time,
+    'refresh_products': case_refresh_products,
+    'get_workshops': case_get_workshops,
+    'query_products': case_query_products,
+    'search_products': case_search_products,
+    'get_product_by_id': case_get_product_by_id,
+    'get_production_time': case_get_production_time,
+    'get_production_times': case_get_production_times,
+    'add_product': case_add_product,
+    'update_product': case_update_product,
+    'delete_product': case_delete_product,
+    'add_products_many': case_add_products_many,
+    'add_production_time': case_add_production_time,
+    'delete_production_time': case_delete_production_time,
+    'calculate_raw_material': case_calculate_raw_material,
+    'calculate': case_calculate,
+    'calculate_raw_material_batch': case_calculate_raw_material_batch,
+}
+
+
+# ---- прогон ------------------------------------------------------------------
+
+def measure(case, repeat, budget):
+    """Выполняет случай; возвращает (времена повторов, единиц за повтор, пиковый RSS МБ)"""
+    import db
+
+    timings = []
+    items = 0
+    setup = case.get('setup')
+    started = time.perf_counter()
+    # сообщения db.py (print на каждый вызов) в замер не выводим
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), PeakRSS() as peak:
+        try:
+            while len(timings) < repeat:
+                # чтения из кэша мерить неинтересно
+                db.cache.clear()
+                if setup:
+                    setup()
+                t0 = time.perf_counter()
+                items = case['run']()
+                timings.append(time.perf_counter() - t0)
+                if len(timings) >= 3 and time.perf_counter() - started > budget:
+                    break
+        finally:
+            if case.get('teardown'):
+                case['teardown']()
+    return timings, items, peak.mb
+
+
+def _context(size, seed):
+    import db
+
+    product_types = db.get_product_types()
+    material_types = db.get_material_types()
+    return {
+        'size': size,
+        'rng': np.random.default_rng(seed),
+        'type_rows': product_types,
+        'material_rows': material_types,
+        'product_types': [pt['name'] for pt in product_types],
+        'materials': [mt['name'] for mt in material_types],
+        'workshop_ids': list(db.get_workshop_ids().values()),
+    }
+
+
+def run_suite(sizes, cases, fanout=None, seed=1, repeat=20, budget=10.0, reuse=True):
+    results = []
+    for size in sizes:
+        synth.populate(size, fanout, seed, reuse=reuse)
+        ctx = _context(size, seed)
+        for name in cases:
+            case = CASES[name](ctx)
+            timings, items, peak_mb = measure(case, repeat, budget)
+            seconds = np.array(timings)
+            p50 = float(np.percentile(seconds, 50))
+            result = {
+                'size': size,
+                'case': name,
+                'runs': len(timings),
+                'items': items,
+                'unit': case['unit'],
+                'p50_ms': p50 * 1000,
+                'p95_ms': float(np.percentile(seconds, 95)) * 1000,
+                'mean_ms': float(seconds.mean()) * 1000,
+                'throughput': items / p50 if p50 else 0.0,
+                'peak_rss_mb': peak_mb,
+            }
+            results.append(result)
+            print(f"  {size:>9} {name:<36} p50 {result['p50_ms']:>10.2f} мс  p95 {result['p95_ms']:>10.2f} мс")
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, baseline=None):
+    previous = {(r['size'], r['case']): r for r in (baseline or {}).get('results', [])}
+
+    header = f"{'размер':>9} {'случай':<36} {'p50, мс':>10} {'p95, мс':>10} {'в секунду':>12} {'RSS, МБ':>8}"
+    if previous:
+        header += f" {'p50 было':>10} {'изм.':>8}"
+    print(header)
+    for r in results:
+        line = (f"{r['size']:>9} {r['case']:<36} {r['p50_ms']:>10.2f} {r['p95_ms']:>10.2f} "
+                f"{r['throughput']:>12.0f} {r['peak_rss_mb']:>8.0f}")
+        old = previous.get((r['size'], r['case']))
+        if old:
+            change = r['p50_ms'] / old['p50_ms'] - 1 if old['p50_ms'] else 0.0
+            mark = ' ⚠️' if change > REGRESSION_THRESHOLD else ''
+            line += f" {old['p50_ms']:>10.2f} {change:>+8.0%}{mark}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Замеры db.py на синтетических данных')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='число изделий в каталоге (можно несколько, до 10^7)')
+    parser.add_argument('--fanout', type=float, default=None, help='среднее число цехов на изделие')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget', type=float, default=10.0, help='не дольше, секунд на случай')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--regenerate', action='store_true', help='пересоздать данные, даже если они уже есть')
+    parser.add_argument('--output', help='куда записать JSON (по умолчанию bench/reports/)')
+    parser.add_argument('--compare', help='JSON прошлого прогона для сравнения')
+    args = parser.parse_args(argv)
+
+    synth.use_bench_database()
+    results = run_suite(args.sizes, args.cases, args.fanout, args.seed,
+                        args.repeat, args.budget, reuse=not args.regenerate)
+
+    commit = _git_commit()
+    report = {
+        'meta': {
+            'commit': commit,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sizes': args.sizes,
+            'fanout': args.fanout,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(REPORTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(REPORTS_DIR, f"bench-{commit or 'local'}-{stamp}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print()
+    print_table(results, baseline)
+    print(f"\n📄 Отчёт: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Генератор синтетического каталога для замеров
+
+Распределения берутся из файлов 'data used': частоты пар (тип продукции,
+материал), логнормальная цена по типу, названия-шаблоны по типу, цеха и
+эмпирическое распределение времени производства. Данные заливаются COPY
+в отдельную базу BENCH_DB_NAME (по умолчанию comfort_bench), рабочая база
+не трогается.
+
+    python -m bench.synth --products 100000 [--fanout 6.5] [--seed 1]
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+DEFAULT_CHUNKSIZE = 100000
+
+
+def use_bench_database():
+    """
+    Переключает DB_NAME на тестовую базу (до первого import db) и создаёт её,
+    если её нет. Возвращает имя базы.
+    """
+    load_dotenv()
+    main_database = os.getenv('DB_NAME', 'postgres')
+    bench_database = os.getenv('BENCH_DB_NAME', 'comfort_bench')
+    if bench_database == main_database:
+        raise SystemExit("BENCH_DB_NAME совпадает с DB_NAME - замеры пересоздают схему, нужна отдельная база")
+
+    if 'db' in sys.modules and sys.modules['db'].db.database != bench_database:
+        raise RuntimeError("use_bench_database() нужно вызвать до import db")
+
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+        database=main_database,
+        user=os.getenv('DB_USER', 'postgres'),
+        password=os.getenv('DB_PASSWORD', '0909'),
+    )
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1 FROM pg_database WHERE datname = %s', (bench_database,))
+            if cursor.fetchone() is None:
+                cursor.execute(f'CREATE DATABASE "{bench_database}"')
+                print(f"✅ Создана база {bench_database}")
+    finally:
+        conn.close()
+
+    os.environ['DB_NAME'] = bench_database
+    return bench_database
+
+
+def load_profile(source=None):
+    """
+    Распределения из исходных файлов (по умолчанию папка 'data used')
+    """
+    import loader
+
+    source = source or loader.DEFAULT_SOURCE
+
+    def read(table):
+        chunks = loader.read_chunks(table, loader.find_source(table, source), chunksize=10 ** 6)
+        return pd.concat([loader.normalize_chunk(table, chunk) for chunk in chunks], ignore_index=True)
+
+    products = read('Products_import')
+    workshops = read('Workshops_import')
+    product_workshops = read('Product_workshops_import')
+
+    pairs = products.groupby(['Product type', 'Main material']).size()
+    log_price = np.log(products['Minimum cost for a partner'].clip(lower=1))
+    prices = log_price.groupby(products['Product type']).agg(['mean', 'std']).fillna(0.0)
+
+    times = product_workshops['Production time, h'].dropna().to_numpy(dtype=float)
+    fanout = product_workshops.groupby('Product name').size().mean()
+
+    return {
+        'product_types': read('Product_type_import'),
+        'material_types': read('Material_type_import'),
+        'pairs': pairs.index.to_frame(index=False),
+        'pair_weights': (pairs / pairs.sum()).to_numpy(),
+        # у типов с одним изделием разброс не оценить - берём 10%
+        'price_mu': prices['mean'].to_dict(),
+        'price_sigma': prices['std'].clip(lower=0.1).to_dict(),
+        'names': products.groupby('Product type')['Product name']
+                         .apply(lambda names: names.str.strip().tolist()).to_dict(),
+        'workshops': workshops,
+        'times': times if len(times) else np.array([1.0]),
+        'fanout': float(fanout) if fanout == fanout else 1.0,
+    }
+
+
+def generate_workshops(profile, count):
+    """Цеха: исходные, плюс копии с номером, если нужно больше"""
+    source = profile['workshops']
+    positions = np.arange(count) % len(source)
+    df = source.iloc[positions].reset_index(drop=True)
+    suffix = pd.Series(np.arange(count) // len(source)).map(lambda n: f" {n + 1}" if n else "")
+    df['Workshop name'] = df['Workshop name'].str.strip() + suffix
+    df['id'] = np.arange(count)
+    return df
+
+
+def generate_products(profile, count, rng, chunksize=DEFAULT_CHUNKSIZE):
+    """Порции продукции с id 0..count-1"""
+    pairs = profile['pairs']
+    for start in range(0, count, chunksize):
+        ids = np.arange(start, min(start + chunksize, count))
+        picked = pairs.iloc[rng.choice(len(pairs), size=len(ids), p=profile['pair_weights'])]
+        product_type = picked['Product type'].to_numpy()
+
+        mu = pd.Series(product_type).map(profile['price_mu']).to_numpy(dtype=float)
+        sigma = pd.Series(product_type).map(profile['price_sigma']).to_numpy(dtype=float)
+        price = np.round(np.exp(rng.normal(mu, sigma)))
+
+        templates = pd.Series(product_type).map(
+            lambda t: profile['names'][t][rng.integers(len(profile['names'][t]))]
+        )
+        yield pd.DataFrame({
+            'id': ids,
+            'Product type': product_type,
+            'Product name': templates.to_numpy() + ' №' + ids.astype(str),
+            'Article': 1000000 + ids,
+            'Minimum cost for a partner': price,
+            'Main material': picked['Main material'].to_numpy(),
+        })
+
+
+def generate_production_times(profile, products, workshops, fanout, rng, start_id=0):
+    """
+    Записи времени производства для порции продукции: у каждого изделия
+    ~Пуассон(fanout) разных цехов (от 1 до числа цехов)
+    """
+    workshop_count = len(workshops)
+    counts = np.clip(rng.poisson(fanout, size=len(products)), 1, workshop_count)
+    total = int(counts.sum())
+
+    product_pos = np.repeat(np.arange(len(products)), counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    first = np.repeat(rng.integers(workshop_count, size=len(products)), counts)
+    workshop_pos = (first + offsets) % workshop_count
+
+    return pd.DataFrame({
+        'id': np.arange(start_id, start_id + total),
+        'Product name': products['Product name'].to_numpy()[product_pos],
+        'Workshop name': workshops['Workshop name'].to_numpy()[workshop_pos],
+        'Production time, h': rng.choice(profile['times'], size=total),
+        'product_id': products['id'].to_numpy()[product_pos],
+        'workshop_id': workshops['id'].to_numpy()[workshop_pos],
+    })
+
+
+def _reset_schema(cursor):
+    cursor.execute('DROP SCHEMA IF EXISTS public CASCADE')
+    cursor.execute('CREATE SCHEMA public')
+    with open(SCHEMA_PATH, encoding='utf-8') as f:
+        cursor.execute(f.read())
+    cursor.execute("""
+        CREATE TABLE public.bench_meta (
+            products bigint, fanout double precision, seed bigint,
+            created_at timestamptz DEFAULT now()
+        )
+    """)
+
+
+def current_dataset():
+    """(products, fanout, seed) данных в тестовой базе или None"""
+    import db
+
+    with db.db.cursor() as cursor:
+        cursor.execute("SELECT to_regclass('public.bench_meta')")
+        if cursor.fetchone()[0] is None:
+            return None
+        cursor.execute('SELECT products, fanout, seed FROM public.bench_meta LIMIT 1')
+        return cursor.fetchone()
+
+
+def populate(products, fanout=None, seed=1, source=None, chunksize=DEFAULT_CHUNKSIZE, reuse=True):
+    """
+    Пересоздаёт схему тестовой базы и заливает синтетический каталог из
+    products изделий. reuse=True - ничего не делать, если в базе уже данные
+    с теми же параметрами (миграции всё равно применяются).
+    """
+    import db
+    import loader
+    import migrate
+
+    profile = load_profile(source)
+    fanout = profile['fanout'] if fanout is None else fanout
+
+    if reuse and current_dataset() == (products, fanout, seed):
+        migrate.apply_migrations()
+        print(f"♻️ Каталог на {products} изделий уже загружен")
+        return
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    workshops = generate_workshops(profile, max(len(profile['workshops']), int(np.ceil(fanout * 2))))
+
+    with db.db.cursor() as cursor:
+        _reset_schema(cursor)
+    migrate.apply_migrations()
+
+    rows = 0
+    with db.db.connection() as conn:
+        with conn.cursor() as cursor:
+            # без триггеров и проверок ключей (нужен суперпользователь) - ключи
+            # генерируются согласованными, итоги пересчитываются в конце
+            try:
+                cursor.execute('SET LOCAL session_replication_role = replica')
+            except psycopg2.Error:
+                conn.rollback()
+                print("⚠️ Нет прав на session_replication_role - загрузка с триггерами")
+
+            for table, key in (('Product_type_import', 'product_types'),
+                               ('Material_type_import', 'material_types')):
+                loader.copy_chunks(cursor, f'public."{table}"', list(profile[key].columns), [profile[key]])
+            loader.copy_chunks(cursor, 'public."Workshops_import"',
+                               ['id'] + loader.TABLES['Workshops_import']['columns'], [workshops])
+
+            product_columns = ['id'] + loader.TABLES['Products_import']['columns']
+            time_columns = ['id'] + loader.TABLES['Product_workshops_import']['columns'] + ['product_id', 'workshop_id']
+            next_time_id = 0
+            for chunk in generate_products(profile, products, rng, chunksize):
+                loader.copy_chunks(cursor, 'public."Products_import"', product_columns, [chunk])
+                times = generate_production_times(profile, chunk, workshops, fanout, rng, next_time_id)
+                loader.copy_chunks(cursor, 'public."Product_workshops_import"', time_columns, [times])
+                next_time_id += len(times)
+                rows += len(chunk) + len(times)
+
+            for table in loader.TABLES:
+                loader.sync_sequence(cursor, f'public."{table}"')
+            cursor.execute('INSERT INTO public.bench_meta (products, fanout, seed) VALUES (%s, %s, %s)',
+                           (products, fanout, seed))
+
+    db.rebuild_production_rollup()
+    with db.db.connection() as conn:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        conn.autocommit = False
+    db.cache.clear()
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Синтетический каталог: {products} изделий, {rows} строк, fan-out {fanout:.1f}, за {elapsed:.1f} с")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Синтетический каталог для замеров')
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--fanout', type=float, default=None,
+                        help='среднее число цехов на изделие (по умолчанию - как в данных)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--source', default=None, help="папка с исходными файлами ('data used')")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    use_bench_database()
+    populate(args.products, args.fanout, args.seed, args.source, args.chunksize, reuse=False)
+
+
+if __name__ == '__main__':
+    main()
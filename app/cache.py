@@ -0,0 +1,86 @@
+import time
+import threading
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    потокобезопасный кэш в памяти процесса
+
+    У каждого ключа свой TTL, размер ограничен maxsize (при переполнении
+    вытесняется давно не использованный ключ). Считает попадания и промахи.
+    """
+
+    def __init__(self, maxsize=256, default_ttl=300):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """
+        Возвращает (найдено, значение). Просроченные ключи удаляются.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                value, expires_at = item
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._data[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value, ttl=None):
+        """Сохраняет значение; ttl=None - берётся default_ttl, 0 - без срока"""
+        if ttl is None:
+            ttl = self.default_ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *keys):
+        """Удаляет перечисленные ключи"""
+        with self._lock:
+            for key in keys:
+                if self._data.pop(key, None) is not None:
+                    self.invalidations += 1
+
+    def invalidate_prefix(self, prefix):
+        """Удаляет все ключи, начинающиеся с prefix"""
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                del self._data[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self):
+        """Счётчики кэша для мониторинга"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0,
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
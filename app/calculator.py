@@ -0,0 +1,217 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# колонки производственного плана для пакетного расчёта
+BATCH_COLUMNS = ['product_type', 'material', 'param1', 'param2', 'quantity']
+
+# русские заголовки, которые тоже принимаются в загружаемом CSV
+BATCH_COLUMN_ALIASES = {
+    'Тип продукции': 'product_type',
+    'Категория изделия': 'product_type',
+    'Материал': 'material',
+    'Параметр 1': 'param1',
+    'Параметр 2': 'param2',
+    'Количество': 'quantity',
+    'Количество изделий': 'quantity',
+}
+
+BATCH_ERRORS = {
+    'type': 'неизвестный тип продукции',
+    'material': 'неизвестный материал',
+    'params': 'некорректные параметры',
+}
+
+
+def calculate_raw_material(param1, param2, type_coeff, loss_percent, quantity):
+    """
+    Количество сырья на заказ (округление вверх до целых единиц)
+    """
+    base_raw = param1 * param2 * type_coeff
+    total_raw = base_raw * quantity * (1 + loss_percent / 100)
+
+    return int(total_raw + 0.999)
+
+
+# сколько последних наборов параметров помнить (0 - без памяти)
+MEMO_SIZE = int(os.getenv('CALC_MEMO_SIZE', '4096'))
+
+
+class FactorTable:
+    """
+    Справочники калькулятора в виде двух векторов: коэффициенты типов
+    продукции (type_coeff) и проценты потерь материалов (loss_percent).
+    Значения пары ищутся по названиям (coefficients), в пакетном расчёте -
+    по позициям в types/materials.
+
+    Строится из списков db.get_product_types()/db.get_material_types().
+    """
+
+    def __init__(self, product_types, material_types):
+        # повторяющиеся названия - берётся последнее значение
+        coefficients = {pt['name']: pt['coefficient'] for pt in product_types}
+        losses = {mt['name']: mt['loss_percent'] for mt in material_types}
+
+        self.types = pd.Index(list(coefficients))
+        self.materials = pd.Index(list(losses))
+        self.type_coeff = np.fromiter(coefficients.values(), dtype=float, count=len(coefficients))
+        self.loss_percent = np.fromiter(losses.values(), dtype=float, count=len(losses))
+        # для расчёта по одной паре - словарь быстрее поиска в Index
+        self._type_pos = {name: pos for pos, name in enumerate(self.types)}
+        self._material_pos = {name: pos for pos, name in enumerate(self.materials)}
+
+    def is_complete(self):
+        """Есть хотя бы один тип и один материал (иначе считать нечего)"""
+        return len(self.types) > 0 and len(self.materials) > 0
+
+    def __repr__(self):
+        return f"<FactorTable: {len(self.types)} типов, {len(self.materials)} материалов>"
+
+    def coefficients(self, product_type, material):
+        """
+        (коэффициент типа, процент потерь) пары (ValueError, если тип или
+        материал неизвестны)
+        """
+        type_pos = self._type_pos.get(product_type)
+        if type_pos is None:
+            raise ValueError(f"{BATCH_ERRORS['type']}: {product_type}")
+        material_pos = self._material_pos.get(material)
+        if material_pos is None:
+            raise ValueError(f"{BATCH_ERRORS['material']}: {material}")
+        return float(self.type_coeff[type_pos]), float(self.loss_percent[material_pos])
+
+
+def get_factor_table():
+    """Таблица коэффициентов из кэша db (пересобирается при изменении справочников)"""
+    import db
+    return db.get_raw_material_factors()
+
+
+@lru_cache(maxsize=MEMO_SIZE)
+def _memo_raw_material(param1, param2, quantity, type_coeff, loss_percent):
+    # ключ - сами коэффициенты, а не названия: пары с одинаковыми значениями
+    # делят записи, а после изменения справочника старые не подойдут;
+    # считается той же формулой (и в том же порядке операций), что и без памяти
+    return calculate_raw_material(param1, param2, type_coeff, loss_percent, quantity)
+
+
+def calculate(product_type, material, param1, param2, quantity, factors=None):
+    """
+    Количество сырья на заказ по названиям типа продукции и материала
+    (коэффициенты - из таблицы factors, по умолчанию get_factor_table()).
+    Повторные наборы параметров берутся из памяти (CALC_MEMO_SIZE).
+    """
+    if factors is None:
+        factors = get_factor_table()
+    type_coeff, loss_percent = factors.coefficients(product_type, material)
+    return _memo_raw_material(float(param1), float(param2), int(quantity), type_coeff, loss_percent)
+
+
+def memo_stats():
+    """Попадания/промахи памяти расчётов"""
+    info = _memo_raw_material.cache_info()
+    total = info.hits + info.misses
+    return {
+        'hits': info.hits,
+        'misses': info.misses,
+        'size': info.currsize,
+        'maxsize': info.maxsize,
+        'hit_rate': info.hits / total if total else 0.0,
+    }
+
+
+def _lookup(names, column):
+    """
+    Позиции значений column в списке names (-1 - не найдено).
+    Для категориальных колонок сопоставляются только категории.
+    """
+    index = pd.Index(names)
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        positions = index.get_indexer(column.cat.categories)
+        codes = column.cat.codes.to_numpy()
+        return np.where(codes >= 0, positions[codes], -1)
+    return index.get_indexer(column)
+
+
+def calculate_raw_material_batch(df, product_types=None, material_types=None, factors=None):
+    """
+    Расчёт сырья для целого производственного плана
+
+    df - DataFrame с колонками BATCH_COLUMNS. Коэффициенты берутся из таблицы
+    factors (по умолчанию get_factor_table()); если переданы product_types/
+    material_types (формат как у db.get_product_types()/db.get_material_types()),
+    таблица строится из них. Тип и материал сопоставляются по названию.
+    Возвращает копию df с колонками type_coeff, loss_percent, raw_material
+    (Int64, пусто для ошибочных строк) и error.
+    """
+    missing = [col for col in BATCH_COLUMNS if col not in df.columns]
+    if missing:
+        raise ValueError(f"Нет колонок: {', '.join(missing)}")
+
+    if factors is None:
+        if product_types is not None and material_types is not None:
+            factors = FactorTable(product_types, material_types)
+        else:
+            factors = get_factor_table()
+
+    type_pos = _lookup(factors.types, df['product_type'])
+    material_pos = _lookup(factors.materials, df['material'])
+
+    type_coeff = np.append(factors.type_coeff, np.nan)[type_pos]
+    loss_percent = np.append(factors.loss_percent, np.nan)[material_pos]
+
+    param1 = pd.to_numeric(df['param1'], errors='coerce').to_numpy(dtype=float)
+    param2 = pd.to_numeric(df['param2'], errors='coerce').to_numpy(dtype=float)
+    quantity = pd.to_numeric(df['quantity'], errors='coerce').to_numpy(dtype=float)
+
+    type_ok = type_pos >= 0
+    material_ok = material_pos >= 0
+    with np.errstate(invalid='ignore'):
+        params_ok = (param1 >= 0) & (param2 >= 0) & (quantity >= 1)
+        params_ok &= np.isfinite(param1) & np.isfinite(param2) & np.isfinite(quantity)
+    valid = type_ok & material_ok & params_ok
+
+    with np.errstate(invalid='ignore'):
+        # порядок операций - как в calculate_raw_material, чтобы округление совпадало
+        total_raw = param1 * param2 * type_coeff * quantity * (1 + loss_percent / 100)
+    raw_material = np.floor(np.where(valid, total_raw, 0) + 0.999).astype(np.int64)
+
+    error = np.select(
+        [~type_ok, ~material_ok, ~params_ok],
+        [BATCH_ERRORS['type'], BATCH_ERRORS['material'], BATCH_ERRORS['params']],
+        default='',
+    )
+
+    return df.assign(
+        type_coeff=type_coeff,
+        loss_percent=loss_percent,
+        raw_material=pd.arrays.IntegerArray(raw_material, mask=~valid),
+        error=pd.Categorical(error),
+    )
+
+
+def summarize_batch(result):
+    """Итоги пакетного расчёта"""
+    invalid = result['raw_material'].isna()
+    return {
+        'rows': len(result),
+        'invalid_rows': int(invalid.sum()),
+        'total_raw_material': int(result['raw_material'].sum()),
+    }
+
+
+def read_batch_csv(file):
+    """
+    Читает производственный план из CSV (разделитель ';' или ',')
+    """
+    head = file.read(4096)
+    file.seek(0)
+    if isinstance(head, bytes):
+        head = head.decode('utf-8', errors='ignore')
+    sep = ';' if ';' in head.split('\n', 1)[0] else ','
+
+    df = pd.read_csv(file, sep=sep, encoding='utf-8-sig')
+    df = df.rename(columns=lambda col: BATCH_COLUMN_ALIASES.get(str(col).strip(), str(col).strip()))
+    return df
@@ -1,17 +1,50 @@
+import io
 import os
+import time
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
 import psycopg2
+from psycopg2 import pool as pg_pool
+from psycopg2.extras import execute_values
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine, text
-from sqlalchemy.exc import SQLAlchemyError
 from dotenv import load_dotenv
 
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv as pa_csv
+except ImportError:
+    pa = None
+
+import metrics
+from cache import TTLCache
+from search import NGramIndex
+
 # загружаем переменные окружения
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+class PooledConnection(psycopg2.extensions.connection):
+    """Подключение пула: помнит, когда открыто и с какого момента простаивает"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.born = time.monotonic()
+        self.idle_since = self.born
+
 class DatabaseConnection:
     """
-    класс для управления подключением к PostgreSQL через SQLAlchemy
+    класс для управления подключением к PostgreSQL
+
+    Пул psycopg2 создаётся один раз на процесс (лениво, при первом
+    обращении) и разделяется всеми сессиями Streamlit; других подключений
+    к базе (кроме слушателя уведомлений) процесс не открывает, так что
+    DB_POOL_MAX - общий предел.
     """
     
     def __init__(self):
@@ -22,188 +55,655 @@ class DatabaseConnection:
         self.user = os.getenv('DB_USER', 'postgres')
         self.password = os.getenv('DB_PASSWORD', '0909')
         
-        # строка для подключения SQLAlchemy (с использованием psycopg2)
-        self.connection_string = (
-            f"postgresql+psycopg2://{self.user}:{self.password}"
-            f"@{self.host}:{self.port}/{self.database}"
-        )
-        
-    def get_engine(self):
+        # настройки пула
+        self.pool_min = int(os.getenv('DB_POOL_MIN', '1'))
+        self.pool_max = int(os.getenv('DB_POOL_MAX', '10'))
+        self.pool_recycle = int(os.getenv('DB_POOL_RECYCLE', '1800'))
+        self.pool_timeout = float(os.getenv('DB_POOL_TIMEOUT', '30'))
+        self.pool_pre_ping = os.getenv('DB_POOL_PRE_PING', '1') != '0'
+        # pre-ping только для подключений, простаивавших дольше (секунды)
+        self.pool_ping_idle = float(os.getenv('DB_POOL_PING_IDLE', '30'))
+        
+        self._lock = threading.Lock()
+        self._pool = None
+        # ограничивает число одновременно выданных подключений (ThreadedConnectionPool
+        # при исчерпании бросает ошибку, а не ждёт)
+        self._slots = threading.BoundedSemaphore(self.pool_max)
+        
+    def _get_pool(self):
+        if self._pool is not None:
+            return self._pool
+        
+        with self._lock:
+            if self._pool is None:
+                self._pool = pg_pool.ThreadedConnectionPool(
+                    self.pool_min,
+                    self.pool_max,
+                    host=self.host,
+                    port=self.port,
+                    database=self.database,
+                    user=self.user,
+                    password=self.password,
+                    connection_factory=PooledConnection,
+                    cursor_factory=metrics.InstrumentedCursor
+                )
+                print(f"✅ Пул подключений psycopg2 создан ({self.pool_min}..{self.pool_max})")
+        return self._pool
+    
+    def _is_usable(self, conn):
+        """Проверка подключения перед выдачей (recycle и pre-ping после простоя)"""
+        if conn.closed:
+            return False
+        
+        now = time.monotonic()
+        if self.pool_recycle > 0 and now - conn.born > self.pool_recycle:
+            return False
+        
+        if self.pool_pre_ping and now - conn.idle_since > self.pool_ping_idle:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+        return True
+    
+    def _release(self, conn, close=False):
+        conn.idle_since = time.monotonic()
+        self._get_pool().putconn(conn, close=close)
+        self._slots.release()
+    
+    @contextmanager
+    def connection(self):
         """
-        Создаёт и возвращает SQLAlchemy engine
+        Выдаёт подключение из пула на время блока with.
+        При успешном выходе делает commit, при ошибке - rollback.
         """
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.pool_timeout):
+            metrics.registry.increment('db_pool_timeouts')
+            raise pg_pool.PoolError("Пул подключений исчерпан")
+        
         try:
-            engine = create_engine(self.connection_string)
-            print(f"✅ SQLAlchemy engine создан для {self.database}")
-            return engine
-        except Exception as e:
-            print(f"❌ Ошибка создания SQLAlchemy engine: {e}")
+            pool = self._get_pool()
+            conn = pool.getconn()
+            while not self._is_usable(conn):
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+        except Exception:
+            self._slots.release()
             raise
-    
-    def get_raw_connection(self):
-        """Возвращает прямое подключение psycopg2 (для операций без pandas)"""
+        
+        metrics.registry.increment('db_connections')
+        metrics.registry.observe('function', 'db.acquire_connection', time.perf_counter() - started)
+        
         try:
-            conn = psycopg2.connect(
-                host=self.host,
-                port=self.port,
-                database=self.database,
-                user=self.user,
-                password=self.password
-            )
-            return conn
-        except Exception as e:
-            print(f"❌ Ошибка прямого подключения: {e}")
+            yield conn
+            conn.commit()
+        except BaseException:
+            # BaseException - в том числе GeneratorExit, когда потоковое
+            # чтение (stream_query) бросили на середине
+            if not conn.closed:
+                conn.rollback()
+            self._release(conn, close=bool(conn.closed))
             raise
+        else:
+            self._release(conn)
+    
+    @contextmanager
+    def cursor(self):
+        """Курсор на подключении из пула (commit/rollback как в connection())"""
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+    
+    def close(self):
+        """Закрывает пул (например, при остановке процесса)"""
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
 
 db = DatabaseConnection()
 
-def get_products():
+# кэш справочников: данные меняются редко, а формы запрашивают их на каждом рендере
+cache = TTLCache(
+    maxsize=int(os.getenv('CACHE_MAXSIZE', '512')),
+    default_ttl=int(os.getenv('CACHE_TTL', '300'))
+)
+
+# TTL отдельных ключей, секунды
+CACHE_TTLS = {
+    'product_types': 3600,
+    'material_types': 3600,
+    'available_workshops': 3600,
+    'workshop_ids': 3600,
+    'unique_product_types': 600,
+    'unique_materials': 600,
+    'products_count': 600,
+    'pg_trgm': 3600,
+    'raw_material_factors': 3600,
+    'workshop_list': 3600,
+    'production_times:': 60,
+    'product:': 60,
+}
+
+# какие ключи кэша зависят от какой таблицы (префиксы заканчиваются на ':')
+_TABLE_CACHE_KEYS = {
+    'Products_import': ['unique_product_types', 'unique_materials', 'products_count',
+                        'production_times:', 'product:'],
+    'Product_type_import': ['product_types', 'raw_material_factors'],
+    'Material_type_import': ['material_types', 'raw_material_factors'],
+    'Workshops_import': ['available_workshops', 'workshop_ids', 'workshop_list', 'production_times:'],
+    'Product_workshops_import': ['production_times:'],
+}
+
+def _cache_set(key, value):
+    ttl_key = key if key in CACHE_TTLS else key.split(':', 1)[0] + ':'
+    cache.set(key, value, ttl=CACHE_TTLS.get(ttl_key))
+
+# списки, которые меняются при любом изменении продукции
+_PRODUCT_LIST_KEYS = ['unique_product_types', 'unique_materials', 'products_count']
+
+def _invalidate_products(product_ids=()):
+    """Сброс кэша после изменения конкретных продуктов"""
+    cache.invalidate(*_PRODUCT_LIST_KEYS)
+    cache.invalidate(*(f'production_times:{pid}' for pid in product_ids))
+    cache.invalidate(*(f'product:{pid}' for pid in product_ids))
+    _mark_products_dirty()
+
+# ключи-префиксы, которые можно сбросить по id изменённых строк, а не целиком
+# (для Product_workshops_import id - это product_id, см. миграцию 005)
+_ROW_CACHE_PREFIXES = {
+    'Products_import': ['production_times:', 'product:'],
+    'Product_workshops_import': ['production_times:'],
+}
+
+# таблицы, от которых зависит кадр продукции в памяти (get_cached_products)
+_PRODUCTS_FRAME_TABLES = {'Products_import', 'Product_workshops_import'}
+
+def invalidate_table_cache(table, ids=None):
+    """
+    Сбрасывает все закэшированные данные, зависящие от таблицы
+    (для изменений в обход функций db.py, например загрузки из файлов,
+    и по уведомлениям из других процессов - notifications.py).
+    ids - id изменённых строк: тогда записи по строкам сбрасываются
+    только для них.
+    """
+    if table in _PRODUCTS_FRAME_TABLES:
+        _mark_products_dirty()
+    
+    row_prefixes = _ROW_CACHE_PREFIXES.get(table, []) if ids is not None else []
+    for key in _TABLE_CACHE_KEYS.get(table, []):
+        if key in row_prefixes:
+            cache.invalidate(*(f'{key}{row_id}' for row_id in ids))
+        elif key.endswith(':'):
+            cache.invalidate_prefix(key)
+        else:
+            cache.invalidate(key)
+
+def invalidate_all_caches():
+    """
+    Сбрасывает весь кэш и помечает кадр продукции устаревшим (например,
+    когда уведомления об изменениях могли потеряться)
+    """
+    cache.clear()
+    _mark_products_dirty()
+
+# режим, в котором функции чтения не подменяют ошибку базы пустым результатом
+_raise_errors = contextvars.ContextVar('db_raise_errors', default=False)
+
+@contextmanager
+def raise_errors():
+    """
+    Внутри блока функции чтения db.py пробрасывают ошибки, а не возвращают
+    пустой список/0/None - чтобы API отличал «нет данных» от «база недоступна»
+    """
+    token = _raise_errors.set(True)
+    try:
+        yield
+    finally:
+        _raise_errors.reset(token)
+
+def raising_errors():
+    return _raise_errors.get()
+
+def ping():
+    """SELECT 1 на подключении из пула - без кэша, ошибка пробрасывается"""
+    with db.cursor() as cursor:
+        cursor.execute('SELECT 1')
+        return cursor.fetchone()[0] == 1
+
+def get_cache_stats():
+    """Счётчики попаданий/промахов кэша"""
+    return cache.stats()
+
+_PRODUCTS_SELECT = """
+    SELECT 
+        p."id" as id,
+        p."Product type" as product_type,
+        p."Product name" as name,
+        p."Article" as article,
+        p."Minimum cost for a partner" as min_price,
+        p."Main material" as main_material
+"""
+
+def _empty_products_frame(*extra):
+    """
+    Пустой список продукции с обычными колонками (плюс extra) - чтобы
+    вызывающий код мог обращаться к колонкам и без найденных строк
+    """
+    return pd.DataFrame(columns=['id', 'product_type', 'name', 'article', 'min_price',
+                                 'main_material', 'production_time_h', *extra])
+
+# итоги времени производства по продукту (присоединяются к Products_import p);
+# таблицу product_production_time поддерживают триггеры, см. миграцию 004
+_PRODUCTION_TIME_JOIN = """
+    LEFT JOIN public.product_production_time t ON t.product_id = p."id"
+"""
+
+def clean_int(values):
+    """
+    Приведение колонки к int (нечисловые значения -> 0)
+    """
+    return pd.to_numeric(values, errors='coerce').fillna(0).astype(int)
+
+def clean_price(values):
+    """
+    Приведение цены к float: строки вида '12 500 руб.' очищаются от всего,
+    кроме цифр, разделителей и минуса (запятая перед одной-двумя последними
+    цифрами - десятичная, '1 234,50 ₽'; иначе - разделитель тысяч, '12,500');
+    то, что не удалось разобрать, -> 0.0
+
+    Возвращает (колонка, число строк, которые не были числом и потребовали очистки).
+    """
+    numeric = pd.to_numeric(values, errors='coerce')
+    failed = numeric.isna()
+    coerced = int(failed.sum())
+    
+    if coerced:
+        candidates = values[failed]
+        text_values = candidates[candidates.map(lambda v: isinstance(v, str))]
+        cleaned = text_values.str.replace(r'[^0-9.,\-]', '', regex=True).str.rstrip('.')
+        cleaned = cleaned.str.replace(r'^([^.]*),(\d{1,2})$', r'\1.\2', regex=True)
+        cleaned = cleaned.str.replace(',', '', regex=False)
+        numeric.loc[cleaned.index] = pd.to_numeric(cleaned, errors='coerce')
+    
+    return numeric.fillna(0.0), coerced
+
+def _normalize_products_df(df):
+    """
+    Приведение типов колонок продукции (id, article -> int, min_price -> float)
+
+    Число строк, цену которых пришлось чистить, кладётся в df.attrs['coerced_rows'].
+    """
+    coerced = 0
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("products dtypes before: %s", df.dtypes.astype(str).to_dict())
+    
+    # id -> int
+    if 'id' in df.columns:
+        df['id'] = clean_int(df['id'])
+    
+    # article -> int
+    if 'article' in df.columns:
+        df['article'] = clean_int(df['article'])
+    
+    # min_price -> float
+    if 'min_price' in df.columns:
+        df['min_price'], coerced = clean_price(df['min_price'])
+        if coerced:
+            logger.warning("min_price: coerced_rows=%d of rows=%d", coerced, len(df))
+    
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("products dtypes after: %s", df.dtypes.astype(str).to_dict())
+        logger.debug("products head:\n%s", df.head(3).to_string())
+    
+    df.attrs['coerced_rows'] = coerced
+    return df
+
+def _downcast_float(values):
+    """float -> float32, только если все значения представимы без потерь"""
+    array = values.to_numpy(dtype='float64', na_value=np.nan)
+    if not np.array_equal(array.astype(np.float32).astype(np.float64), array, equal_nan=True):
+        return values
+    if isinstance(values.dtype, pd.ArrowDtype):
+        return values.astype(pd.ArrowDtype(pa.float32()))
+    return values.astype('float32')
+
+# денежные колонки остаются float64: кадр из get_cached_products попадает
+# в редактор продукции, и арифметика во float32 (наценка, правка ячейки)
+# записала бы в базу 176557.703125 вместо 176557.7
+MONEY_COLUMNS = ('min_price',)
+
+@metrics.instrument
+def compact_frame(df, category_ratio=0.5):
+    """
+    Уменьшает память кадра (на месте): строковые колонки, где уникальных
+    значений не больше category_ratio от числа строк, -> category, целые ->
+    наименьший подходящий тип, float -> float32 без потери точности
+    (кроме MONEY_COLUMNS).
+
+    Размер после сжатия (memory_usage(deep=True)) кладётся в df.attrs['memory_bytes'].
+    """
+    rows = len(df)
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == bool:
+            continue
+        if pd.api.types.is_integer_dtype(values.dtype):
+            df[column] = pd.to_numeric(values, downcast='integer')
+        elif pd.api.types.is_float_dtype(values.dtype):
+            if column not in MONEY_COLUMNS:
+                df[column] = _downcast_float(values)
+        elif pd.api.types.is_string_dtype(values.dtype):
+            if rows and values.nunique(dropna=False) <= rows * category_ratio:
+                df[column] = values.astype('category')
+    
+    df.attrs['memory_bytes'] = int(df.memory_usage(deep=True).sum())
+    return df
+
+# как выбирать большие таблицы: 'arrow' - COPY ... TO STDOUT и разбор pyarrow
+# (колонки сразу нужных типов, pandas на ArrowDtype), 'pandas' - старый путь
+# через pd.read_sql с приведением типов после
+FETCH_MODE = os.getenv('DB_FETCH_MODE', 'arrow')
+
+def _fetch_mode(fetch=None):
+    mode = fetch or FETCH_MODE
+    if mode not in ('arrow', 'pandas'):
+        raise ValueError(f"Неизвестный режим выборки: {mode}")
+    if mode == 'arrow' and pa is None:
+        logger.warning("pyarrow не установлен - выборка через pandas")
+        return 'pandas'
+    return mode
+
+def read_frame(query, params=None):
+    """
+    Результат запроса как DataFrame через подключение из пула (режим
+    'pandas'; Decimal приводятся к float, как в pd.read_sql_query)
+    """
+    with db.cursor() as cursor:
+        cursor.execute(query, params)
+        columns = [column.name for column in cursor.description]
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=columns, coerce_float=True)
+
+@metrics.instrument
+def fetch_arrow(query, params=None, column_types=None):
+    """
+    Результат запроса как pyarrow.Table
+
+    Строки выгружаются через COPY (query) TO STDOUT в CSV и разбираются
+    pyarrow без промежуточных Python-объектов. column_types - имя колонки ->
+    тип pyarrow (колонки без типа pyarrow определит сам). NULL -> null,
+    пустая строка остаётся пустой строкой, а текст вроде 'NA' или 'null' -
+    текстом (в CSV от PostgreSQL NULL - только пустое поле без кавычек).
+    """
+    with db.cursor() as cursor:
+        if params:
+            query = cursor.mogrify(query, params).decode('utf-8')
+        buffer = io.BytesIO()
+        cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+    
+    buffer.seek(0)
+    return pa_csv.read_csv(
+        buffer,
+        convert_options=pa_csv.ConvertOptions(
+            column_types=column_types or {},
+            null_values=[''],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+
+def _arrow_frame(query, column_types, zero_fill=()):
+    """
+    DataFrame на ArrowDtype; null в колонках zero_fill заменяются на 0
+    (как clean_int/clean_price в pandas-пути). Возвращает (df, {колонка: число null}).
+    """
+    table = fetch_arrow(query, column_types=column_types)
+    nulls = {}
+    for name in zero_fill:
+        if name in table.column_names:
+            column = table.column(name)
+            nulls[name] = column.null_count
+            if column.null_count:
+                table = table.set_column(
+                    table.schema.get_field_index(name), name, pc.fill_null(column, 0)
+                )
+    return table.to_pandas(types_mapper=pd.ArrowDtype), nulls
+
+def _products_arrow_types(*extra_float):
+    types = {
+        'id': pa.int64(),
+        'product_type': pa.string(),
+        'name': pa.string(),
+        'article': pa.int64(),
+        'min_price': pa.float64(),
+        'main_material': pa.string(),
+    }
+    types.update({name: pa.float64() for name in extra_float})
+    return types
+
+def _fetch_products_arrow(query, *extra_float):
+    """
+    Продукция через Arrow. Если в числовых колонках лежат строки
+    (например '12 500 руб.'), они читаются как текст и чистятся
+    _normalize_products_df, как в pandas-пути.
+    """
+    try:
+        df, nulls = _arrow_frame(query, _products_arrow_types(*extra_float),
+                                 zero_fill=('id', 'article', 'min_price'))
+        df.attrs['coerced_rows'] = nulls['min_price']
+        return df
+    except pa.ArrowInvalid:
+        logger.info("products: numeric columns contain text, falling back to string parsing")
+    
+    types = _products_arrow_types(*extra_float)
+    for name in ('id', 'article', 'min_price'):
+        types[name] = pa.string()
+    df = fetch_arrow(query, column_types=types).to_pandas()
+    return _normalize_products_df(df) if not df.empty else df
+
+# потоковое чтение через именованный (серверный) курсор: строки приходят
+# порциями по DB_STREAM_ITERSIZE, в памяти процесса - только текущая порция
+STREAM_ITERSIZE = int(os.getenv('DB_STREAM_ITERSIZE', '10000'))
+
+# с какого оценочного числа строк таблицы get_products/get_workshops/
+# get_products_with_production_time собирают кадр из порций (0 - никогда)
+STREAM_THRESHOLD = int(os.getenv('DB_STREAM_THRESHOLD', '2000000'))
+
+_stream_ids = itertools.count(1)
+
+def stream_query(query, params=None, itersize=None, chunks=False):
+    """
+    Генератор результата запроса через серверный курсор
+
+    chunks=False - строки (кортежи) по одной, chunks=True - DataFrame на каждую
+    порцию из itersize строк (по умолчанию STREAM_ITERSIZE). Подключение из
+    пула занято, пока генератор не исчерпан или не закрыт (close()).
+    """
+    itersize = itersize or STREAM_ITERSIZE
+    started = time.perf_counter()
+    rows_read = 0
+    
+    with db.connection() as conn:
+        with conn.cursor(name=f"stream_{next(_stream_ids)}") as cursor:
+            cursor.itersize = itersize
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(itersize)
+                if not rows:
+                    break
+                rows_read += len(rows)
+                if chunks:
+                    columns = [desc[0] for desc in cursor.description]
+                    yield pd.DataFrame(rows, columns=columns)
+                else:
+                    yield from rows
+    
+    metrics.registry.observe('function', 'db.stream_query', time.perf_counter() - started, rows=rows_read)
+
+@metrics.instrument
+def estimated_rows(table):
+    """
+    Оценка числа строк таблицы по статистике планировщика (pg_class.reltuples),
+    без COUNT(*). None - таблицу ещё не анализировали или её нет.
+    """
+    try:
+        with db.cursor() as cursor:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)',
+                           (f'public."{table}"',))
+            row = cursor.fetchone()
+        if row is None or row[0] < 0:
+            return None
+        return row[0]
+    except Exception as e:
+        print(f"❌ Ошибка при оценке размера {table}: {e}")
+        return None
+
+def _use_stream(stream, table):
+    """stream=None - по порогу STREAM_THRESHOLD, иначе как задано"""
+    if stream is not None:
+        return bool(stream)
+    if STREAM_THRESHOLD <= 0:
+        return False
+    rows = estimated_rows(table)
+    return rows is not None and rows >= STREAM_THRESHOLD
+
+def _products_query(with_production_time=False):
+    if not with_production_time:
+        return _PRODUCTS_SELECT + """
+            FROM public."Products_import" p
+            ORDER BY p."id"
+        """
+    return _PRODUCTS_SELECT + """,
+            COALESCE(t.total_time_h, 0) as production_time_h
+        FROM public."Products_import" p
+    """ + _PRODUCTION_TIME_JOIN + """
+        ORDER BY p."id"
+    """
+
+def iter_products(with_production_time=False, itersize=None,
+                  filter_type=None, search=None, has_time=None, sort='id'):
+    """
+    Продукция порциями (DataFrame, типы как у get_products) - для выгрузок
+    и расчётов по всему каталогу без загрузки его в память целиком
+
+    filter_type, search, has_time и sort - как в query_products.
+    """
+    order_by = _product_order_by(sort)
+    conditions, params = _product_conditions(filter_type, search, has_time)
+    
+    if not conditions and sort == 'id':
+        query = _products_query(with_production_time)
+    else:
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = _PRODUCTS_SELECT + f""",
+                COALESCE(t.total_time_h, 0) as production_time_h
+            FROM public."Products_import" p
+            {_PRODUCTION_TIME_JOIN}
+            {where}
+            ORDER BY {order_by}
+        """
+    
+    for chunk in stream_query(query, params or None, itersize=itersize, chunks=True):
+        production_times = chunk.pop('production_time_h') if 'production_time_h' in chunk else None
+        chunk = _normalize_products_df(chunk)
+        if with_production_time:
+            chunk['production_time_h'] = pd.to_numeric(production_times, errors='coerce').fillna(0.0)
+        yield chunk
+
+def _concat_chunks(chunks):
+    """
+    Кадр из порций (без порций - пустой). С pyarrow порции сразу переводятся
+    в Arrow - копятся компактные колонки, а не Python-объекты всех строк.
+    """
+    parts = []
+    coerced = 0
+    for chunk in chunks:
+        coerced += chunk.attrs.get('coerced_rows', 0)
+        parts.append(pa.Table.from_pandas(chunk, preserve_index=False) if pa is not None else chunk)
+    
+    if not parts:
+        return pd.DataFrame()
+    if pa is not None:
+        df = pa.concat_tables(parts).to_pandas(types_mapper=pd.ArrowDtype)
+    else:
+        df = pd.concat(parts, ignore_index=True)
+    df.attrs['coerced_rows'] = coerced
+    return df
+
+@metrics.instrument
+def get_products(fetch=None, stream=None):
     """
     Функция для получения всей продукции из таблицы Products_import
+
+    fetch - 'arrow' или 'pandas' (по умолчанию DB_FETCH_MODE);
+    stream - собирать кадр из порций серверного курсора (None - если в
+    таблице не меньше STREAM_THRESHOLD строк)
     """
     try:
-        engine = db.get_engine()
-        
-        # запрос через SQLAlchemy
-        query = text("""
-            SELECT 
-                "id" as id,
-                "Product type" as product_type,
-                "Product name" as name,
-                "Article" as article,
-                "Minimum cost for a partner" as min_price,
-                "Main material" as main_material
-            FROM public."Products_import"
-            ORDER BY "id"
-        """)
-        
-        with engine.connect() as connection:
-            df = pd.read_sql(query, connection)
-            print(f"✅ Загружено {len(df)} записей через SQLAlchemy")
+        query = _products_query()
+        
+        if _use_stream(stream, 'Products_import'):
+            df = _concat_chunks(iter_products())
+        elif _fetch_mode(fetch) == 'arrow':
+            df = _fetch_products_arrow(query)
+        else:
+            df = read_frame(query)
             
             if not df.empty:
-                print(f"\n🔍 ТИПЫ ДАННЫХ ДО ПРЕОБРАЗОВАНИЯ:")
-                for col in df.columns:
-                    print(f"   {col}: {df[col].dtype}")
-                    if col == 'min_price':
-                        print(f"     Пример значений: {df[col].head().tolist()}")
-                
-                # id -> int
-                if 'id' in df.columns:
-                    df['id'] = pd.to_numeric(df['id'], errors='coerce').fillna(0).astype(int)
-                
-                # article -> int
-                if 'article' in df.columns:
-                    df['article'] = pd.to_numeric(df['article'], errors='coerce').fillna(0).astype(int)
-                
-                # min_price -> float
-                if 'min_price' in df.columns:
-                    original_values = df['min_price'].copy()
-                    df['min_price'] = pd.to_numeric(df['min_price'], errors='coerce')
-                    
-                    nan_count = df['min_price'].isna().sum()
-                    if nan_count > 0:
-                        print(f"     ⚠️ {nan_count} значений не удалось преобразовать напрямую")
-                        
-                        for idx in df[df['min_price'].isna()].index:
-                            original_val = original_values[idx]
-                            if isinstance(original_val, str):
-                                clean_val = ''.join(c for c in original_val if c.isdigit() or c in '.-')
-                                if clean_val:
-                                    try:
-                                        df.loc[idx, 'min_price'] = float(clean_val)
-                                        print(f"       Строка {idx}: '{original_val}' -> {clean_val} -> {float(clean_val)}")
-                                    except:
-                                        df.loc[idx, 'min_price'] = 0.0
-                                        print(f"       Строка {idx}: '{original_val}' -> 0.0 (ошибка преобразования)")
-                    
-                    df['min_price'] = df['min_price'].fillna(0.0)
-                    print(f"   ✅ min_price: преобразовано в float, NaN заменены на 0.0")
-                    
-                    print(f"     Тип после преобразования: {df['min_price'].dtype}")
-                    print(f"     Пример значений после: {df['min_price'].head().tolist()}")
-                
-                print(f"\n📊 ИТОГОВЫЕ ТИПЫ ДАННЫХ:")
-                for col in df.columns:
-                    print(f"   {col}: {df[col].dtype}")
-                
-                print(f"\n📝 ПЕРВЫЕ 3 СТРОКИ ДАННЫХ:")
-                print(df.head(3).to_string())
-            
-            return df
+                df = _normalize_products_df(df)
+        
+        df = compact_frame(df)
+        logger.info(
+            "get_products: rows=%d coerced_rows=%d memory_bytes=%d",
+            len(df), df.attrs.get('coerced_rows', 0), df.attrs['memory_bytes']
+        )
+        return df
             
-    except SQLAlchemyError as e:
-        print(f"❌ Ошибка SQLAlchemy: {e}")
-        return pd.DataFrame()
     except Exception as e:
         print(f"❌ Общая ошибка: {e}")
+        if raising_errors():
+            raise
         return pd.DataFrame()
 
+@metrics.instrument
 def get_product_by_id(product_id):
     """
     Функция для получения данных о конкретном продукте по ID
     """
+    key = f'product:{product_id}'
+    found, cached_value = cache.get(key)
+    if found:
+        return cached_value
+    
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM public."Products_import" WHERE "id" = %s', (product_id,))
-        columns = [desc[0] for desc in cursor.description]
-        row = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
+        with db.cursor() as cursor:
+            cursor.execute('SELECT * FROM public."Products_import" WHERE "id" = %s', (product_id,))
+            columns = [desc[0] for desc in cursor.description]
+            row = cursor.fetchone()
         
         if row:
-            return dict(zip(columns, row))
+            product = dict(zip(columns, row))
+            _cache_set(key, product)
+            return product
         return None
         
     except Exception as e:
         print(f"Ошибка при загрузке продукта {product_id}: {e}")
+        if raising_errors():
+            raise
         return None
 
+@metrics.instrument
 def add_product(product_data):
     """
-    добавление нового продукта
+    добавление нового продукта (id выдаёт последовательность таблицы)
     """
     try:
-        next_id = get_next_product_id()
-        
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        INSERT INTO public."Products_import" 
-        ("id", "Product type", "Product name", "Article", 
-         "Minimum cost for a partner", "Main material")
-        VALUES (%s, %s, %s, %s, %s, %s)
-        RETURNING "id"
-        """
-        
-        cursor.execute(query, (
-            next_id,
-            product_data['product_type'],
-            product_data['name'],
-            product_data['article'],
-            product_data['min_price'],
-            product_data['main_material']
-        ))
-        
-        new_id = cursor.fetchone()[0]
-        conn.commit()
-        
-        cursor.close()
-        conn.close()
-        
-        print(f"✅ Продукт добавлен с ID: {new_id}")
-        return new_id
-        
-    except Exception as e:
-        try:
-            print("🔄 Пробуем добавить без указания ID...")
-            conn = db.get_raw_connection()
-            cursor = conn.cursor()
-            
+        with db.cursor() as cursor:
             query = """
             INSERT INTO public."Products_import" 
             ("Product type", "Product name", "Article", 
@@ -221,47 +721,63 @@ def add_product(product_data):
             ))
             
             new_id = cursor.fetchone()[0]
-            conn.commit()
-            
-            cursor.close()
-            conn.close()
-            
-            print(f"✅ Продукт добавлен с ID: {new_id} (автоматически)")
-            return new_id
-            
-        except Exception as e2:
-            print(f"❌ Ошибка при повторной попытке: {e2}")
-            raise
+        
+        _invalidate_products()
+        print(f"✅ Продукт добавлен с ID: {new_id}")
+        return new_id
+        
+    except Exception as e:
+        print(f"❌ Ошибка при добавлении продукта: {e}")
+        raise
 
+def _reserve_ids(table, count):
+    with db.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            (f'public."{table}"', int(count))
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+@metrics.instrument
+def reserve_product_ids(count):
+    """
+    Резервирует count id продукции одним запросом (для массовых вставок
+    с заранее известными id). Неиспользованные id просто пропадают.
+    """
+    return _reserve_ids('Products_import', count)
+
+@metrics.instrument
+def reserve_production_time_ids(count):
+    """
+    Резервирует count id записей времени производства одним запросом
+    """
+    return _reserve_ids('Product_workshops_import', count)
+
+@metrics.instrument
 def update_product(product_id, product_data):
     """
     Обновление данных существующего продукта
     """
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        UPDATE public."Products_import" 
-        SET "Product type" = %s, "Product name" = %s, "Article" = %s,
-            "Minimum cost for a partner" = %s, "Main material" = %s
-        WHERE "id" = %s
-        """
-        
-        cursor.execute(query, (
-            product_data['product_type'],
-            product_data['name'],
-            product_data['article'],
-            product_data['min_price'],
-            product_data['main_material'],
-            product_id
-        ))
-        
-        conn.commit()
+        with db.cursor() as cursor:
+            query = """
+            UPDATE public."Products_import" 
+            SET "Product type" = %s, "Product name" = %s, "Article" = %s,
+                "Minimum cost for a partner" = %s, "Main material" = %s
+            WHERE "id" = %s
+            """
         
-        cursor.close()
-        conn.close()
+            cursor.execute(query, (
+                product_data['product_type'],
+                product_data['name'],
+                product_data['article'],
+                product_data['min_price'],
+                product_data['main_material'],
+                product_id
+            ))
         
+        # имя в записях времени производства обновляет триггер products_sync_names
+        _invalidate_products([product_id])
         print(f"✅ Продукт {product_id} обновлен")
         return True
         
@@ -269,20 +785,16 @@ def update_product(product_id, product_data):
         print(f"❌ Ошибка при обновлении продукта {product_id}: {e}")
         raise
 
+@metrics.instrument
 def delete_product(product_id):
     """Удаляет продукт по ID"""
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        query = 'DELETE FROM public."Products_import" WHERE "id" = %s'
-        cursor.execute(query, (product_id,))
-        
-        conn.commit()
-        
-        cursor.close()
-        conn.close()
+        with db.cursor() as cursor:
+            query = 'DELETE FROM public."Products_import" WHERE "id" = %s'
+            cursor.execute(query, (product_id,))
         
+        # записи времени производства удаляются каскадно
+        _invalidate_products([product_id])
         print(f"✅ Продукт {product_id} удален")
         return True
         
@@ -290,171 +802,249 @@ def delete_product(product_id):
         print(f"❌ Ошибка при удалении продукта {product_id}: {e}")
         raise
 
-def get_workshops():
-    """Получает список всех цехов"""
+@metrics.instrument
+def get_workshops(fetch=None, stream=None):
+    """Получает список всех цехов (fetch и stream - как в get_products)"""
     try:
-        engine = db.get_engine()
-        
-        query = text("""
+        query = """
             SELECT 
                 "id" as id,
                 "Workshop name" as name,
                 "Number of people for production" as employee_count
             FROM public."Workshops_import"
             ORDER BY "id"
-        """)
+        """
         
-        with engine.connect() as connection:
-            df = pd.read_sql(query, connection)
+        if _use_stream(stream, 'Workshops_import'):
+            df = _concat_chunks(stream_query(query, chunks=True))
+        elif _fetch_mode(fetch) == 'arrow':
+            try:
+                df, _ = _arrow_frame(query, {'id': pa.int64(), 'name': pa.string(),
+                                             'employee_count': pa.int64()},
+                                     zero_fill=('employee_count',))
+            except pa.ArrowInvalid:
+                df = fetch_arrow(query, column_types={'name': pa.string(),
+                                                      'employee_count': pa.string()}).to_pandas()
+        else:
+            df = read_frame(query)
             
-            if not df.empty and 'employee_count' in df.columns:
-                df['employee_count'] = pd.to_numeric(df['employee_count'], errors='coerce').fillna(0).astype(int)
-            
-            return df
+        if not df.empty and not pd.api.types.is_integer_dtype(df['employee_count'].dtype):
+            df['employee_count'] = pd.to_numeric(df['employee_count'], errors='coerce').fillna(0).astype(int)
+        
+        df = compact_frame(df)
+        logger.info("get_workshops: rows=%d memory_bytes=%d", len(df), df.attrs['memory_bytes'])
+        return df
             
     except Exception as e:
         print(f"❌ Ошибка при загрузке цехов: {e}")
+        if raising_errors():
+            raise
         return pd.DataFrame()
 
+@metrics.instrument
+def get_workshop_list():
+    """
+    Цеха списком словарей (id, name, employee_count) - кэшируемый вариант
+    get_workshops для API и справочников
+    """
+    found, cached_value = cache.get('workshop_list')
+    if found:
+        return cached_value
+    
+    try:
+        with db.cursor() as cursor:
+            cursor.execute("""
+                SELECT "id", "Workshop name", "Number of people for production"
+                FROM public."Workshops_import"
+                ORDER BY "id"
+            """)
+            rows = cursor.fetchall()
+        
+        # как в get_workshops: нечисловое число сотрудников -> 0
+        counts = clean_int(pd.Series([row[2] for row in rows], dtype=object)).tolist()
+        result = [
+            {'id': row[0], 'name': row[1], 'employee_count': count}
+            for row, count in zip(rows, counts)
+        ]
+        
+        _cache_set('workshop_list', result)
+        return result
+        
+    except Exception as e:
+        print(f"❌ Ошибка при загрузке списка цехов: {e}")
+        if raising_errors():
+            raise
+        return []
+
+@metrics.instrument
 def get_product_types():
     """
     Получение типов продукции и коэффициенты
     """
+    found, cached_value = cache.get('product_types')
+    if found:
+        return cached_value
+    
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT 
-            "id" as id,
-            "Product type" as name,
-            "Product type coefficient" as coefficient
-        FROM public."Product_type_import"
-        ORDER BY "id"
-        """
-        
-        cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
-        
-        result = []
-        for row in rows:
-            row_dict = dict(zip(columns, row))
-            if 'coefficient' in row_dict:
-                try:
-                    row_dict['coefficient'] = float(row_dict['coefficient'])
-                except:
-                    row_dict['coefficient'] = 1.0
-            result.append(row_dict)
-        
-        cursor.close()
-        conn.close()
+        with db.cursor() as cursor:
+            query = """
+            SELECT 
+                "id" as id,
+                "Product type" as name,
+                "Product type coefficient" as coefficient
+            FROM public."Product_type_import"
+            ORDER BY "id"
+            """
         
+            cursor.execute(query)
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+        
+            result = []
+            for row in rows:
+                row_dict = dict(zip(columns, row))
+                if 'coefficient' in row_dict:
+                    try:
+                        row_dict['coefficient'] = float(row_dict['coefficient'])
+                    except:
+                        row_dict['coefficient'] = 1.0
+                result.append(row_dict)
+        
+        _cache_set('product_types', result)
         return result
         
     except Exception as e:
         print(f"❌ Ошибка при загрузке типов продукции: {e}")
+        if raising_errors():
+            raise
         return []
 
+@metrics.instrument
 def get_material_types():
     """
     Получение типов материалов и процентов потерь
     """
+    found, cached_value = cache.get('material_types')
+    if found:
+        return cached_value
+    
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT 
-            "id" as id,
-            "Type material" as name,
-            "Percentage of raw material losses" as loss_percent
-        FROM public."Material_type_import"
-        ORDER BY "id"
-        """
-        
-        cursor.execute(query)
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
-        
-        result = []
-        for row in rows:
-            row_dict = dict(zip(columns, row))
-            if 'loss_percent' in row_dict:
-                try:
-                    row_dict['loss_percent'] = float(row_dict['loss_percent'])
-                except:
-                    row_dict['loss_percent'] = 0.0
-            result.append(row_dict)
-        
-        cursor.close()
-        conn.close()
+        with db.cursor() as cursor:
+            query = """
+            SELECT 
+                "id" as id,
+                "Type material" as name,
+                "Percentage of raw material losses" as loss_percent
+            FROM public."Material_type_import"
+            ORDER BY "id"
+            """
         
+            cursor.execute(query)
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+        
+            result = []
+            for row in rows:
+                row_dict = dict(zip(columns, row))
+                if 'loss_percent' in row_dict:
+                    try:
+                        row_dict['loss_percent'] = float(row_dict['loss_percent'])
+                    except:
+                        row_dict['loss_percent'] = 0.0
+                result.append(row_dict)
+        
+        _cache_set('material_types', result)
         return result
         
     except Exception as e:
         print(f"❌ Ошибка при загрузке типов материалов: {e}")
+        if raising_errors():
+            raise
         return []
 
+@metrics.instrument
+def get_raw_material_factors():
+    """
+    Коэффициенты типов продукции и проценты потерь материалов для
+    калькулятора (calculator.FactorTable). Строится из справочников один раз
+    и живёт в кэше, пока не изменится Product_type_import или Material_type_import.
+    """
+    import calculator
+    
+    found, cached_value = cache.get('raw_material_factors')
+    if found:
+        return cached_value
+    
+    factors = calculator.FactorTable(get_product_types(), get_material_types())
+    # пустую (база недоступна) не кэшируем - попробуем в следующий раз
+    if factors.is_complete():
+        _cache_set('raw_material_factors', factors)
+        print(f"🧮 Коэффициенты сырья: типов {len(factors.types)}, материалов {len(factors.materials)}")
+    return factors
+
+@metrics.instrument
 def get_unique_product_types():
     """
     Получение уникальных типов продукции для фильтров
     """
+    found, cached_value = cache.get('unique_product_types')
+    if found:
+        return cached_value
+    
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
+        with db.cursor() as cursor:
+            query = 'SELECT DISTINCT "Product type" FROM public."Products_import"'
+            cursor.execute(query)
         
-        query = 'SELECT DISTINCT "Product type" FROM public."Products_import"'
-        cursor.execute(query)
+            result = [row[0] for row in cursor.fetchall()]
         
-        result = [row[0] for row in cursor.fetchall()]
-        
-        cursor.close()
-        conn.close()
-        
-        return result
+        _cache_set('unique_product_types', result)
+        return result
         
     except Exception as e:
         print(f"❌ Ошибка при загрузке уникальных типов: {e}")
+        if raising_errors():
+            raise
         return []
 
+@metrics.instrument
 def get_unique_materials():
     """
     Полученипе уникальных материалов для фильтров
     """
+    found, cached_value = cache.get('unique_materials')
+    if found:
+        return cached_value
+    
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
+        with db.cursor() as cursor:
+            query = 'SELECT DISTINCT "Main material" FROM public."Products_import"'
+            cursor.execute(query)
         
-        query = 'SELECT DISTINCT "Main material" FROM public."Products_import"'
-        cursor.execute(query)
-        
-        result = [row[0] for row in cursor.fetchall()]
-        
-        cursor.close()
-        conn.close()
+            result = [row[0] for row in cursor.fetchall()]
         
+        _cache_set('unique_materials', result)
         return result
         
     except Exception as e:
         print(f"❌ Ошибка при загрузке уникальных материалов: {e}")
+        if raising_errors():
+            raise
         return []
 
+@metrics.instrument
 def get_next_product_id():
     """
     Получение корректьного айди для нового продукта
+    (только для отображения: при вставке id выдаёт последовательность,
+    см. add_product и reserve_product_ids)
     """
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT MAX("id") FROM public."Products_import"')
-        result = cursor.fetchone()
-        
-        max_id = result[0] if result[0] is not None else 0
+        with db.cursor() as cursor:
+            cursor.execute('SELECT MAX("id") FROM public."Products_import"')
+            result = cursor.fetchone()
         
-        cursor.close()
-        conn.close()
+            max_id = result[0] if result[0] is not None else 0
         
         next_id = max_id + 1
         print(f"📈 Следующий доступный ID: {next_id} (максимальный: {max_id})")
@@ -462,168 +1052,774 @@ def get_next_product_id():
         
     except Exception as e:
         print(f"❌ Ошибка при получении следующего ID: {e}")
+        if raising_errors():
+            raise
         return 1
 
-def get_production_time_for_product(product_name):
+def _product_id_by_name(product_name):
     """
-    получение общего времени производства для продукта
-    (сумма времени из всех связанных цехов)
+    id продукта по названию (пробелы по краям, в т.ч. неразрывные, не учитываются,
+    при совпадении предпочтение - точному названию и меньшему id)
+    """
+    with db.cursor() as cursor:
+        cursor.execute("""
+            SELECT "id" FROM public."Products_import"
+            WHERE public.name_key("Product name") = public.name_key(%s)
+            ORDER BY ("Product name" = %s) DESC, "id"
+            LIMIT 1
+        """, (product_name, product_name))
+        row = cursor.fetchone()
+    return row[0] if row else None
+
+def _workshop_id_by_name(workshop_name):
+    return get_workshop_ids().get(workshop_name)
+
+@metrics.instrument
+def get_production_time_for_product_id(product_id):
+    """
+    получение общего времени производства для продукта по id
+    (сумма времени из всех связанных цехов, из таблицы итогов)
     """
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT SUM("Production time, h") as total_time
-        FROM public."Product_workshops_import"
-        WHERE "Product name" = %s
-        """
-        
-        cursor.execute(query, (product_name,))
-        result = cursor.fetchone()
+        with db.cursor() as cursor:
+            query = """
+            SELECT total_time_h
+            FROM public.product_production_time
+            WHERE product_id = %s
+            """
         
-        cursor.close()
-        conn.close()
+            cursor.execute(query, (product_id,))
+            result = cursor.fetchone()
         
-        total_time = result[0] if result[0] is not None else 0
-        print(f"⏱️ Время производства для '{product_name}': {total_time} ч.")
+        total_time = result[0] if result else 0
+        print(f"⏱️ Время производства для продукта {product_id}: {total_time} ч.")
         return total_time
         
     except Exception as e:
         print(f"❌ Ошибка при получении времени производства: {e}")
+        if raising_errors():
+            raise
         return 0
 
-def get_products_with_production_time():
+@metrics.instrument
+def get_production_time_for_product(product_name):
+    """
+    получение общего времени производства для продукта по названию
+    (обёртка над get_production_time_for_product_id)
+    """
+    try:
+        product_id = _product_id_by_name(product_name)
+    except Exception as e:
+        print(f"❌ Ошибка при получении времени производства: {e}")
+        if raising_errors():
+            raise
+        return 0
+    
+    if product_id is None:
+        return 0
+    return get_production_time_for_product_id(product_id)
+
+# итоги, пересчитанные по Product_workshops_import (для сверки с product_production_time)
+_PRODUCTION_ROLLUP_SOURCE = """
+    SELECT product_id,
+           SUM("Production time, h"::numeric)::double precision as total_time_h,
+           COUNT(DISTINCT workshop_id) as workshop_count
+    FROM public."Product_workshops_import"
+    WHERE product_id IS NOT NULL
+    GROUP BY product_id
+"""
+
+@metrics.instrument
+def verify_production_rollup(tolerance=1e-6):
+    """
+    Сверка таблицы итогов product_production_time с исходными записями
+
+    Возвращает DataFrame расхождений (product_id, expected_*, actual_*);
+    пустой - итоги верны.
+    """
+    with db.cursor() as cursor:
+        cursor.execute(f"""
+            SELECT
+                COALESCE(s.product_id, r.product_id) as product_id,
+                s.total_time_h as expected_time_h,
+                r.total_time_h as actual_time_h,
+                s.workshop_count as expected_workshops,
+                r.workshop_count as actual_workshops
+            FROM ({_PRODUCTION_ROLLUP_SOURCE}) s
+            FULL JOIN public.product_production_time r ON r.product_id = s.product_id
+            WHERE s.product_id IS NULL OR r.product_id IS NULL
+               OR abs(s.total_time_h - r.total_time_h) > %s
+               OR s.workshop_count <> r.workshop_count
+            ORDER BY 1
+        """, (tolerance,))
+        columns = [desc[0] for desc in cursor.description]
+        drift = pd.DataFrame(cursor.fetchall(), columns=columns)
+
+    if drift.empty:
+        logger.info("production rollup: ok")
+    else:
+        logger.warning("production rollup: drift in %d products", len(drift))
+    return drift
+
+@metrics.instrument
+def rebuild_production_rollup():
+    """
+    Полный пересчёт product_production_time. Записи времени производства на
+    время пересчёта блокируются от изменений. Возвращает число строк итогов.
+    """
+    with db.cursor() as cursor:
+        cursor.execute('LOCK TABLE public."Product_workshops_import" IN SHARE MODE')
+        cursor.execute('DELETE FROM public.product_production_time')
+        cursor.execute(f"""
+            INSERT INTO public.product_production_time (product_id, total_time_h, workshop_count)
+            {_PRODUCTION_ROLLUP_SOURCE}
+        """)
+        rows = cursor.rowcount
+
+    invalidate_table_cache('Product_workshops_import')
+    print(f"✅ Итоги времени производства пересчитаны: {rows} продуктов")
+    return rows
+
+def _fetch_products_with_time(query, fetch=None):
+    """Кадр продукции с production_time_h (без compact_frame)"""
+    if _fetch_mode(fetch) == 'arrow':
+        return _fetch_products_arrow(query, 'production_time_h')
+    
+    products_df = read_frame(query)
+    
+    if not products_df.empty:
+        production_times = products_df.pop('production_time_h')
+        products_df = _normalize_products_df(products_df)
+        products_df['production_time_h'] = production_times.tolist()
+    return products_df
+
+@metrics.instrument
+def get_products_with_production_time(fetch=None, stream=None):
     """
     Получение списка продукции с рассчитанным временем производства
+    (одним запросом: сумма времени по цехам присоединяется через LEFT JOIN)
+
+    fetch и stream - как в get_products
     """
     try:
-        products_df = get_products()
+        query = _products_query(with_production_time=True)
+        
+        if _use_stream(stream, 'Products_import'):
+            products_df = _concat_chunks(iter_products(with_production_time=True))
+        else:
+            products_df = _fetch_products_with_time(query, fetch)
         
         if products_df.empty:
             return pd.DataFrame()
         
-        production_times = []
-        for _, product in products_df.iterrows():
-            product_name = product['name']
-            total_time = get_production_time_for_product(product_name)
-            production_times.append(total_time)
-        
-        products_df['production_time_h'] = production_times
+        products_df = compact_frame(products_df)
+        logger.info(
+            "get_products_with_production_time: rows=%d coerced_rows=%d memory_bytes=%d",
+            len(products_df), products_df.attrs['coerced_rows'], products_df.attrs['memory_bytes']
+        )
         return products_df
         
     except Exception as e:
         print(f"❌ Ошибка при загрузке продуктов с временем производства: {e}")
+        if raising_errors():
+            raise
         return pd.DataFrame()
 
-def get_available_workshops():
+# ---- кадр продукции в памяти, обновляемый дельтами ----------------------------
+#
+# Кадр get_products_with_production_time() держится в памяти процесса и
+# обновляется по журналу products_change_log (миграция 006): читаются
+# только продукты, изменённые после отметки прошлого обновления, и
+# вливаются в кадр по id. Изменения через db.py и уведомления от других
+# процессов (notifications.py) помечают кадр устаревшим; без них он всё
+# равно сверяется с журналом раз в DB_PRODUCTS_RECHECK секунд.
+
+PRODUCTS_RECHECK = float(os.getenv('DB_PRODUCTS_RECHECK', '60'))
+# если изменилось больше этой доли строк - проще перечитать всё
+PRODUCTS_DELTA_MAX = float(os.getenv('DB_PRODUCTS_DELTA_MAX', '0.25'))
+
+# index - индекс n-грамм для поиска без pg_trgm (строится при первом поиске
+# и дальше обновляется теми же дельтами, что и кадр)
+_products_frame = {'df': None, 'marker': None, 'dirty': True, 'checked_at': 0.0, 'version': 0,
+                   'index': None}
+_products_frame_lock = threading.Lock()
+
+def _mark_products_dirty():
+    _products_frame['dirty'] = True
+
+def _products_change_marker(cursor):
+    cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text')
+    return int(cursor.fetchone()[0])
+
+def get_products_changes(since):
     """
-    Получение списка всех доступных цехов
+    Продукты, изменённые транзакциями с номером не меньше since (отметки
+    прошлого обновления). Возвращает (новая отметка, список id); id None -
+    нужна полная перезагрузка (был TRUNCATE, см. миграцию 006).
+    """
+    with db.cursor() as cursor:
+        # отметку берём до чтения журнала: пропустить изменения нельзя,
+        # прочитать лишнее - можно
+        marker = _products_change_marker(cursor)
+        cursor.execute(
+            'SELECT 1 FROM public.products_change_reset WHERE changed_xid >= %s::xid8',
+            (str(since),)
+        )
+        if cursor.fetchone() is not None:
+            return marker, None
+        
+        cursor.execute(
+            'SELECT product_id FROM public.products_change_log WHERE changed_xid >= %s::xid8',
+            (str(since),)
+        )
+        ids = [row[0] for row in cursor.fetchall()]
+    
+    return marker, ids
+
+def _products_by_ids_query(ids):
+    # id - целые из журнала, подставляются литералом массива
+    id_list = ','.join(str(int(i)) for i in ids)
+    return _PRODUCTS_SELECT + """,
+            COALESCE(t.total_time_h, 0) as production_time_h
+        FROM public."Products_import" p
+    """ + _PRODUCTION_TIME_JOIN + f"""
+        WHERE p."id" = ANY('{{{id_list}}}'::integer[])
+        ORDER BY p."id"
+    """
+
+def _align_column(base, values):
+    """
+    Приводит values (свежая выборка) к типу колонки кадра base. Категории
+    дополняются новыми значениями, а если значения не помещаются в сжатый
+    тип (int8, float32) - расширяется колонка base. Возвращает (base, values).
     """
+    dtype = base.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        new = set(values.dropna()) - set(dtype.categories)
+        if new:
+            base = base.cat.add_categories(sorted(new))
+        return base, values.astype(base.dtype)
+    
+    if values.dtype == dtype:
+        return base, values
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
+        fitted = values.astype(dtype)
+        if pd.api.types.is_numeric_dtype(dtype):
+            exact = np.array_equal(fitted.to_numpy('float64', na_value=np.nan),
+                                   values.to_numpy('float64', na_value=np.nan), equal_nan=True)
+        else:
+            exact = True
+    except (TypeError, ValueError, OverflowError):
+        exact = False
+    if exact:
+        return base, fitted
+    return base.astype(values.dtype), values
+
+def merge_products(df, changed, changed_ids):
+    """
+    Вливает строки changed в кадр df по id: строки с id из changed_ids
+    заменяются строками changed, а которых в changed нет - удаляются.
+    Возвращает новый кадр (df не меняется), отсортированный по id.
+    """
+    keep = ~df['id'].isin(list(changed_ids))
+    base = df[keep]
+    if not changed.empty:
+        # типы кадра (категории, сжатые числа) сохраняем - пересжимать
+        # весь кадр ради сотни строк дороже, чем сама выборка
+        base_columns, changed_columns = {}, {}
+        for column in df.columns:
+            base_columns[column], changed_columns[column] = _align_column(
+                base[column], changed[column].set_axis(range(len(base), len(base) + len(changed)))
+            )
+        base = pd.concat([pd.DataFrame(base_columns).reset_index(drop=True),
+                          pd.DataFrame(changed_columns)])
+        if not base['id'].is_monotonic_increasing:
+            base = base.sort_values('id', kind='stable')
+    
+    merged = base.reset_index(drop=True)
+    merged.attrs = dict(df.attrs)
+    merged.attrs['coerced_rows'] = df.attrs.get('coerced_rows', 0) + changed.attrs.get('coerced_rows', 0)
+    merged.attrs['memory_bytes'] = int(merged.memory_usage(deep=True).sum())
+    return merged
+
+def _reload_products():
+    with db.cursor() as cursor:
+        marker = _products_change_marker(cursor)
+    df = get_products_with_production_time(stream=False)
+    return df, marker
+
+@metrics.instrument
+def refresh_products(since=None):
+    """
+    Обновляет кадр продукции в памяти: читает из базы только продукты,
+    изменённые (добавленные, обновлённые, удалённые) с отметки since (по
+    умолчанию - с прошлого обновления), и вливает их в кадр по id. Без
+    кадра, после TRUNCATE или при слишком большой дельте - полная загрузка.
+
+    Возвращает кадр (как get_products_with_production_time; не изменять).
+    """
+    with _products_frame_lock:
+        state = _products_frame
+        df = state['df']
+        since = state['marker'] if since is None else since
+        state['dirty'] = False
+        
+        changed_ids = None
+        if df is not None and since is not None:
+            try:
+                marker, changed_ids = get_products_changes(since)
+            except Exception as e:
+                # например, миграция 006 ещё не применена
+                logger.warning("products delta unavailable: %s", e)
+        
+        if changed_ids is not None and len(changed_ids) > max(len(df), 1) * PRODUCTS_DELTA_MAX:
+            changed_ids = None
+        
+        if changed_ids is None:
+            df, marker = _reload_products()
+            state['index'] = None
+            metrics.registry.increment('products_full_reloads')
+        elif changed_ids:
+            changed = _fetch_products_with_time(_products_by_ids_query(changed_ids))
+            df = merge_products(df, changed, changed_ids)
+            if state['index'] is not None:
+                _update_search_index(state['index'], changed, changed_ids)
+            metrics.registry.increment('products_delta_rows', len(changed_ids))
+            logger.info("refresh_products: changed=%d rows=%d", len(changed_ids), len(df))
+        
+        if changed_ids is None or changed_ids:
+            state['version'] += 1
+        state['df'] = df
+        state['marker'] = marker
+        state['checked_at'] = time.monotonic()
+        return df
+
+def get_cached_products():
+    """
+    Кадр продукции с временем производства из памяти процесса; обновляется
+    дельтой, если помечен устаревшим или не сверялся DB_PRODUCTS_RECHECK секунд.
+    Возвращает (кадр, версия) - версия растёт при каждом изменении кадра.
+    """
+    state = _products_frame
+    stale = time.monotonic() - state['checked_at'] > PRODUCTS_RECHECK
+    if state['df'] is None or state['dirty'] or stale:
+        refresh_products()
+    return state['df'], state['version']
+
+# допустимые варианты сортировки для query_products ('-' в начале - по убыванию)
+PRODUCT_SORT_COLUMNS = {
+    'id': 'p."id"',
+    'name': 'p."Product name"',
+    'product_type': 'p."Product type"',
+    'article': 'p."Article"',
+    'min_price': 'p."Minimum cost for a partner"',
+    'production_time_h': 'production_time_h',
+}
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _product_conditions(filter_type=None, search=None, has_time=None):
+    """Условия WHERE и параметры для фильтров списка продукции"""
+    conditions = []
+    params = {}
+    
+    if filter_type:
+        conditions.append('p."Product type" = %(filter_type)s')
+        params['filter_type'] = filter_type
+    
+    if search:
+        conditions.append('(p."Product name" ILIKE %(search)s OR p."Article"::text LIKE %(search)s)')
+        params['search'] = f"%{_escape_like(search)}%"
+    
+    if has_time is True:
+        conditions.append('COALESCE(t.total_time_h, 0) > 0')
+    elif has_time is False:
+        conditions.append('COALESCE(t.total_time_h, 0) = 0')
+    
+    return conditions, params
+
+def _product_order_by(sort):
+    """ORDER BY для ключа из PRODUCT_SORT_COLUMNS ('-' в начале - по убыванию)"""
+    descending = sort.startswith('-')
+    sort_key = sort.lstrip('-')
+    if sort_key not in PRODUCT_SORT_COLUMNS:
+        raise ValueError(f"Неизвестная сортировка: {sort}")
+    return f'{PRODUCT_SORT_COLUMNS[sort_key]} {"DESC" if descending else "ASC"}, p."id"'
+
+@metrics.instrument
+def query_products(filter_type=None, search=None, has_time=None, sort='id', offset=0, limit=50):
+    """
+    Страница продукции с фильтрами, сортировкой и LIMIT/OFFSET на стороне БД
+
+    filter_type - тип продукции, search - подстрока названия (без учёта регистра)
+    или артикула,
+    has_time - True/False/None (есть время производства / нет / все),
+    sort - ключ из PRODUCT_SORT_COLUMNS, '-' в начале - по убыванию.
+    Возвращает (DataFrame страницы, общее число подходящих записей).
+    """
+    order_by = _product_order_by(sort)
+    conditions, params = _product_conditions(filter_type, search, has_time)
+    params.update({'limit': int(limit), 'offset': int(offset)})
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    base = f"""
+        FROM public."Products_import" p
+        {_PRODUCTION_TIME_JOIN}
+        {where}
+    """
+    
+    try:
+        with db.cursor() as cursor:
+            cursor.execute(_PRODUCTS_SELECT + f""",
+                    COALESCE(t.total_time_h, 0) as production_time_h,
+                    COUNT(*) OVER () as total_count
+                {base}
+                ORDER BY {order_by}
+                LIMIT %(limit)s OFFSET %(offset)s
+            """, params)
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+            
+            if rows:
+                total = rows[0][-1]
+            elif offset > 0:
+                # страница за пределами выборки - считаем отдельно
+                cursor.execute(f"SELECT COUNT(*) {base}", params)
+                total = cursor.fetchone()[0]
+            else:
+                total = 0
+        
+        df = pd.DataFrame(rows, columns=columns).drop(columns='total_count')
+        if not df.empty:
+            df['production_time_h'] = pd.to_numeric(df['production_time_h'], errors='coerce').fillna(0.0)
+            df = _normalize_products_df(df)
+        
+        print(f"✅ Страница продукции: {len(df)} из {total} (offset {offset})")
+        return df, total
+        
+    except Exception as e:
+        print(f"❌ Ошибка при загрузке страницы продукции: {e}")
+        if raising_errors():
+            raise
+        return _empty_products_frame(), 0
+
+@metrics.instrument
+def count_products():
+    """
+    Общее количество продукции
+    """
+    found, cached_value = cache.get('products_count')
+    if found:
+        return cached_value
+    
+    try:
+        with db.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM public."Products_import"')
+            result = cursor.fetchone()[0]
+        
+        _cache_set('products_count', result)
+        return result
         
-        query = 'SELECT DISTINCT "Workshop name" FROM public."Workshops_import" ORDER BY "Workshop name"'
-        cursor.execute(query)
+    except Exception as e:
+        print(f"❌ Ошибка при подсчёте продукции: {e}")
+        if raising_errors():
+            raise
+        return 0
+
+@metrics.instrument
+def has_trgm_search():
+    """
+    Установлено ли расширение pg_trgm (см. migrations/001_product_search_trgm.sql)
+    """
+    found, cached_value = cache.get('pg_trgm')
+    if found:
+        return cached_value
+    
+    try:
+        with db.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')")
+            result = cursor.fetchone()[0]
         
-        result = [row[0] for row in cursor.fetchall()]
+        _cache_set('pg_trgm', result)
+        return result
         
-        cursor.close()
-        conn.close()
+    except Exception as e:
+        print(f"❌ Ошибка при проверке pg_trgm: {e}")
+        if raising_errors():
+            raise
+        return False
+
+def _search_products_trgm(query, limit, filter_type, has_time):
+    conditions, params = _product_conditions(filter_type, None, has_time)
+    conditions.append(
+        '(p."Product name" %% %(q)s OR %(q)s <%% p."Product name"'
+        ' OR p."Article"::text LIKE %(article_prefix)s)'
+    )
+    params.update({
+        'q': query,
+        'article_prefix': f"{_escape_like(query)}%",
+        'limit': int(limit),
+    })
+    
+    with db.cursor() as cursor:
+        cursor.execute(_PRODUCTS_SELECT + f""",
+                COALESCE(t.total_time_h, 0) as production_time_h,
+                GREATEST(
+                    similarity(p."Product name", %(q)s),
+                    word_similarity(%(q)s, p."Product name"),
+                    similarity(p."Article"::text, %(q)s)
+                ) as score
+            FROM public."Products_import" p
+            {_PRODUCTION_TIME_JOIN}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY score DESC, p."id"
+            LIMIT %(limit)s
+        """, params)
+        columns = [desc[0] for desc in cursor.description]
+        rows = cursor.fetchall()
+    
+    df = pd.DataFrame(rows, columns=columns)
+    if not df.empty:
+        df['production_time_h'] = pd.to_numeric(df['production_time_h'], errors='coerce').fillna(0.0)
+        df['score'] = df['score'].astype(float)
+        df = _normalize_products_df(df)
+    return df
+
+def _update_search_index(index, changed, changed_ids):
+    """Вносит дельту в индекс n-грамм: изменённые перестраиваются, удалённые убираются"""
+    for product_id in changed_ids:
+        index.remove(product_id)
+    for row in changed.itertuples(index=False):
+        index.add(row.id, row.name, str(row.article))
+
+def _search_products_fallback(query, limit, filter_type, has_time):
+    """Поиск по индексу n-грамм в памяти (если pg_trgm в базе нет)"""
+    get_cached_products()
+    
+    # индекс и кадр меняет refresh_products под той же блокировкой
+    with _products_frame_lock:
+        products_df = _products_frame['df']
+        if products_df is None or products_df.empty:
+            return _empty_products_frame('score')
+        
+        index = _products_frame['index']
+        if index is None:
+            index = NGramIndex()
+            _update_search_index(index, products_df, ())
+            _products_frame['index'] = index
+        matches = index.search(query)
+    
+    if not matches:
+        return products_df.iloc[0:0].assign(score=[])
+    
+    # кадр отсортирован по id (ORDER BY при загрузке, merge_products при дельтах)
+    ids, scores = zip(*matches)
+    positions = products_df['id'].searchsorted(list(ids))
+    df = products_df.take(positions).assign(score=scores)
+    
+    if filter_type:
+        df = df[df['product_type'] == filter_type]
+    if has_time is True:
+        df = df[df['production_time_h'] > 0]
+    elif has_time is False:
+        df = df[df['production_time_h'] == 0]
+    
+    return df.head(limit).reset_index(drop=True)
+
+@metrics.instrument
+def search_products(query, limit=50, filter_type=None, has_time=None):
+    """
+    Нечёткий поиск продукции по названию и артикулу (устойчив к опечаткам)
+
+    Результаты отсортированы по убыванию релевантности (колонка score).
+    Использует GIN-индексы pg_trgm, а без расширения - индекс n-грамм в памяти.
+    """
+    query = (query or '').strip()
+    if not query:
+        return _empty_products_frame('score')
+    
+    try:
+        if has_trgm_search():
+            df = _search_products_trgm(query, limit, filter_type, has_time)
+        else:
+            df = _search_products_fallback(query, limit, filter_type, has_time)
+        
+        print(f"🔎 Поиск '{query}': найдено {len(df)}")
+        return df
+        
+    except Exception as e:
+        print(f"❌ Ошибка при поиске продукции: {e}")
+        if raising_errors():
+            raise
+        return _empty_products_frame('score')
+
+@metrics.instrument
+def get_available_workshops():
+    """
+    Получение списка всех доступных цехов
+    """
+    found, cached_value = cache.get('available_workshops')
+    if found:
+        return cached_value
+    
+    try:
+        with db.cursor() as cursor:
+            query = 'SELECT DISTINCT "Workshop name" FROM public."Workshops_import" ORDER BY "Workshop name"'
+            cursor.execute(query)
+        
+            result = [row[0] for row in cursor.fetchall()]
         
         print(f"🏭 Доступные цехи: {result}")
+        _cache_set('available_workshops', result)
         return result
         
     except Exception as e:
         print(f"❌ Ошибка при получении списка цехов: {e}")
+        if raising_errors():
+            raise
         return []
 
-def add_production_time(product_name, workshop_name, production_time):
+@metrics.instrument
+def get_workshop_ids():
     """
-    Добавление времени производства продукта в цехе
+    Словарь название цеха -> id
     """
+    found, cached_value = cache.get('workshop_ids')
+    if found:
+        return cached_value
+    
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT MAX("id") FROM public."Product_workshops_import"')
-        result = cursor.fetchone()
-        next_id = result[0] + 1 if result[0] is not None else 1
+        with db.cursor() as cursor:
+            cursor.execute('SELECT "Workshop name", MIN("id") FROM public."Workshops_import" GROUP BY "Workshop name"')
+            result = dict(cursor.fetchall())
         
-        query = """
-        INSERT INTO public."Product_workshops_import" 
-        ("id", "Product name", "Workshop name", "Production time, h")
-        VALUES (%s, %s, %s, %s)
-        RETURNING "id"
-        """
+        _cache_set('workshop_ids', result)
+        return result
         
-        cursor.execute(query, (next_id, product_name, workshop_name, production_time))
-        new_id = cursor.fetchone()[0]
-        conn.commit()
+    except Exception as e:
+        print(f"❌ Ошибка при получении списка цехов: {e}")
+        if raising_errors():
+            raise
+        return {}
+
+@metrics.instrument
+def add_production_time_by_id(product_id, workshop_id, production_time):
+    """
+    Добавление времени производства продукта в цехе (по id продукта и цеха)
+    """
+    try:
+        with db.cursor() as cursor:
+            query = """
+            INSERT INTO public."Product_workshops_import" 
+            (product_id, workshop_id, "Production time, h")
+            VALUES (%s, %s, %s)
+            RETURNING "id"
+            """
         
-        cursor.close()
-        conn.close()
+            cursor.execute(query, (product_id, workshop_id, production_time))
+            new_id = cursor.fetchone()[0]
         
-        print(f"✅ Добавлено время производства: {product_name} в цехе {workshop_name} - {production_time} ч. (ID: {new_id})")
+        cache.invalidate(f'production_times:{product_id}')
+        _mark_products_dirty()
+        print(f"✅ Добавлено время производства: продукт {product_id} в цехе {workshop_id} - {production_time} ч. (ID: {new_id})")
         return new_id
         
     except Exception as e:
         print(f"❌ Ошибка при добавлении времени производства: {e}")
         raise
 
-def get_production_times_for_product(product_name):
+@metrics.instrument
+def add_production_time(product_name, workshop_name, production_time):
+    """
+    Добавление времени производства продукта в цехе по названиям
+    (обёртка над add_production_time_by_id)
+    """
+    product_id = _product_id_by_name(product_name)
+    if product_id is None:
+        raise ValueError(f"Продукт '{product_name}' не найден")
+    
+    workshop_id = _workshop_id_by_name(workshop_name)
+    if workshop_id is None:
+        raise ValueError(f"Цех '{workshop_name}' не найден")
+    
+    return add_production_time_by_id(product_id, workshop_id, production_time)
+
+@metrics.instrument
+def get_production_times_for_product_id(product_id):
     """
-    Получаем все записи о времени производства для конкретного продукта
+    Получаем все записи о времени производства для продукта по id
     """
+    key = f'production_times:{product_id}'
+    found, cached_value = cache.get(key)
+    if found:
+        return cached_value
+    
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT 
-            "id" as id,
-            "Product name" as product_name,
-            "Workshop name" as workshop_name,
-            "Production time, h" as production_time
-        FROM public."Product_workshops_import"
-        WHERE "Product name" = %s
-        ORDER BY "id"
-        """
-        
-        cursor.execute(query, (product_name,))
-        columns = [desc[0] for desc in cursor.description]
-        rows = cursor.fetchall()
+        with db.cursor() as cursor:
+            query = """
+            SELECT 
+                "id" as id,
+                product_id,
+                workshop_id,
+                "Product name" as product_name,
+                "Workshop name" as workshop_name,
+                "Production time, h" as production_time
+            FROM public."Product_workshops_import"
+            WHERE product_id = %s
+            ORDER BY "id"
+            """
         
-        result = []
-        for row in rows:
-            result.append(dict(zip(columns, row)))
+            cursor.execute(query, (product_id,))
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
         
-        cursor.close()
-        conn.close()
+            result = []
+            for row in rows:
+                result.append(dict(zip(columns, row)))
         
-        print(f"📊 Записи времени производства для '{product_name}': {len(result)}")
+        _cache_set(key, result)
+        print(f"📊 Записи времени производства для продукта {product_id}: {len(result)}")
         return result
         
     except Exception as e:
         print(f"❌ Ошибка при получении времени производства: {e}")
+        if raising_errors():
+            raise
         return []
 
+@metrics.instrument
+def get_production_times_for_product(product_name):
+    """
+    Получаем все записи о времени производства для продукта по названию
+    (обёртка над get_production_times_for_product_id)
+    """
+    try:
+        product_id = _product_id_by_name(product_name)
+    except Exception as e:
+        print(f"❌ Ошибка при получении времени производства: {e}")
+        if raising_errors():
+            raise
+        return []
+    
+    if product_id is None:
+        return []
+    return get_production_times_for_product_id(product_id)
+
+@metrics.instrument
 def delete_production_time(record_id):
     """
     удаление записи о времени производства по айдишнику
     """
     try:
-        conn = db.get_raw_connection()
-        cursor = conn.cursor()
+        with db.cursor() as cursor:
+            query = 'DELETE FROM public."Product_workshops_import" WHERE "id" = %s RETURNING product_id'
+            cursor.execute(query, (record_id,))
+            deleted = cursor.fetchall()
         
-        query = 'DELETE FROM public."Product_workshops_import" WHERE "id" = %s'
-        cursor.execute(query, (record_id,))
-        
-        conn.commit()
-        
-        cursor.close()
-        conn.close()
+        for (product_id,) in deleted:
+            cache.invalidate(f'production_times:{product_id}')
+            _mark_products_dirty()
         
         print(f"✅ Удалена запись времени производства с ID: {record_id}")
         return True
@@ -631,3 +1827,426 @@ def delete_production_time(record_id):
     except Exception as e:
         print(f"❌ Ошибка при удалении времени производства: {e}")
         raise
+
+# ---------------------------------------------------------------------------
+# Пакетные операции: много строк - одна транзакция
+# ---------------------------------------------------------------------------
+
+# поля словаря продукта -> колонки Products_import
+PRODUCT_FIELDS = {
+    'product_type': 'Product type',
+    'name': 'Product name',
+    'article': 'Article',
+    'min_price': 'Minimum cost for a partner',
+    'main_material': 'Main material',
+}
+
+# продукт и цех задаются id или названием (название переводит в id триггер)
+PRODUCTION_TIME_FIELDS = {
+    'product_id': 'product_id',
+    'workshop_id': 'workshop_id',
+    'product_name': 'Product name',
+    'workshop_name': 'Workshop name',
+    'production_time': 'Production time, h',
+}
+
+class BatchResult:
+    """
+    Итог пакетной операции
+
+    ok - id успешно обработанных строк, failed - список (номер строки во
+    входных данных, причина), committed - были ли изменения записаны в базу.
+    """
+    
+    def __init__(self):
+        self.ok = []
+        self.failed = []
+        self.committed = False
+    
+    @property
+    def success(self):
+        return self.committed and not self.failed
+    
+    def __repr__(self):
+        return f"BatchResult(ok={len(self.ok)}, failed={len(self.failed)}, committed={self.committed})"
+
+def _as_records(rows):
+    """Список словарей из DataFrame или любого итерируемого"""
+    if isinstance(rows, pd.DataFrame):
+        return rows.to_dict('records')
+    return list(rows)
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
+def _check_fields(record, fields, required=True):
+    """Проверка значений строки; возвращает текст ошибки или None"""
+    for field in fields:
+        if field not in record or _is_missing(record[field]):
+            if required:
+                return f"не заполнено поле {field}"
+            continue
+        value = record[field]
+        try:
+            if field == 'article':
+                int(value)
+            elif field in ('min_price', 'production_time'):
+                if float(value) < 0:
+                    return f"отрицательное значение {field}"
+        except (TypeError, ValueError):
+            return f"некорректное значение {field}: {value!r}"
+    return None
+
+def _parse_id(record, field='id'):
+    """id из строки: (число, None) или (None, текст ошибки)"""
+    value = record.get(field)
+    if _is_missing(value):
+        return None, f"не указан {field}"
+    try:
+        return int(value), None
+    except (TypeError, ValueError):
+        return None, f"некорректное значение {field}: {value!r}"
+
+def _unique_ids(values, result):
+    """
+    Проверенные id без повторов - {id: номер строки}; некорректные
+    значения попадают в result.failed
+    """
+    positions = {}
+    for i, value in enumerate(values):
+        row_id, error = _parse_id({'id': value})
+        if error:
+            result.failed.append((i, error))
+        else:
+            positions.setdefault(row_id, i)
+    return positions
+
+def _coerce(field, value):
+    if _is_missing(value):
+        return None
+    if field in ('id', 'article', 'product_id', 'workshop_id'):
+        return int(value)
+    if field in ('min_price', 'production_time'):
+        return float(value)
+    return value
+
+def _finish(conn, result, atomic):
+    """commit/rollback с учётом найденных ошибок"""
+    if atomic and result.failed:
+        conn.rollback()
+        result.ok = []
+    else:
+        conn.commit()
+        result.committed = True
+    return result
+
+@metrics.instrument
+def add_products_many(products, atomic=True):
+    """
+    Добавление многих продуктов одним INSERT в одной транзакции
+
+    products - DataFrame или список словарей с полями как у add_product.
+    atomic=True - при любой ошибочной строке ничего не записывается,
+    atomic=False - корректные строки записываются, ошибочные попадают в failed.
+    """
+    records = _as_records(products)
+    result = BatchResult()
+    valid = []
+    
+    for i, record in enumerate(records):
+        error = _check_fields(record, PRODUCT_FIELDS)
+        if error:
+            result.failed.append((i, error))
+        else:
+            valid.append(tuple(_coerce(f, record[f]) for f in PRODUCT_FIELDS))
+    
+    columns = ', '.join(f'"{c}"' for c in PRODUCT_FIELDS.values())
+    
+    try:
+        with db.connection() as conn:
+            if valid and not (atomic and result.failed):
+                with conn.cursor() as cursor:
+                    rows = execute_values(
+                        cursor,
+                        f'INSERT INTO public."Products_import" ({columns}) VALUES %s RETURNING "id"',
+                        valid,
+                        page_size=1000,
+                        fetch=True
+                    )
+                result.ok = [row[0] for row in rows]
+            _finish(conn, result, atomic)
+        
+        if result.ok:
+            _invalidate_products()
+        print(f"✅ Пакетное добавление продукции: {result}")
+        return result
+        
+    except Exception as e:
+        print(f"❌ Ошибка при пакетном добавлении продукции: {e}")
+        raise
+
+@metrics.instrument
+def update_products_many(updates, atomic=True):
+    """
+    Обновление многих продуктов в одной транзакции
+
+    Каждая строка - словарь с 'id' и любыми полями из PRODUCT_FIELDS
+    (отсутствующие или пустые поля не меняются). Строки пишутся во временную
+    таблицу и применяются одним UPDATE ... FROM.
+    """
+    records = _as_records(updates)
+    result = BatchResult()
+    fields = [f for f in PRODUCT_FIELDS if any(f in r for r in records)]
+    valid = []
+    positions = {}
+    
+    for i, record in enumerate(records):
+        product_id, error = _parse_id(record)
+        if error is None:
+            if product_id in positions:
+                error = f"id {record['id']} повторяется"
+            else:
+                error = _check_fields(record, fields, required=False)
+        
+        if error:
+            result.failed.append((i, error))
+        else:
+            positions[product_id] = i
+            valid.append((product_id,) + tuple(_coerce(f, record.get(f)) for f in fields))
+    
+    if not fields:
+        # менять нечего - строка без полей не может считаться обновлённой
+        result.failed.extend((i, "нет полей для обновления") for i in positions.values())
+        result.failed.sort()
+        result.committed = not (atomic and result.failed)
+        return result
+    
+    columns = ['id'] + [PRODUCT_FIELDS[f] for f in fields]
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    assignments = ', '.join(
+        f'"{PRODUCT_FIELDS[f]}" = COALESCE(u."{PRODUCT_FIELDS[f]}", p."{PRODUCT_FIELDS[f]}")' for f in fields
+    )
+    
+    try:
+        with db.connection() as conn:
+            if valid and not (atomic and result.failed):
+                with conn.cursor() as cursor:
+                    cursor.execute(f"""
+                        CREATE TEMP TABLE products_update ON COMMIT DROP AS
+                        SELECT {column_list} FROM public."Products_import" WITH NO DATA
+                    """)
+                    execute_values(
+                        cursor,
+                        f'INSERT INTO products_update ({column_list}) VALUES %s',
+                        valid,
+                        page_size=1000
+                    )
+                    cursor.execute(f"""
+                        UPDATE public."Products_import" p
+                        SET {assignments}
+                        FROM products_update u
+                        WHERE p."id" = u."id"
+                        RETURNING p."id"
+                    """)
+                    updated = {row[0] for row in cursor.fetchall()}
+                
+                result.ok = [pid for pid in positions if pid in updated]
+                result.failed.extend(
+                    (positions[pid], f"продукт {pid} не найден") for pid in positions if pid not in updated
+                )
+                result.failed.sort()
+            _finish(conn, result, atomic)
+        
+        if result.committed:
+            _invalidate_products(result.ok)
+        print(f"✅ Пакетное обновление продукции: {result}")
+        return result
+        
+    except Exception as e:
+        print(f"❌ Ошибка при пакетном обновлении продукции: {e}")
+        raise
+
+@metrics.instrument
+def delete_products_many(product_ids, atomic=True):
+    """
+    Удаление многих продуктов одним DELETE; некорректные и не найденные id
+    попадают в failed, повторы удаляются один раз
+    """
+    result = BatchResult()
+    positions = _unique_ids(product_ids, result)
+    
+    try:
+        with db.connection() as conn:
+            if positions and not (atomic and result.failed):
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        'DELETE FROM public."Products_import" WHERE "id" = ANY(%s) RETURNING "id"',
+                        (list(positions),)
+                    )
+                    deleted = {row[0] for row in cursor.fetchall()}
+                
+                result.ok = [pid for pid in positions if pid in deleted]
+                result.failed.extend(
+                    (i, f"продукт {pid} не найден") for pid, i in positions.items() if pid not in deleted
+                )
+                result.failed.sort()
+            _finish(conn, result, atomic)
+        
+        if result.committed:
+            _invalidate_products(result.ok)
+        print(f"✅ Пакетное удаление продукции: {result}")
+        return result
+        
+    except Exception as e:
+        print(f"❌ Ошибка при пакетном удалении продукции: {e}")
+        raise
+
+def _resolve_keys(cursor, table, name_column, ids, names):
+    """
+    id строк table по id или по названию - как триггер
+    product_workshops_fill_keys (пробелы по краям не учитываются, при
+    совпадении предпочтение точному названию и меньшему id). Возвращает
+    функцию (id, название) -> найденный id или None.
+    """
+    wanted_ids = sorted({i for i in ids if i is not None})
+    wanted_names = sorted({n for i, n in zip(ids, names) if i is None and n is not None})
+    
+    cursor.execute(f'SELECT "id" FROM public."{table}" WHERE "id" = ANY(%s)', (wanted_ids,))
+    existing = {row[0] for row in cursor.fetchall()}
+    
+    cursor.execute(f"""
+        SELECT DISTINCT ON (n.name) n.name, t."id"
+        FROM unnest(%s::text[]) AS n(name)
+        JOIN public."{table}" t ON public.name_key(t."{name_column}") = public.name_key(n.name)
+        ORDER BY n.name, (t."{name_column}" = n.name) DESC, t."id"
+    """, (wanted_names,))
+    by_name = dict(cursor.fetchall())
+    
+    def lookup(row_id, name):
+        if row_id is not None:
+            return row_id if row_id in existing else None
+        return by_name.get(name)
+    return lookup
+
+@metrics.instrument
+def add_production_times_many(records, atomic=True):
+    """
+    Добавление многих записей времени производства одним INSERT
+
+    records - DataFrame или список словарей: product_id или product_name,
+    workshop_id или workshop_name, production_time. Строки, для которых
+    продукт или цех не нашёлся, попадают в failed.
+    """
+    records = _as_records(records)
+    result = BatchResult()
+    valid = []
+    positions = []
+    
+    for i, record in enumerate(records):
+        error = _check_fields(record, ['production_time'])
+        for field in ('product_id', 'workshop_id'):
+            if not error and not _is_missing(record.get(field)):
+                error = _parse_id(record, field)[1]
+        if not error:
+            if all(_is_missing(record.get(f)) for f in ('product_id', 'product_name')):
+                error = "не указан продукт"
+            elif all(_is_missing(record.get(f)) for f in ('workshop_id', 'workshop_name')):
+                error = "не указан цех"
+        
+        if error:
+            result.failed.append((i, error))
+        else:
+            positions.append(i)
+            valid.append(tuple(_coerce(f, record.get(f)) for f in PRODUCTION_TIME_FIELDS))
+    
+    product_ids = set()
+    
+    try:
+        with db.connection() as conn:
+            if valid and not (atomic and result.failed):
+                with conn.cursor() as cursor:
+                    # продукт и цех ищем до вставки: строка без них не должна
+                    # попасть в таблицу (и не должна ронять весь INSERT по FK)
+                    products = _resolve_keys(cursor, 'Products_import', 'Product name',
+                                             [r[0] for r in valid], [r[2] for r in valid])
+                    workshops = _resolve_keys(cursor, 'Workshops_import', 'Workshop name',
+                                              [r[1] for r in valid], [r[3] for r in valid])
+                    
+                    resolved, resolved_positions = [], []
+                    for position, (product_id, workshop_id, product_name, workshop_name, time_h) in zip(positions, valid):
+                        product_id = products(product_id, product_name)
+                        workshop_id = workshops(workshop_id, workshop_name)
+                        if product_id is None:
+                            result.failed.append((position, "продукт не найден"))
+                        elif workshop_id is None:
+                            result.failed.append((position, "цех не найден"))
+                        else:
+                            resolved_positions.append(position)
+                            resolved.append((product_id, workshop_id, time_h))
+                    result.failed.sort()
+                    
+                    if resolved and not (atomic and result.failed):
+                        # названия подставит триггер product_workshops_fill_keys;
+                        # строки RETURNING идут в порядке VALUES
+                        rows = execute_values(
+                            cursor,
+                            'INSERT INTO public."Product_workshops_import" '
+                            '(product_id, workshop_id, "Production time, h") VALUES %s '
+                            'RETURNING "id", product_id',
+                            resolved,
+                            page_size=1000,
+                            fetch=True
+                        )
+                        for record_id, product_id in rows:
+                            result.ok.append(record_id)
+                            product_ids.add(product_id)
+            _finish(conn, result, atomic)
+        
+        if result.committed:
+            cache.invalidate(*(f'production_times:{pid}' for pid in product_ids))
+            _mark_products_dirty()
+        print(f"✅ Пакетное добавление времени производства: {result}")
+        return result
+        
+    except Exception as e:
+        print(f"❌ Ошибка при пакетном добавлении времени производства: {e}")
+        raise
+
+@metrics.instrument
+def delete_production_times_many(record_ids, atomic=True):
+    """
+    Удаление многих записей времени производства одним DELETE; некорректные
+    и не найденные id попадают в failed, повторы удаляются один раз
+    """
+    result = BatchResult()
+    positions = _unique_ids(record_ids, result)
+    product_ids = set()
+    
+    try:
+        with db.connection() as conn:
+            if positions and not (atomic and result.failed):
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        'DELETE FROM public."Product_workshops_import" WHERE "id" = ANY(%s) RETURNING "id", product_id',
+                        (list(positions),)
+                    )
+                    rows = cursor.fetchall()
+                
+                deleted = {row[0] for row in rows}
+                product_ids = {row[1] for row in rows}
+                result.ok = [rid for rid in positions if rid in deleted]
+                result.failed.extend(
+                    (i, f"запись {rid} не найдена") for rid, i in positions.items() if rid not in deleted
+                )
+                result.failed.sort()
+            _finish(conn, result, atomic)
+        
+        if result.committed:
+            cache.invalidate(*(f'production_times:{pid}' for pid in product_ids))
+            _mark_products_dirty()
+        print(f"✅ Пакетное удаление времени производства: {result}")
+        return result
+        
+    except Exception as e:
+        print(f"❌ Ошибка при пакетном удалении времени производства: {e}")
+        raise
@@ -0,0 +1,113 @@
+"""
+Параллельные запросы к базе для одной отрисовки страницы или запроса API
+
+Функции db.py блокирующие (psycopg2), поэтому параллельность - на пуле
+потоков размером с пул подключений: каждый вызов берёт своё подключение.
+Вызовы выполняются в копии contextvars вызывающего потока, так что
+metrics.run_scope() учитывает их в стоимости перезапуска.
+
+    types, materials = db_async.gather(db.get_unique_product_types, db.get_unique_materials)
+    product, times = db_async.gather((db.get_product_by_id, 3), (db.get_production_times_for_product_id, 3))
+    product, times = await db_async.agather(...)          # из asyncio / tornado
+
+Время отрисовки - самый медленный запрос, а не сумма всех. Внутри
+serial() (так делает profiling.profile_run) вызовы идут по очереди в
+текущем потоке, чтобы профилировщик видел время функций db.py.
+"""
+import os
+import asyncio
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker = threading.local()
+_serial = contextvars.ContextVar('db_async_serial', default=False)
+
+
+def executor():
+    """Общий пул потоков (DB_ASYNC_THREADS, по умолчанию - DB_POOL_MAX)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            size = os.getenv('DB_ASYNC_THREADS') or os.getenv('DB_POOL_MAX', '10')
+            _executor = ThreadPoolExecutor(max_workers=int(size), thread_name_prefix='db-async',
+                                           initializer=_mark_worker)
+        return _executor
+
+
+def _mark_worker():
+    _worker.active = True
+
+
+def _in_worker():
+    return getattr(_worker, 'active', False)
+
+
+@contextmanager
+def serial():
+    """gather внутри блока выполняет вызовы последовательно в текущем потоке"""
+    token = _serial.set(True)
+    try:
+        yield
+    finally:
+        _serial.reset(token)
+
+
+def _as_call(call):
+    """func или (func, *args) -> (func, args)"""
+    if callable(call):
+        return call, ()
+    func, *args = call
+    return func, tuple(args)
+
+
+def submit(func, *args, **kwargs):
+    """Запускает func в пуле потоков с текущими contextvars; возвращает Future"""
+    context = contextvars.copy_context()
+    return executor().submit(context.run, func, *args, **kwargs)
+
+
+def gather(*calls, timeout=None):
+    """
+    Выполняет вызовы параллельно и возвращает результаты в том же порядке.
+    Вызов - функция без аргументов или кортеж (функция, аргументы...).
+    Исключение первого упавшего вызова пробрасывается (остальные дорабатывают).
+
+    Один вызов, вызовы из потока самого пула (вложенный gather) и внутри
+    serial() выполняются последовательно в текущем потоке - без риска
+    занять все потоки ожиданием.
+    """
+    calls = [_as_call(call) for call in calls]
+    if len(calls) <= 1 or _in_worker() or _serial.get():
+        return [func(*args) for func, args in calls]
+
+    with metrics.timed('db_async.gather'):
+        futures = [submit(func, *args) for func, args in calls]
+        return [future.result(timeout=timeout) for future in futures]
+
+
+async def agather(*calls, pool=None):
+    """
+    То же, что gather, для asyncio: цикл событий не блокируется.
+    pool - свой пул потоков вместо общего (например, пул api.py)
+    """
+    loop = asyncio.get_running_loop()
+    pool = pool or executor()
+    futures = []
+    for call in calls:
+        func, args = _as_call(call)
+        context = contextvars.copy_context()
+        futures.append(loop.run_in_executor(pool, context.run, func, *args))
+    return list(await asyncio.gather(*futures))
+
+
+async def arun(func, *args, **kwargs):
+    """Один блокирующий вызов из asyncio"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor(), lambda: context.run(func, *args, **kwargs))
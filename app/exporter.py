@@ -0,0 +1,169 @@
+"""
+Выгрузка списка продукции в файл: CSV, XLSX и Parquet
+
+Строки читаются из базы порциями (db.iter_products, серверный курсор) и
+сразу дописываются в файл, так что весь каталог в памяти не собирается:
+CSV - построчно, XLSX - openpyxl в режиме write_only, Parquet - по группе
+строк на порцию через pyarrow.parquet.ParquetWriter. Файлы пишутся во
+временную папку EXPORT_DIR и удаляются через EXPORT_MAX_AGE секунд.
+"""
+import os
+import csv
+import time
+import tempfile
+from datetime import datetime
+
+EXPORT_DIR = os.getenv('EXPORT_DIR') or tempfile.gettempdir()
+EXPORT_MAX_AGE = int(os.getenv('EXPORT_MAX_AGE', '3600'))
+EXPORT_PREFIX = 'comfort-export-'
+
+FORMATS = {
+    'csv': {'title': 'CSV', 'extension': 'csv', 'mime': 'text/csv'},
+    'xlsx': {'title': 'Excel (XLSX)', 'extension': 'xlsx',
+             'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'},
+    'parquet': {'title': 'Parquet', 'extension': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+}
+
+# заголовки колонок в CSV/XLSX (в Parquet остаются исходные имена)
+COLUMN_TITLES = {
+    'id': 'ID',
+    'product_type': 'Тип продукции',
+    'name': 'Наименование',
+    'article': 'Артикул',
+    'min_price': 'Минимальная стоимость для партнёра',
+    'main_material': 'Основной материал',
+    'production_time_h': 'Время производства, ч',
+}
+
+# строк на листе Excel (вместе с заголовком) - дальше новый лист
+XLSX_MAX_ROWS = 1048576
+
+
+def write_csv(path, chunks):
+    rows = 0
+    # utf-8-sig - чтобы Excel открыл кириллицу без мастера импорта
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        csv.writer(f).writerow(COLUMN_TITLES.values())
+        for chunk in chunks:
+            chunk.to_csv(f, header=False, index=False, columns=list(COLUMN_TITLES))
+            rows += len(chunk)
+    return rows
+
+
+def write_xlsx(path, chunks):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = 0
+    rows = 0
+
+    for chunk in chunks:
+        for row in chunk[list(COLUMN_TITLES)].itertuples(index=False, name=None):
+            if sheet is None or sheet_rows >= XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet(f"Продукция {len(workbook.worksheets) + 1}")
+                sheet.append(list(COLUMN_TITLES.values()))
+                sheet_rows = 1
+            sheet.append(row)
+            sheet_rows += 1
+        rows += len(chunk)
+
+    if sheet is None:
+        workbook.create_sheet("Продукция 1").append(list(COLUMN_TITLES.values()))
+    workbook.save(path)
+    return rows
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('id', pa.int64()),
+        ('product_type', pa.string()),
+        ('name', pa.string()),
+        ('article', pa.int64()),
+        ('min_price', pa.float64()),
+        ('main_material', pa.string()),
+        ('production_time_h', pa.float64()),
+    ])
+
+
+def write_parquet(path, chunks):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    rows = 0
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            writer.write_table(table.select(schema.names).cast(schema))
+            rows += len(chunk)
+    return rows
+
+
+WRITERS = {'csv': write_csv, 'xlsx': write_xlsx, 'parquet': write_parquet}
+
+
+def remove(path):
+    """Удаляет файл выгрузки; уже удалённый (например, cleanup) - не ошибка"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def cleanup(max_age=EXPORT_MAX_AGE):
+    """Удаляет старые файлы выгрузок"""
+    now = time.time()
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        if not name.startswith(EXPORT_PREFIX):
+            continue
+        # файл мог удалить параллельный cleanup (FileNotFoundError - тоже OSError)
+        try:
+            if now - os.path.getmtime(path) > max_age:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def export_products(fmt, path=None, filter_type=None, search=None, has_time=None, sort='id', itersize=None):
+    """
+    Выгружает продукцию (с временем производства) с фильтрами как в
+    db.query_products в файл формата fmt ('csv', 'xlsx', 'parquet').
+    path по умолчанию - новый файл в EXPORT_DIR.
+
+    Возвращает {'path', 'file_name', 'mime', 'rows', 'seconds'}.
+    """
+    import db
+
+    if fmt not in WRITERS:
+        raise ValueError(f"Неизвестный формат выгрузки: {fmt}")
+    extension = FORMATS[fmt]['extension']
+
+    if path is None:
+        cleanup()
+        handle, path = tempfile.mkstemp(prefix=EXPORT_PREFIX, suffix=f'.{extension}', dir=EXPORT_DIR)
+        os.close(handle)
+
+    started = time.perf_counter()
+    chunks = db.iter_products(with_production_time=True, itersize=itersize, filter_type=filter_type,
+                              search=search, has_time=has_time, sort=sort)
+    try:
+        rows = WRITERS[fmt](path, chunks)
+    except Exception:
+        chunks.close()
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    seconds = time.perf_counter() - started
+    print(f"📤 Выгрузка {fmt}: {rows} строк за {seconds:.1f} с")
+    return {
+        'path': path,
+        'file_name': f"products-{datetime.now():%Y%m%d-%H%M}.{extension}",
+        'mime': FORMATS[fmt]['mime'],
+        'rows': rows,
+        'seconds': seconds,
+    }
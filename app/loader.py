@@ -0,0 +1,213 @@
+"""
+Загрузка таблиц *_import из CSV/XLSX через COPY
+
+Файлы читаются порциями, типы приводятся по тем же правилам, что и в
+db.get_products(), строки заливаются COPY FROM STDIN во временную таблицу,
+после чего целевая таблица заменяется или дополняется (upsert) в одной
+транзакции - читатели видят либо старые данные, либо новые целиком.
+"""
+import io
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import db as db
+
+# порядок важен: справочники раньше таблиц, которые на них ссылаются
+TABLES = {
+    'Product_type_import': {
+        'columns': ['Product type', 'Product type coefficient'],
+        'types': {'Product type coefficient': 'float'},
+    },
+    'Material_type_import': {
+        'columns': ['Type material', 'Percentage of raw material losses'],
+        'types': {'Percentage of raw material losses': 'float'},
+    },
+    'Workshops_import': {
+        'columns': ['Workshop name', 'Workshop type', 'Number of people for production'],
+        'types': {'Number of people for production': 'int'},
+    },
+    'Products_import': {
+        'columns': ['Product type', 'Product name', 'Article',
+                    'Minimum cost for a partner', 'Main material'],
+        'types': {'Article': 'int', 'Minimum cost for a partner': 'price'},
+    },
+    'Product_workshops_import': {
+        'columns': ['Product name', 'Workshop name', 'Production time, h'],
+        'types': {'Production time, h': 'float'},
+    },
+}
+
+DEFAULT_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data used')
+DEFAULT_CHUNKSIZE = 50000
+
+
+def normalize_chunk(table, df):
+    """
+    Приводит типы колонок порции (правила как в db.get_products)
+    """
+    for column, kind in TABLES[table]['types'].items():
+        if kind == 'int':
+            df[column] = db.clean_int(df[column])
+        elif kind == 'price':
+            df[column], _ = db.clean_price(df[column])
+        elif kind == 'float':
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    df['id'] = db.clean_int(df['id'])
+    return df
+
+
+def read_csv_chunks(table, path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Порции из CSV формата папки 'data used' (';', первая колонка - индекс = id)
+    """
+    columns = TABLES[table]['columns']
+    reader = pd.read_csv(path, sep=';', index_col=0, dtype=str,
+                         keep_default_na=False, na_values=[''], chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk.iloc[:, :len(columns)]
+        chunk.columns = columns
+        chunk = chunk.rename_axis('id').reset_index()
+        yield chunk[['id'] + columns]
+
+
+def read_xlsx_chunks(table, path, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Порции из XLSX формата папки 'source data' (заголовки на русском,
+    колонки по порядку, id - номер строки с нуля)
+    """
+    from openpyxl import load_workbook
+
+    columns = TABLES[table]['columns']
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = []
+        next_id = 0
+        for values in sheet.iter_rows(min_row=2, max_col=len(columns), values_only=True):
+            if all(v is None for v in values):
+                continue
+            rows.append((next_id,) + tuple(values))
+            next_id += 1
+            if len(rows) >= chunksize:
+                yield pd.DataFrame(rows, columns=['id'] + columns)
+                rows = []
+        if rows:
+            yield pd.DataFrame(rows, columns=['id'] + columns)
+    finally:
+        workbook.close()
+
+
+def find_source(table, source):
+    """Путь к файлу таблицы: сам source или <source>/<table>.csv|.xlsx"""
+    if os.path.isfile(source):
+        return source
+    for ext in ('.csv', '.xlsx'):
+        path = os.path.join(source, table + ext)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f"Нет файла для {table} в {source}")
+
+
+def read_chunks(table, path, chunksize=DEFAULT_CHUNKSIZE):
+    if path.lower().endswith('.xlsx'):
+        return read_xlsx_chunks(table, path, chunksize)
+    return read_csv_chunks(table, path, chunksize)
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def copy_chunks(cursor, target, columns, chunks):
+    """
+    COPY порций DataFrame в таблицу target (колонки columns). Возвращает число строк.
+    """
+    column_list = ', '.join(_quote(c) for c in columns)
+    total = 0
+    for chunk in chunks:
+        buffer = io.StringIO()
+        chunk.to_csv(buffer, index=False, header=False, columns=columns)
+        buffer.seek(0)
+        cursor.copy_expert(f'COPY {target} ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+        total += len(chunk)
+    return total
+
+
+def sync_sequence(cursor, target):
+    """Сдвигает последовательность id таблицы target за максимальный id"""
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", (target,))
+    sequence = cursor.fetchone()[0]
+    if sequence:
+        cursor.execute(f"""
+            SELECT setval(%s, GREATEST(
+                (SELECT COALESCE(MAX("id"), 0) FROM {target}),
+                (SELECT last_value FROM {sequence}),
+                1
+            ))
+        """, (sequence,))
+
+
+def load_table(table, path, mode='replace', chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Загружает файл в таблицу public."<table>"
+
+    mode='replace' - таблица приводится к содержимому файла (строки, которых
+                     нет в файле, удаляются; неизменённые строки не трогаются),
+    mode='upsert'  - строки с существующим id обновляются, новые добавляются.
+    Возвращает число загруженных строк.
+    """
+    if table not in TABLES:
+        raise ValueError(f"Неизвестная таблица: {table}")
+    if mode not in ('replace', 'upsert'):
+        raise ValueError(f"Неизвестный режим: {mode}")
+
+    columns = ['id'] + TABLES[table]['columns']
+    column_list = ', '.join(_quote(c) for c in columns)
+    target = f'public.{_quote(table)}'
+    started = time.perf_counter()
+
+    chunks = (normalize_chunk(table, chunk) for chunk in read_chunks(table, path, chunksize))
+
+    with db.db.cursor() as cursor:
+        cursor.execute(f'CREATE TEMP TABLE stage_import (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP')
+        rows = copy_chunks(cursor, 'stage_import', columns, chunks)
+
+        if mode == 'replace':
+            # удаляются только строки, которых нет в файле: полный DELETE каскадом
+            # снёс бы записи времени производства у продуктов, которые остаются
+            cursor.execute(f"""
+                DELETE FROM {target} t
+                WHERE NOT EXISTS (SELECT 1 FROM stage_import s WHERE s."id" = t."id")
+            """)
+
+        updates = ', '.join(f'{_quote(c)} = EXCLUDED.{_quote(c)}' for c in columns[1:])
+        changed = ' OR '.join(f'{target}.{_quote(c)} IS DISTINCT FROM EXCLUDED.{_quote(c)}' for c in columns[1:])
+        cursor.execute(f"""
+            INSERT INTO {target} ({column_list})
+            SELECT {column_list} FROM stage_import
+            ON CONFLICT ("id") DO UPDATE SET {updates}
+            WHERE {changed}
+        """)
+
+        # id пришли из файла - сдвигаем последовательность за максимальный
+        sync_sequence(cursor, target)
+
+    db.invalidate_table_cache(table)
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ {table}: {rows} строк из {os.path.basename(path)} за {elapsed:.1f} с ({mode})")
+    return rows
+
+
+def load_all(source=DEFAULT_SOURCE, tables=None, mode='replace', chunksize=DEFAULT_CHUNKSIZE):
+    """Загружает перечисленные (по умолчанию все) таблицы из папки или файла"""
+    result = {}
+    for table in TABLES:
+        if tables and table not in tables:
+            continue
+        result[table] = load_table(table, find_source(table, source), mode, chunksize)
+    return result
@@ -0,0 +1,113 @@
+"""
+Служебные команды проекта (запускать из папки app)
+
+    python manage.py migrate [--status]
+    python manage.py load [--source ПАПКА_ИЛИ_ФАЙЛ] [--table ТАБЛИЦА ...] [--mode replace|upsert]
+    python manage.py rollup verify|rebuild
+    python manage.py export ФАЙЛ.csv|.xlsx|.parquet [--type ТИП] [--search ТЕКСТ] [--has-time yes|no] [--sort КЛЮЧ]
+    python manage.py serve-api [--port 8502] [--processes 1]
+"""
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+
+def cmd_migrate(args):
+    import migrate
+    migrate.main(['--status'] if args.status else [])
+
+
+def cmd_load(args):
+    import loader
+
+    source = args.source
+    if os.path.isfile(source) and len(args.table or []) != 1:
+        table = os.path.splitext(os.path.basename(source))[0]
+        if table not in loader.TABLES:
+            raise SystemExit("Для отдельного файла укажите таблицу: --table ИМЯ")
+        args.table = [table]
+
+    loader.load_all(source, args.table, args.mode, args.chunksize)
+
+
+def cmd_rollup(args):
+    import db
+
+    if args.action == 'rebuild':
+        db.rebuild_production_rollup()
+        return
+
+    drift = db.verify_production_rollup()
+    if drift.empty:
+        print("✅ Итоги времени производства совпадают с записями")
+        return
+    print(f"❌ Расхождения в итогах времени производства: {len(drift)} продуктов")
+    print(drift.to_string(index=False))
+    raise SystemExit(1)
+
+
+def cmd_export(args):
+    import exporter
+
+    fmt = os.path.splitext(args.path)[1].lstrip('.').lower()
+    if fmt not in exporter.FORMATS:
+        raise SystemExit(f"Формат по расширению файла: {', '.join(exporter.FORMATS)}")
+
+    has_time = {'yes': True, 'no': False, None: None}[args.has_time]
+    exporter.export_products(fmt, path=args.path, filter_type=args.type, search=args.search,
+                             has_time=has_time, sort=args.sort)
+
+
+def cmd_serve_api(args):
+    import api
+    api.serve(args.port, args.address, args.processes)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Служебные команды «Комфорт»')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    migrate_parser = commands.add_parser('migrate', help='применить SQL-миграции')
+    migrate_parser.add_argument('--status', action='store_true', help='только показать состояние')
+    migrate_parser.set_defaults(func=cmd_migrate)
+
+    load_parser = commands.add_parser('load', help='загрузить таблицы *_import из CSV/XLSX')
+    load_parser.add_argument('--source', default=os.path.join('..', 'data used'),
+                             help="папка с файлами <таблица>.csv/.xlsx или отдельный файл")
+    load_parser.add_argument('--table', action='append',
+                             help='загрузить только эту таблицу (можно несколько раз)')
+    load_parser.add_argument('--mode', choices=['replace', 'upsert'], default='replace')
+    load_parser.add_argument('--chunksize', type=int, default=50000)
+    load_parser.set_defaults(func=cmd_load)
+
+    rollup_parser = commands.add_parser('rollup', help='итоги времени производства по продуктам')
+    rollup_parser.add_argument('action', choices=['verify', 'rebuild'],
+                               help='verify - найти расхождения, rebuild - пересчитать')
+    rollup_parser.set_defaults(func=cmd_rollup)
+
+    export_parser = commands.add_parser('export', help='выгрузить продукцию в CSV/XLSX/Parquet')
+    export_parser.add_argument('path', help='файл, формат - по расширению')
+    export_parser.add_argument('--type', help='только этот тип продукции')
+    export_parser.add_argument('--search', help='подстрока названия или артикула')
+    export_parser.add_argument('--has-time', choices=['yes', 'no'], help='есть ли время производства')
+    export_parser.add_argument('--sort', default='id', help="ключ сортировки ('-' в начале - по убыванию)")
+    export_parser.set_defaults(func=cmd_export)
+
+    api_parser = commands.add_parser('serve-api', help='HTTP API над db.py (см. api.py)')
+    api_parser.add_argument('--port', type=int, default=int(os.getenv('API_PORT', '8502')))
+    api_parser.add_argument('--address', default='', help='адрес (по умолчанию все интерфейсы)')
+    api_parser.add_argument('--processes', type=int, default=1, help='число процессов (0 - по ядрам)')
+    api_parser.set_defaults(func=cmd_serve_api)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,369 @@
+"""
+Метрики запросов и функций в памяти процесса
+
+Время выполнения функций db.py (декоратор instrument) и отдельных SQL
+(InstrumentedCursor для пула psycopg2), число
+строк, выдачи подключений и ошибки. По каждому имени хранится гистограмма
+и последние значения (для p50/p95), последние события - в кольцевом буфере.
+run_scope() собирает стоимость одного перезапуска страницы Streamlit.
+"""
+import os
+import re
+import time
+import threading
+import functools
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# границы гистограмм, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# сколько последних замеров хранить для квантилей
+_RECENT = 512
+
+
+class Stat:
+    """Накопленная статистика одного имени (функции или SQL)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.recent = deque(maxlen=_RECENT)
+
+    def observe(self, seconds, rows=0, error=False):
+        self.calls += 1
+        self.errors += bool(error)
+        self.rows += rows or 0
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        position = 0
+        while position < len(BUCKETS) and seconds > BUCKETS[position]:
+            position += 1
+        self.buckets[position] += 1
+        self.recent.append(seconds)
+
+    def quantile(self, q):
+        if not self.recent:
+            return 0.0
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'rows': self.rows,
+            'total_ms': self.total * 1000,
+            'mean_ms': self.total / self.calls * 1000 if self.calls else 0.0,
+            'p50_ms': self.quantile(0.5) * 1000,
+            'p95_ms': self.quantile(0.95) * 1000,
+            'max_ms': self.max * 1000,
+        }
+
+
+class Registry:
+    """Хранилище метрик процесса (потокобезопасное)"""
+
+    def __init__(self, capacity=1000, runs_capacity=100):
+        self._lock = threading.Lock()
+        self.capacity = capacity
+        self.runs_capacity = runs_capacity
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.functions = {}
+            self.statements = {}
+            self.counters = {}
+            self.events = deque(maxlen=self.capacity)
+            self.runs = deque(maxlen=self.runs_capacity)
+            self.started_at = time.time()
+
+    def observe(self, kind, name, seconds, rows=0, error=None):
+        """kind - 'function' или 'sql'"""
+        table = self.functions if kind == 'function' else self.statements
+        with self._lock:
+            stat = table.get(name)
+            if stat is None:
+                stat = table[name] = Stat()
+            stat.observe(seconds, rows, error is not None)
+            self.events.append({
+                'at': time.time(),
+                'kind': kind,
+                'name': name,
+                'ms': seconds * 1000,
+                'rows': rows,
+                'error': str(error) if error is not None else None,
+            })
+
+            # под блокировкой: запросы одного перезапуска могут идти из
+            # нескольких потоков (db_async.gather)
+            run = _current_run.get()
+            if run is not None and kind == 'sql':
+                run['queries'] += 1
+                run['sql_ms'] += seconds * 1000
+                run['rows'] += rows or 0
+                run['errors'] += error is not None
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            run = _current_run.get()
+            if run is not None and name in run:
+                run[name] += value
+
+    def add_run(self, run):
+        with self._lock:
+            self.runs.append(run)
+
+    def snapshot(self):
+        """Копия всех метрик для отображения"""
+        with self._lock:
+            return {
+                'functions': {name: stat.summary() for name, stat in self.functions.items()},
+                'statements': {name: stat.summary() for name, stat in self.statements.items()},
+                'counters': dict(self.counters),
+                'events': list(self.events),
+                'runs': list(self.runs),
+                'started_at': self.started_at,
+            }
+
+
+registry = Registry(
+    capacity=int(os.getenv('METRICS_EVENTS', '1000')),
+)
+
+
+# ---- нормализация SQL ------------------------------------------------------
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w\"])-?\d+(?:\.\d+)?(?![\w\"])")
+_TUPLE = r"\(\s*\?(?:\s*,\s*\?)*\s*\)"
+_VALUES_LIST = re.compile(rf"({_TUPLE})(?:\s*,\s*{_TUPLE})+")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_sql(sql):
+    """
+    Шаблон запроса для группировки: литералы -> ?, списки VALUES свёрнуты,
+    пробелы схлопнуты, длина ограничена
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', errors='replace')
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _VALUES_LIST.sub(r'\1, ...', sql)
+    sql = _IN_LIST.sub('(?, ...)', sql)
+    sql = _SPACES.sub(' ', sql).strip()
+    return sql[:300]
+
+
+# ---- текущий перезапуск ----------------------------------------------------
+
+_current_run = contextvars.ContextVar('metrics_run', default=None)
+
+
+@contextmanager
+def run_scope(name):
+    """
+    Считает стоимость блока (запросы, время SQL, подключения, строки);
+    итог попадает в registry.runs
+    """
+    run = {
+        'at': datetime.now().strftime('%H:%M:%S'),
+        'name': name,
+        'queries': 0,
+        'sql_ms': 0.0,
+        'rows': 0,
+        'errors': 0,
+        'db_connections': 0,
+        'total_ms': 0.0,
+    }
+    token = _current_run.set(run)
+    started = time.perf_counter()
+    try:
+        yield run
+    finally:
+        run['total_ms'] = (time.perf_counter() - started) * 1000
+        _current_run.reset(token)
+        registry.add_run(run)
+
+
+def current_run():
+    return _current_run.get()
+
+
+# ---- инструментирование ----------------------------------------------------
+
+def instrument(func=None, name=None):
+    """
+    Декоратор: время и ошибки вызовов функции. Имя по умолчанию -
+    <модуль>.<функция>
+    """
+    def decorate(func):
+        label = name or f"{func.__module__}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                registry.observe('function', label, time.perf_counter() - started, error=e)
+                raise
+            registry.observe('function', label, time.perf_counter() - started)
+            return result
+        return wrapper
+
+    return decorate(func) if func is not None else decorate
+
+
+@contextmanager
+def timed(name, kind='function'):
+    """То же, что instrument, для произвольного блока кода"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        registry.observe(kind, name, time.perf_counter() - started, error=e)
+        raise
+    registry.observe(kind, name, time.perf_counter() - started)
+
+
+def _statement(cursor, sql):
+    from psycopg2 import sql as pg_sql
+
+    if isinstance(sql, pg_sql.Composable):
+        sql = sql.as_string(cursor)
+    return normalize_sql(sql)
+
+
+_cursor_class = None
+
+
+def _instrumented_cursor():
+    """
+    Класс курсора psycopg2, записывающий время и число строк каждого запроса.
+    Создаётся при первом обращении к metrics.InstrumentedCursor, чтобы
+    импорт metrics не тянул psycopg2.
+    """
+    global _cursor_class
+    if _cursor_class is not None:
+        return _cursor_class
+
+    import psycopg2.extensions
+
+    base = psycopg2.extensions.cursor
+
+    class InstrumentedCursor(base):
+        def _observe(self, method, sql, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = method(self, sql, *args, **kwargs)
+            except Exception as e:
+                registry.observe('sql', _statement(self, sql), time.perf_counter() - started, error=e)
+                raise
+            registry.observe('sql', _statement(self, sql), time.perf_counter() - started,
+                             rows=max(self.rowcount, 0))
+            return result
+
+        def execute(self, sql, args=None):
+            return self._observe(base.execute, sql, args)
+
+        def executemany(self, sql, args_list):
+            return self._observe(base.executemany, sql, args_list)
+
+        def copy_expert(self, sql, file, size=8192):
+            return self._observe(base.copy_expert, sql, file, size)
+
+    _cursor_class = InstrumentedCursor
+    return _cursor_class
+
+
+def __getattr__(name):
+    if name == 'InstrumentedCursor':
+        return _instrumented_cursor()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# ---- экспорт ---------------------------------------------------------------
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def prometheus_text(cache_stats=None):
+    """Метрики в текстовом формате Prometheus"""
+    lines = []
+    with registry._lock:
+        for metric, kind, table in (('comfort_function_duration_seconds', 'function', registry.functions),
+                                    ('comfort_sql_duration_seconds', 'statement', registry.statements)):
+            lines.append(f"# HELP {metric} Время выполнения ({kind})")
+            lines.append(f"# TYPE {metric} histogram")
+            for name, stat in table.items():
+                label = f'{kind}="{_label(name)}"'
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ('+Inf',), stat.buckets):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{label}}} {stat.total}')
+                lines.append(f'{metric}_count{{{label}}} {stat.calls}')
+
+        # сэмплы одного семейства должны идти подряд, сразу после его TYPE
+        for metric, attr in (('comfort_sql_rows_total', 'rows'),
+                             ('comfort_sql_errors_total', 'errors')):
+            lines.append(f"# TYPE {metric} counter")
+            for name, stat in registry.statements.items():
+                lines.append(f'{metric}{{statement="{_label(name)}"}} {getattr(stat, attr)}')
+
+        for name, value in sorted(registry.counters.items()):
+            lines.append(f"# TYPE comfort_{name}_total counter")
+            lines.append(f"comfort_{name}_total {value}")
+
+    for name, value in (cache_stats or {}).items():
+        if isinstance(value, (int, float)):
+            lines.append(f"comfort_cache_{name} {value}")
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_prometheus(path, cache_stats=None):
+    """Записывает метрики в файл (атомарно - для textfile-коллектора node_exporter)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(prometheus_text(cache_stats))
+    os.replace(tmp_path, path)
+    return path
+
+
+_exporter = None
+_exporter_lock = threading.Lock()
+
+
+def start_file_exporter(path, interval=15.0, cache_stats=None):
+    """
+    Фоновый поток, раз в interval секунд переписывающий файл метрик.
+    cache_stats - функция, возвращающая счётчики кэша. Запускается один раз на процесс.
+    """
+    global _exporter
+
+    def loop():
+        while True:
+            try:
+                write_prometheus(path, cache_stats() if cache_stats else None)
+            except OSError as e:
+                print(f"❌ Не удалось записать метрики в {path}: {e}")
+            time.sleep(interval)
+
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = threading.Thread(target=loop, name='metrics-exporter', daemon=True)
+            _exporter.start()
+    return _exporter
@@ -0,0 +1,107 @@
+"""
+Применение SQL-миграций из папки migrations
+
+    python migrate.py            - применить все новые миграции
+    python migrate.py --status   - показать, какие миграции уже применены
+"""
+import os
+import sys
+import argparse
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import db as db
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+# произвольный ключ advisory-блокировки, чтобы два процесса не применяли миграции одновременно
+_LOCK_KEY = 7301
+
+
+def list_migrations():
+    """Имена файлов миграций по порядку"""
+    return sorted(f for f in os.listdir(MIGRATIONS_DIR) if f.endswith('.sql'))
+
+
+def _ensure_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS public.schema_migrations (
+            name text PRIMARY KEY,
+            applied_at timestamptz NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def applied_migrations():
+    """Множество уже применённых миграций"""
+    with db.db.cursor() as cursor:
+        _ensure_table(cursor)
+        cursor.execute('SELECT name FROM public.schema_migrations')
+        return {row[0] for row in cursor.fetchall()}
+
+
+def apply_migrations():
+    """
+    Применяет новые миграции, каждую в отдельной транзакции.
+    Возвращает список применённых.
+    """
+    applied = []
+
+    with db.db.connection() as conn:
+        with conn.cursor() as cursor:
+            _ensure_table(cursor)
+            conn.commit()
+            del conn.notices[:]
+
+            cursor.execute('SELECT pg_advisory_lock(%s)', (_LOCK_KEY,))
+            try:
+                cursor.execute('SELECT name FROM public.schema_migrations')
+                done = {row[0] for row in cursor.fetchall()}
+
+                for name in list_migrations():
+                    if name in done:
+                        continue
+
+                    with open(os.path.join(MIGRATIONS_DIR, name), encoding='utf-8') as f:
+                        sql = f.read()
+
+                    try:
+                        cursor.execute(sql)
+                        cursor.execute('INSERT INTO public.schema_migrations (name) VALUES (%s)', (name,))
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        print(f"❌ Ошибка в миграции {name}: {e}")
+                        raise
+
+                    for notice in conn.notices:
+                        print(f"   {notice.strip()}")
+                    del conn.notices[:]
+
+                    applied.append(name)
+                    print(f"✅ Применена миграция {name}")
+            finally:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', (_LOCK_KEY,))
+
+    # структура таблиц могла поменяться - сбрасываем кэш
+    db.cache.clear()
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='SQL-миграции базы данных')
+    parser.add_argument('--status', action='store_true', help='показать состояние миграций')
+    args = parser.parse_args(argv)
+
+    if args.status:
+        done = applied_migrations()
+        for name in list_migrations():
+            print(f"{'✅' if name in done else '⏳'} {name}")
+        return
+
+    applied = apply_migrations()
+    if not applied:
+        print("Новых миграций нет")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+-- Триграммный поиск по названию и артикулу продукции.
+-- Если расширение pg_trgm поставить нельзя (нет прав или пакета postgresql-contrib),
+-- миграция не падает: db.search_products() переключится на индекс в памяти.
+
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION
+    WHEN insufficient_privilege OR undefined_file OR feature_not_supported THEN
+        RAISE NOTICE 'pg_trgm недоступно: %', SQLERRM;
+END
+$$;
+
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm') THEN
+        CREATE INDEX IF NOT EXISTS products_import_name_trgm_idx
+            ON public."Products_import" USING gin ("Product name" gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS products_import_article_trgm_idx
+            ON public."Products_import" USING gin (("Article"::text) gin_trgm_ops);
+    END IF;
+END
+$$;
@@ -0,0 +1,24 @@
+-- Идентификаторы новых строк выдаёт последовательность, а не SELECT MAX("id") + 1:
+-- так параллельные вставки не получают одинаковый id.
+
+DO $$
+DECLARE
+    tbl text;
+    seq text;
+BEGIN
+    FOREACH tbl IN ARRAY ARRAY['Products_import', 'Product_workshops_import'] LOOP
+        seq := pg_get_serial_sequence(format('public.%I', tbl), 'id');
+
+        IF seq IS NULL THEN
+            seq := format('public.%I', tbl || '_id_seq');
+            EXECUTE format('CREATE SEQUENCE %s OWNED BY public.%I."id"', seq, tbl);
+            EXECUTE format('ALTER TABLE public.%I ALTER COLUMN "id" SET DEFAULT nextval(%L)', tbl, seq);
+        END IF;
+
+        EXECUTE format(
+            'SELECT setval(%L, COALESCE((SELECT MAX("id") FROM public.%I), 0) + 1, false)',
+            seq, tbl
+        );
+    END LOOP;
+END
+$$;
@@ -0,0 +1,147 @@
+-- Product_workshops_import ссылается на продукт и цех целочисленными ключами
+-- (product_id, workshop_id) с внешними ключами и индексами. Текстовые колонки
+-- "Product name"/"Workshop name" остаются для совместимости и поддерживаются
+-- триггерами: при вставке по имени подставляется id, при вставке по id - имя,
+-- при переименовании продукта имя обновляется во всех его записях.
+
+ALTER TABLE public."Product_workshops_import"
+    ADD COLUMN IF NOT EXISTS product_id integer,
+    ADD COLUMN IF NOT EXISTS workshop_id integer;
+
+-- ключ для сравнения названий: без пробелов по краям, включая неразрывный
+-- (в данных есть "Тумба под ТВ" с U+00A0 на конце)
+CREATE OR REPLACE FUNCTION public.name_key(value text) RETURNS text
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT btrim(value, E' \t\r\n\u00a0')
+$$;
+
+CREATE INDEX IF NOT EXISTS products_import_name_key_idx
+    ON public."Products_import" (public.name_key("Product name"));
+CREATE INDEX IF NOT EXISTS workshops_import_name_key_idx
+    ON public."Workshops_import" (public.name_key("Workshop name"));
+
+-- заполнение ключей у существующих записей (при совпадении имён - точное совпадение и меньший id)
+-- (подзапрос на каждую строку: точное совпадение зависит от названия в самой записи)
+UPDATE public."Product_workshops_import" pw
+SET product_id = (
+    SELECT p."id"
+    FROM public."Products_import" p
+    WHERE public.name_key(p."Product name") = public.name_key(pw."Product name")
+    ORDER BY (p."Product name" = pw."Product name") DESC, p."id"
+    LIMIT 1
+)
+WHERE pw.product_id IS NULL;
+
+UPDATE public."Product_workshops_import" pw
+SET workshop_id = (
+    SELECT w."id"
+    FROM public."Workshops_import" w
+    WHERE public.name_key(w."Workshop name") = public.name_key(pw."Workshop name")
+    ORDER BY (w."Workshop name" = pw."Workshop name") DESC, w."id"
+    LIMIT 1
+)
+WHERE pw.workshop_id IS NULL;
+
+DO $$
+DECLARE
+    missing integer;
+BEGIN
+    SELECT COUNT(*) INTO missing
+    FROM public."Product_workshops_import"
+    WHERE product_id IS NULL OR workshop_id IS NULL;
+
+    IF missing > 0 THEN
+        RAISE NOTICE 'Записей времени производства без продукта или цеха: %', missing;
+    END IF;
+END
+$$;
+
+ALTER TABLE public."Product_workshops_import"
+    ADD CONSTRAINT product_workshops_product_fk
+        FOREIGN KEY (product_id) REFERENCES public."Products_import" ("id") ON DELETE CASCADE,
+    ADD CONSTRAINT product_workshops_workshop_fk
+        FOREIGN KEY (workshop_id) REFERENCES public."Workshops_import" ("id");
+
+CREATE INDEX IF NOT EXISTS product_workshops_product_id_idx
+    ON public."Product_workshops_import" (product_id);
+CREATE INDEX IF NOT EXISTS product_workshops_workshop_id_idx
+    ON public."Product_workshops_import" (workshop_id);
+
+-- ключи по именам и имена по ключам для вставок/изменений в Product_workshops_import
+CREATE OR REPLACE FUNCTION public.product_workshops_fill_keys() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- имя изменил триггер переименования продукта - id уже верный
+    IF pg_trigger_depth() > 1 THEN
+        RETURN NEW;
+    END IF;
+
+    IF TG_OP = 'UPDATE' THEN
+        IF NEW."Product name" IS DISTINCT FROM OLD."Product name"
+                AND NEW.product_id IS NOT DISTINCT FROM OLD.product_id THEN
+            NEW.product_id := NULL;
+        END IF;
+        IF NEW."Workshop name" IS DISTINCT FROM OLD."Workshop name"
+                AND NEW.workshop_id IS NOT DISTINCT FROM OLD.workshop_id THEN
+            NEW.workshop_id := NULL;
+        END IF;
+    END IF;
+
+    IF NEW.product_id IS NULL AND NEW."Product name" IS NOT NULL THEN
+        SELECT p."id" INTO NEW.product_id
+        FROM public."Products_import" p
+        WHERE public.name_key(p."Product name") = public.name_key(NEW."Product name")
+        ORDER BY (p."Product name" = NEW."Product name") DESC, p."id"
+        LIMIT 1;
+    ELSIF NEW.product_id IS NOT NULL THEN
+        SELECT p."Product name" INTO NEW."Product name"
+        FROM public."Products_import" p
+        WHERE p."id" = NEW.product_id;
+    END IF;
+
+    IF NEW.workshop_id IS NULL AND NEW."Workshop name" IS NOT NULL THEN
+        SELECT w."id" INTO NEW.workshop_id
+        FROM public."Workshops_import" w
+        WHERE public.name_key(w."Workshop name") = public.name_key(NEW."Workshop name")
+        ORDER BY (w."Workshop name" = NEW."Workshop name") DESC, w."id"
+        LIMIT 1;
+    ELSIF NEW.workshop_id IS NOT NULL THEN
+        SELECT w."Workshop name" INTO NEW."Workshop name"
+        FROM public."Workshops_import" w
+        WHERE w."id" = NEW.workshop_id;
+    END IF;
+
+    RETURN NEW;
+END
+$$;
+
+CREATE TRIGGER product_workshops_fill_keys
+    BEFORE INSERT OR UPDATE ON public."Product_workshops_import"
+    FOR EACH ROW EXECUTE FUNCTION public.product_workshops_fill_keys();
+
+-- переименование продукта/цеха не отрывает записи времени производства
+CREATE OR REPLACE FUNCTION public.products_sync_names() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'Products_import' THEN
+        UPDATE public."Product_workshops_import"
+        SET "Product name" = NEW."Product name"
+        WHERE product_id = NEW."id";
+    ELSE
+        UPDATE public."Product_workshops_import"
+        SET "Workshop name" = NEW."Workshop name"
+        WHERE workshop_id = NEW."id";
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER products_sync_names
+    AFTER UPDATE OF "Product name" ON public."Products_import"
+    FOR EACH ROW WHEN (NEW."Product name" IS DISTINCT FROM OLD."Product name")
+    EXECUTE FUNCTION public.products_sync_names();
+
+CREATE TRIGGER workshops_sync_names
+    AFTER UPDATE OF "Workshop name" ON public."Workshops_import"
+    FOR EACH ROW WHEN (NEW."Workshop name" IS DISTINCT FROM OLD."Workshop name")
+    EXECUTE FUNCTION public.products_sync_names();
@@ -0,0 +1,102 @@
+-- Суммарное время производства по продукту хранится в product_production_time
+-- (product_id, total_time_h, workshop_count), чтобы чтение было поиском по
+-- первичному ключу, а не SUM по всем записям продукта.
+--
+-- Таблицу поддерживают триггеры уровня оператора на Product_workshops_import:
+-- по таблицам переходов собираются затронутые product_id, и итог
+-- пересчитывается только для них (по индексу product_id). Пересчёт, а не
+-- прибавление разницы, не копит ошибку округления float.
+-- Проверить/пересобрать: python manage.py rollup verify|rebuild
+
+CREATE TABLE IF NOT EXISTS public.product_production_time (
+    product_id integer PRIMARY KEY
+        REFERENCES public."Products_import" ("id") ON DELETE CASCADE,
+    total_time_h double precision NOT NULL DEFAULT 0,
+    workshop_count integer NOT NULL DEFAULT 0
+);
+
+-- пересчёт итогов для перечисленных продуктов
+CREATE OR REPLACE FUNCTION public.refresh_product_production_time(ids integer[]) RETURNS void
+LANGUAGE sql AS $$
+    DELETE FROM public.product_production_time r
+    WHERE r.product_id = ANY(ids)
+      AND NOT EXISTS (
+          SELECT 1 FROM public."Product_workshops_import" pw
+          WHERE pw.product_id = r.product_id
+      );
+
+    INSERT INTO public.product_production_time AS r (product_id, total_time_h, workshop_count)
+    SELECT product_id,
+           SUM("Production time, h"::numeric)::double precision,
+           COUNT(DISTINCT workshop_id)
+    FROM public."Product_workshops_import"
+    WHERE product_id = ANY(ids)
+    GROUP BY product_id
+    ON CONFLICT (product_id) DO UPDATE
+    SET total_time_h = EXCLUDED.total_time_h,
+        workshop_count = EXCLUDED.workshop_count
+    WHERE (r.total_time_h, r.workshop_count)
+          IS DISTINCT FROM (EXCLUDED.total_time_h, EXCLUDED.workshop_count);
+$$;
+
+CREATE OR REPLACE FUNCTION public.product_production_time_sync() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    ids integer[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT product_id) INTO ids
+        FROM new_rows WHERE product_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT product_id) INTO ids
+        FROM old_rows WHERE product_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT product_id) INTO ids
+        FROM (SELECT product_id FROM old_rows UNION SELECT product_id FROM new_rows) changed
+        WHERE product_id IS NOT NULL;
+    END IF;
+
+    IF ids IS NOT NULL THEN
+        PERFORM public.refresh_product_production_time(ids);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+-- таблицы переходов нельзя объявить у триггера на несколько событий - три триггера
+CREATE TRIGGER product_production_time_insert
+    AFTER INSERT ON public."Product_workshops_import"
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.product_production_time_sync();
+
+CREATE TRIGGER product_production_time_update
+    AFTER UPDATE ON public."Product_workshops_import"
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.product_production_time_sync();
+
+CREATE TRIGGER product_production_time_delete
+    AFTER DELETE ON public."Product_workshops_import"
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION public.product_production_time_sync();
+
+CREATE OR REPLACE FUNCTION public.product_production_time_truncate() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM public.product_production_time;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER product_production_time_truncate
+    AFTER TRUNCATE ON public."Product_workshops_import"
+    FOR EACH STATEMENT EXECUTE FUNCTION public.product_production_time_truncate();
+
+-- начальное заполнение
+INSERT INTO public.product_production_time (product_id, total_time_h, workshop_count)
+SELECT product_id,
+       SUM("Production time, h"::numeric)::double precision,
+       COUNT(DISTINCT workshop_id)
+FROM public."Product_workshops_import"
+WHERE product_id IS NOT NULL
+GROUP BY product_id
+ON CONFLICT (product_id) DO NOTHING;
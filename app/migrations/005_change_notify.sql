@@ -0,0 +1,90 @@
+-- Уведомления об изменениях таблиц для сброса кэша во всех процессах
+-- (notifications.py слушает канал через LISTEN).
+--
+-- Триггеры уровня оператора: один NOTIFY на INSERT/UPDATE/DELETE с
+-- id затронутых строк, а не по сообщению на строку. Полезная нагрузка:
+--     {"table": "Products_import", "op": "UPDATE", "column": "id", "ids": [1, 2]}
+-- Для Product_workshops_import в ids - product_id (кэш записей времени
+-- производства разложен по продуктам). Если строк больше 500 (предел
+-- длины сообщения NOTIFY - 8000 байт) или это TRUNCATE, ids = null -
+-- сбрасывается всё по таблице. Сообщения уходят при COMMIT, после
+-- отката - не уходят.
+
+CREATE OR REPLACE FUNCTION public.notify_table_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    key_column text := COALESCE(TG_ARGV[0], 'id');
+    source text;
+    ids integer[];
+    total integer;
+BEGIN
+    IF TG_OP <> 'TRUNCATE' THEN
+        source := CASE TG_OP
+            WHEN 'INSERT' THEN 'SELECT %1$I FROM new_rows'
+            WHEN 'DELETE' THEN 'SELECT %1$I FROM old_rows'
+            ELSE 'SELECT %1$I FROM old_rows UNION SELECT %1$I FROM new_rows'
+        END;
+        EXECUTE format(
+            'SELECT array_agg(DISTINCT key ORDER BY key), COUNT(DISTINCT key) FROM ('
+            || source || ') changed (key) WHERE key IS NOT NULL',
+            key_column
+        ) INTO ids, total;
+
+        -- оператор ничего не изменил
+        IF total = 0 THEN
+            RETURN NULL;
+        END IF;
+        IF total > 500 THEN
+            ids := NULL;
+        END IF;
+    END IF;
+
+    PERFORM pg_notify('comfort_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'column', key_column,
+        'ids', ids
+    )::text);
+    RETURN NULL;
+END
+$$;
+
+DO $$
+DECLARE
+    tbl text;
+    key_column text;
+BEGIN
+    FOR tbl, key_column IN VALUES
+        ('Products_import', 'id'),
+        ('Product_type_import', 'id'),
+        ('Material_type_import', 'id'),
+        ('Workshops_import', 'id'),
+        ('Product_workshops_import', 'product_id')
+    LOOP
+        -- таблицы переходов нельзя объявить у триггера на несколько событий
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT ON public.%I '
+            'REFERENCING NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION public.notify_table_change(%L)',
+            lower(tbl) || '_notify_insert', tbl, key_column
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER UPDATE ON public.%I '
+            'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION public.notify_table_change(%L)',
+            lower(tbl) || '_notify_update', tbl, key_column
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON public.%I '
+            'REFERENCING OLD TABLE AS old_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION public.notify_table_change(%L)',
+            lower(tbl) || '_notify_delete', tbl, key_column
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER TRUNCATE ON public.%I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION public.notify_table_change(%L)',
+            lower(tbl) || '_notify_truncate', tbl, key_column
+        );
+    END LOOP;
+END
+$$;
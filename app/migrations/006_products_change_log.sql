@@ -0,0 +1,97 @@
+-- Журнал изменений продукции для обновления кадра в памяти дельтами
+-- (db.refresh_products): вместо перечитывания всего Products_import
+-- читаются только строки, изменённые после прошлого обновления.
+--
+-- На каждый продукт - одна строка: id и номер транзакции (xid8), которая
+-- последней меняла сам продукт или его итог времени производства
+-- (product_production_time). Удалённые продукты остаются в журнале
+-- (надгробия): по ним читатель понимает, что строку надо убрать.
+-- TRUNCATE отмечается не строкой журнала, а в отдельной однострочной
+-- таблице products_change_reset (id 0 - обычный id продукта: загрузка из
+-- CSV и синтетические данные нумеруют с нуля); если её changed_xid не
+-- меньше отметки читателя, нужна полная перезагрузка.
+--
+-- Отметка читателя - xmin его снимка (pg_snapshot_xmin): всё, что
+-- закоммичено раньше, он уже видел, а транзакции с номером не меньше
+-- отметки попадут в следующую дельту, даже если закоммитятся позже.
+
+CREATE TABLE IF NOT EXISTS public.products_change_log (
+    product_id integer PRIMARY KEY,
+    changed_xid xid8 NOT NULL DEFAULT pg_current_xact_id()
+);
+
+CREATE INDEX IF NOT EXISTS products_change_log_xid_idx
+    ON public.products_change_log (changed_xid);
+
+CREATE TABLE IF NOT EXISTS public.products_change_reset (
+    singleton boolean PRIMARY KEY DEFAULT true CHECK (singleton),
+    changed_xid xid8 NOT NULL
+);
+
+CREATE OR REPLACE FUNCTION public.products_change_log_write() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    key_column text := COALESCE(TG_ARGV[0], 'id');
+    source text;
+BEGIN
+    IF TG_OP = 'TRUNCATE' THEN
+        INSERT INTO public.products_change_reset AS r (singleton, changed_xid)
+        VALUES (true, pg_current_xact_id())
+        ON CONFLICT (singleton) DO UPDATE SET changed_xid = EXCLUDED.changed_xid;
+        RETURN NULL;
+    END IF;
+
+    source := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT %1$I FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT %1$I FROM old_rows'
+        ELSE 'SELECT %1$I FROM old_rows UNION SELECT %1$I FROM new_rows'
+    END;
+    -- одна транзакция может задеть продукт несколько раз (каскад, триггеры
+    -- итогов) - строку журнала переписываем только при новой транзакции
+    EXECUTE format(
+        'INSERT INTO public.products_change_log AS l (product_id, changed_xid) '
+        'SELECT DISTINCT key, pg_current_xact_id() FROM (' || source || ') changed (key) '
+        'WHERE key IS NOT NULL '
+        'ON CONFLICT (product_id) DO UPDATE SET changed_xid = EXCLUDED.changed_xid '
+        'WHERE l.changed_xid <> EXCLUDED.changed_xid',
+        key_column
+    );
+    RETURN NULL;
+END
+$$;
+
+DO $$
+DECLARE
+    tbl text;
+    key_column text;
+BEGIN
+    FOR tbl, key_column IN VALUES
+        ('Products_import', 'id'),
+        ('product_production_time', 'product_id')
+    LOOP
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT ON public.%I '
+            'REFERENCING NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION public.products_change_log_write(%L)',
+            lower(tbl) || '_change_log_insert', tbl, key_column
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER UPDATE ON public.%I '
+            'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION public.products_change_log_write(%L)',
+            lower(tbl) || '_change_log_update', tbl, key_column
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON public.%I '
+            'REFERENCING OLD TABLE AS old_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION public.products_change_log_write(%L)',
+            lower(tbl) || '_change_log_delete', tbl, key_column
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER TRUNCATE ON public.%I '
+            'FOR EACH STATEMENT EXECUTE FUNCTION public.products_change_log_write(%L)',
+            lower(tbl) || '_change_log_truncate', tbl, key_column
+        );
+    END LOOP;
+END
+$$;
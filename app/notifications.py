@@ -0,0 +1,185 @@
+"""
+Сброс кэша по уведомлениям Postgres (LISTEN/NOTIFY)
+
+Триггеры из миграции 005 после каждого изменения таблиц *_import шлют в
+канал comfort_changes имя таблицы и id изменённых строк. Один фоновый
+поток на процесс держит отдельное подключение с LISTEN и сбрасывает
+затронутые записи кэша db.py - так изменения из другой сессии, процесса
+API или загрузки из файлов видны сразу, а не через TTL.
+
+    import notifications
+    notifications.start()                     # идемпотентно, поток-демон
+    notifications.subscribe(callback)         # callback(table, op, ids) на каждое изменение
+
+Если подключение оборвалось, поток переподключается (с паузой до
+NOTIFY_RECONNECT_MAX секунд), сбрасывает весь кэш и помечает кадр
+продукции устаревшим: уведомления за время разрыва потеряны. Выключить - DB_NOTIFY=0.
+"""
+import os
+import json
+import time
+import select
+import threading
+
+import psycopg2
+
+import metrics
+
+CHANNEL = 'comfort_changes'
+ENABLED = os.getenv('DB_NOTIFY', '1') != '0'
+# сколько секунд ждать уведомления перед проверкой подключения
+POLL_TIMEOUT = 5.0
+RECONNECT_MAX = float(os.getenv('NOTIFY_RECONNECT_MAX', '30'))
+
+_lock = threading.Lock()
+_thread = None
+_pid = None
+_stop = threading.Event()
+_subscribers = []
+
+_state = {
+    'connected': False,
+    'received': 0,
+    'reconnects': 0,
+    'last_event': None,
+    'last_error': None,
+}
+
+
+def subscribe(callback):
+    """callback(table, op, ids) вызывается в потоке слушателя после сброса кэша"""
+    with _lock:
+        if callback not in _subscribers:
+            _subscribers.append(callback)
+
+
+def start():
+    """
+    Запускает слушателя, если он ещё не запущен в этом процессе
+    (после fork - например, tornado с --processes - запускается заново).
+    Возвращает поток или None, если уведомления выключены.
+    """
+    global _thread, _pid
+    if not ENABLED:
+        return None
+
+    with _lock:
+        if _thread is not None and _thread.is_alive() and _pid == os.getpid():
+            return _thread
+        _stop.clear()
+        _pid = os.getpid()
+        _thread = threading.Thread(target=_run, name='db-notify', daemon=True)
+        _thread.start()
+        return _thread
+
+
+def stop(timeout=None):
+    """Останавливает слушателя (выходит после текущего ожидания)"""
+    _stop.set()
+    if _thread is not None:
+        _thread.join(timeout)
+
+
+def status():
+    """Состояние слушателя для страницы «Производительность»"""
+    with _lock:
+        running = _thread is not None and _thread.is_alive() and _pid == os.getpid()
+        return {'running': running, **_state}
+
+
+def _connect():
+    import db
+
+    conn = psycopg2.connect(
+        host=db.db.host,
+        port=db.db.port,
+        database=db.db.database,
+        user=db.db.user,
+        password=db.db.password,
+        application_name='comfort-notify',
+    )
+    conn.set_session(autocommit=True)
+    with conn.cursor() as cursor:
+        cursor.execute(f'LISTEN {CHANNEL}')
+    return conn
+
+
+def handle(payload):
+    """Разбирает одно уведомление и сбрасывает кэш; возвращает (table, op, ids)"""
+    import db
+
+    try:
+        event = json.loads(payload)
+        table, op, ids = event['table'], event['op'], event.get('ids')
+    except (ValueError, KeyError, TypeError):
+        print(f"❌ Непонятное уведомление: {payload[:200]}")
+        return None
+
+    db.invalidate_table_cache(table, ids)
+    metrics.registry.increment('db_notifications')
+
+    with _lock:
+        _state['received'] += 1
+        _state['last_event'] = {'table': table, 'op': op,
+                                'rows': None if ids is None else len(ids), 'at': time.time()}
+        subscribers = list(_subscribers)
+
+    for callback in subscribers:
+        try:
+            callback(table, op, ids)
+        except Exception as e:
+            print(f"❌ Ошибка обработчика уведомления {table}: {e}")
+    return table, op, ids
+
+
+def _listen(conn):
+    while not _stop.is_set():
+        if select.select([conn], [], [], POLL_TIMEOUT) == ([], [], []):
+            # тишина - проверяем, что подключение живо
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            continue
+
+        conn.poll()
+        while conn.notifies:
+            notify = conn.notifies.pop(0)
+            handle(notify.payload)
+
+
+def _run():
+    import db
+
+    delay = 1.0
+    first = True
+    while not _stop.is_set():
+        conn = None
+        try:
+            conn = _connect()
+            with _lock:
+                _state['connected'] = True
+                _state['last_error'] = None
+            if not first:
+                # пока не было подключения, уведомления терялись
+                db.invalidate_all_caches()
+                print("🔔 Слушатель изменений переподключился, кэш сброшен")
+            else:
+                print(f"🔔 Слушатель изменений запущен (канал {CHANNEL})")
+            delay = 1.0
+            _listen(conn)
+        except Exception as e:
+            error = (str(e).strip() or type(e).__name__).splitlines()[0]
+            with _lock:
+                _state['connected'] = False
+                _state['last_error'] = error
+                _state['reconnects'] += 1
+            metrics.registry.increment('db_notify_reconnects')
+            print(f"❌ Слушатель изменений: {error}; повтор через {delay:.0f} с")
+            _stop.wait(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+        finally:
+            first = False
+            if conn is not None:
+                conn.close()
+
+    with _lock:
+        _state['connected'] = False
@@ -0,0 +1,214 @@
+"""
+Профилирование перезапусков страницы (включается по желанию)
+
+Режимы: 'cprofile' - детерминированный cProfile (скачивается как .pstats),
+'sampling' - опрос стека потока раз в PROFILE_INTERVAL_MS (скачивается как
+JSON для speedscope.app). Последние PROFILE_KEEP профилей хранятся в памяти
+процесса. Время сводится к функциям страниц (app.py) и db.py.
+Пока идёт профилирование, db_async.gather работает последовательно в
+потоке страницы - иначе время запросов ушло бы в потоки пула.
+"""
+import os
+import sys
+import json
+import time
+import marshal
+import pstats
+import cProfile
+import itertools
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import db_async
+
+MODES = ('cprofile', 'sampling')
+
+# файлы, по функциям которых строится сводка
+SUMMARY_FILES = ('app.py', 'db.py', 'calculator.py', 'loader.py')
+
+SAMPLE_INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', '5')) / 1000
+
+_profiles = deque(maxlen=int(os.getenv('PROFILE_KEEP', '20')))
+_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+def requested_mode(*values):
+    """
+    Режим по первому заданному значению (переменная окружения APP_PROFILE,
+    параметр ?profile=...): '1'/'true' - cprofile, пусто/'0' - выключено
+    """
+    for value in values:
+        if not value:
+            continue
+        value = str(value).strip().lower()
+        if value in ('0', 'false', 'off'):
+            return None
+        if value in MODES:
+            return value
+        return 'cprofile'
+    return None
+
+
+def profiles():
+    """Сохранённые профили, новые первыми"""
+    with _lock:
+        return list(reversed(_profiles))
+
+
+def clear():
+    with _lock:
+        _profiles.clear()
+
+
+def _short(filename):
+    return os.path.basename(filename)
+
+
+def _summarize(durations, limit=15):
+    """[(функция, мс)] по функциям из SUMMARY_FILES, по убыванию"""
+    return sorted(durations.items(), key=lambda item: -item[1])[:limit]
+
+
+# ---- cProfile ----------------------------------------------------------------
+
+def _cprofile_result(profiler):
+    stats = pstats.Stats(profiler)
+    durations = {}
+    for (filename, line, name), (_, _, _, cumulative, _) in stats.stats.items():
+        if _short(filename) in SUMMARY_FILES and name != '<module>':
+            durations[f"{_short(filename)}:{name}"] = cumulative * 1000
+    # то же, что pstats.Stats.dump_stats, но в память
+    return _summarize(durations), marshal.dumps(stats.stats), 'pstats'
+
+
+# ---- опрос стека ---------------------------------------------------------------
+
+class StackSampler:
+    """Опрашивает стек потока thread_id в фоновом потоке"""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = []
+        self.frame_index = {}
+        self.samples = []
+        self.weights = []
+        self._stop = threading.Event()
+
+    def _frame_id(self, code):
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        position = self.frame_index.get(key)
+        if position is None:
+            position = self.frame_index[key] = len(self.frames)
+            self.frames.append({'name': code.co_name, 'file': code.co_filename,
+                                'line': code.co_firstlineno})
+        return position
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append((now - last) * 1000)
+            last = now
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def speedscope(self, name):
+        """Профиль в формате speedscope (sampled)"""
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': sum(self.weights),
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+            'name': name,
+            'activeProfileIndex': 0,
+            'exporter': 'comfort profiling',
+        }
+
+    def result(self, name):
+        # время функции - сумма весов семплов, где она есть в стеке (один раз на семпл)
+        durations = Counter()
+        for stack, weight in zip(self.samples, self.weights):
+            for position in set(stack):
+                frame = self.frames[position]
+                if _short(frame['file']) in SUMMARY_FILES and frame['name'] != '<module>':
+                    durations[f"{_short(frame['file'])}:{frame['name']}"] += weight
+        data = json.dumps(self.speedscope(name), ensure_ascii=False).encode('utf-8')
+        return _summarize(durations), data, 'speedscope.json'
+
+
+@contextmanager
+def profile_run(name, mode):
+    """
+    Профилирует блок в режиме mode (None - ничего не делает) и сохраняет
+    результат в список профилей, даже если блок прерван исключением
+    (например, st.rerun())
+    """
+    if mode is None:
+        yield None
+        return
+    if mode not in MODES:
+        raise ValueError(f"Неизвестный режим профилирования: {mode}")
+
+    started_at = datetime.now()
+    started = time.perf_counter()
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # с Python 3.12 cProfile может работать только в одном потоке
+            # процесса - если он занят другой сессией, опрашиваем стек
+            mode = 'sampling'
+    if mode == 'sampling':
+        profiler = StackSampler(threading.get_ident())
+        profiler.start()
+
+    try:
+        with db_async.serial():
+            yield profiler
+    finally:
+        if mode == 'cprofile':
+            profiler.disable()
+            summary, data, extension = _cprofile_result(profiler)
+        else:
+            profiler.stop()
+            summary, data, extension = profiler.result(name)
+
+        record = {
+            'id': next(_ids),
+            'at': started_at.strftime('%H:%M:%S'),
+            'page': name,
+            'mode': mode,
+            'duration_ms': (time.perf_counter() - started) * 1000,
+            'summary': summary,
+            'data': data,
+            'filename': f"profile-{started_at:%Y%m%d-%H%M%S}-{name}.{extension}",
+        }
+        with _lock:
+            _profiles.append(record)
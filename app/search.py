@@ -0,0 +1,120 @@
+import re
+from collections import Counter, defaultdict
+
+_NON_WORD = re.compile(r'[^0-9a-zа-я]+')
+
+
+def normalize(text):
+    """Нижний регистр, ё -> е, всё кроме букв и цифр -> пробелы"""
+    return _NON_WORD.sub(' ', str(text).lower().replace('ё', 'е')).strip()
+
+
+def trigrams(text):
+    """
+    Множество триграмм строки (как в pg_trgm: каждое слово дополняется
+    двумя пробелами в начале и одним в конце)
+    """
+    result = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+class NGramIndex:
+    """
+    инвертированный индекс триграмм для нечёткого поиска в памяти
+
+    Запасной вариант для баз без расширения pg_trgm. Оценка совпадения -
+    максимум из сходства строк целиком (similarity) и доли триграмм
+    запроса, найденных в документе (аналог word_similarity).
+    """
+
+    def __init__(self, similarity_threshold=0.3, word_similarity_threshold=0.6):
+        self.similarity_threshold = similarity_threshold
+        self.word_similarity_threshold = word_similarity_threshold
+
+        self._postings = defaultdict(list)
+        self._doc_ids = []
+        self._doc_sizes = []
+        # doc_id -> позиция; у удалённых документов в _doc_ids лежит None
+        self._positions = {}
+        self._removed = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._positions
+
+    def add(self, doc_id, *fields):
+        """Добавляет документ (существующий с тем же doc_id заменяется); поля склеиваются через пробел"""
+        self.remove(doc_id)
+        grams = trigrams(' '.join(str(f) for f in fields))
+        position = len(self._doc_ids)
+        self._doc_ids.append(doc_id)
+        self._doc_sizes.append(len(grams))
+        self._positions[doc_id] = position
+        for gram in grams:
+            self._postings[gram].append(position)
+
+    def remove(self, doc_id):
+        """
+        Удаляет документ. Позиция только помечается пустой; когда пустых
+        больше, чем живых, списки позиций пересобираются (compact).
+        """
+        position = self._positions.pop(doc_id, None)
+        if position is None:
+            return False
+        self._doc_ids[position] = None
+        self._removed += 1
+        if self._removed > len(self._positions):
+            self.compact()
+        return True
+
+    def compact(self):
+        """Убирает удалённые документы из списков позиций"""
+        remap = {}
+        doc_ids, doc_sizes = [], []
+        for position, doc_id in enumerate(self._doc_ids):
+            if doc_id is not None:
+                remap[position] = len(doc_ids)
+                doc_ids.append(doc_id)
+                doc_sizes.append(self._doc_sizes[position])
+
+        postings = defaultdict(list)
+        for gram, positions in self._postings.items():
+            kept = [remap[p] for p in positions if p in remap]
+            if kept:
+                postings[gram] = kept
+
+        self._postings, self._doc_ids, self._doc_sizes = postings, doc_ids, doc_sizes
+        self._positions = {doc_id: position for position, doc_id in enumerate(doc_ids)}
+        self._removed = 0
+
+    def search(self, query, limit=None):
+        """
+        Возвращает список (doc_id, score) по убыванию score
+        """
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._postings.get(gram, ()))
+
+        query_size = len(query_grams)
+        results = []
+        for position, common in shared.items():
+            if self._doc_ids[position] is None:
+                continue
+            similarity = common / (query_size + self._doc_sizes[position] - common)
+            word_similarity = common / query_size
+            if (similarity >= self.similarity_threshold
+                    or word_similarity >= self.word_similarity_threshold):
+                results.append((self._doc_ids[position], max(similarity, word_similarity)))
+
+        results.sort(key=lambda item: -item[1])
+        return results[:limit] if limit else results
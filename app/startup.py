@@ -0,0 +1,113 @@
+"""
+Ускорение холодного старта и перезапусков app.py
+
+lazy_import - модуль импортируется при первом обращении к атрибуту (db,
+pandas и calculator тянут pandas/numpy/pyarrow/psycopg2 - это сотни
+миллисекунд до первой отрисовки). start_warmup - фоновый поток, который
+при первом запуске заранее импортирует db, открывает подключения и
+заполняет кэш справочников. Время старта и накладные расходы перезапусков
+попадают в metrics.
+"""
+import os
+import sys
+import time
+import threading
+import importlib
+
+import metrics
+
+
+class LazyModule:
+    """Заместитель модуля: настоящий import при первом обращении к атрибуту"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            # import_module потокобезопасен (блокировка импорта на модуль)
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'загружен' if self._module is not None else 'не загружен'
+        return f"<lazy module {self._name!r} ({state})>"
+
+
+def lazy_import(name):
+    """Уже импортированный модуль или заместитель LazyModule"""
+    if name in sys.modules:
+        return sys.modules[name]
+    return LazyModule(name)
+
+
+# ---- прогрев -------------------------------------------------------------------
+
+def _warmup():
+    started = time.perf_counter()
+    try:
+        with metrics.timed('app.warmup_import'):
+            import db
+
+        with metrics.timed('app.warmup'):
+            db.ping()
+            db.get_product_types()
+            db.get_material_types()
+            db.get_available_workshops()
+            db.get_workshop_ids()
+            db.get_unique_product_types()
+            db.count_products()
+            db.has_trgm_search()
+
+        print(f"🔥 Прогрев завершён за {time.perf_counter() - started:.2f} с")
+    except Exception as e:
+        print(f"❌ Ошибка прогрева: {e}")
+
+
+def start_warmup():
+    """Запускает прогрев в фоне (если не выключен APP_WARMUP=0); возвращает поток или None"""
+    if os.getenv('APP_WARMUP', '1') == '0':
+        return None
+    thread = threading.Thread(target=_warmup, name='app-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+# ---- таймеры -------------------------------------------------------------------
+
+_first_paint = None
+_first_paint_lock = threading.Lock()
+
+
+def process_uptime():
+    """Секунды с запуска процесса"""
+    import psutil
+
+    return time.time() - psutil.Process().create_time()
+
+
+def record_rerun(script_started, page_started, finished):
+    """
+    Запоминает накладные расходы перезапуска (от начала app.py до страницы)
+    и полное время; при первом перезапуске процесса - время от старта
+    процесса до первой отрисовки
+    """
+    global _first_paint
+
+    metrics.registry.observe('function', 'app.rerun_overhead', page_started - script_started)
+    metrics.registry.observe('function', 'app.rerun_total', finished - script_started)
+
+    with _first_paint_lock:
+        if _first_paint is None:
+            _first_paint = process_uptime()
+            metrics.registry.observe('function', 'app.first_paint', _first_paint)
+            print(f"🚀 Первая отрисовка через {_first_paint:.2f} с после старта процесса")
+
+
+def first_paint():
+    """Секунды от старта процесса до конца первого перезапуска (None - ещё не было)"""
+    return _first_paint
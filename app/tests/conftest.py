@@ -0,0 +1,34 @@
+import os
+import sys
+
+import pytest
+
+# модули приложения импортируются как в app.py - из каталога app
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+from fake_db import FakeDatabase
+
+
+def install(database):
+    """Подставляет FakeDatabase в db.py; возвращает функцию отката"""
+    saved = db.db, db.execute_values
+    db.db, db.execute_values = database, database.execute_values
+    db.cache.clear()
+
+    def restore():
+        db.db, db.execute_values = saved
+        db.cache.clear()
+    return restore
+
+
+@pytest.fixture
+def fake_db():
+    database = FakeDatabase(
+        products={1: 'Стол', 2: 'Шкаф', 3: 'Тумба'},
+        workshops={10: 'Сборочный', 11: 'Покрасочный'},
+        times={100: (1, 10), 101: (2, 11)},
+    )
+    restore = install(database)
+    yield database
+    restore()
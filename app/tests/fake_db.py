@@ -0,0 +1,129 @@
+"""
+Подмена пула подключений db.py для тестов без PostgreSQL
+
+FakeDatabase понимает только те запросы, которые делают пакетные операции
+и обработчики API; таблицы - словари в памяти.
+"""
+import itertools
+from contextlib import contextmanager
+
+
+class FakeCursor:
+
+    def __init__(self, database):
+        self.database = database
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query, params=None):
+        query = ' '.join(query.split())
+        self.database.statements.append(query)
+        data = self.database
+        self.rows = []
+
+        if query == 'SELECT 1':
+            self.rows = [(1,)]
+        elif query.startswith('SELECT COUNT(*) FROM public."Products_import"'):
+            self.rows = [(len(data.products),)]
+        elif query.startswith('DELETE FROM public."Products_import"'):
+            self.rows = [(pid,) for pid in params[0] if data.products.pop(pid, None) is not None]
+        elif query.startswith('DELETE FROM public."Product_workshops_import"'):
+            self.rows = [(rid, data.times.pop(rid)[0]) for rid in params[0] if rid in data.times]
+        elif query.startswith('SELECT "id" FROM public.'):
+            table = data.products if '"Products_import"' in query else data.workshops
+            self.rows = [(row_id,) for row_id in params[0] if row_id in table]
+        elif 'unnest(' in query:
+            table = data.products if '"Products_import"' in query else data.workshops
+            for name in params[0]:
+                found = sorted(row_id for row_id, value in table.items() if value.strip() == name.strip())
+                if found:
+                    self.rows.append((name, found[0]))
+        elif query.startswith('CREATE TEMP TABLE'):
+            pass
+        elif query.startswith('UPDATE public."Products_import"'):
+            self.rows = [(pid,) for pid in data.pending_update if pid in data.products]
+        else:
+            raise AssertionError(f"неожиданный запрос: {query}")
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+
+class FakeConnection:
+
+    def __init__(self, database):
+        self.database = database
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self.database)
+
+    def commit(self):
+        self.database.commits += 1
+
+    def rollback(self):
+        self.database.rollbacks += 1
+
+
+class FakeDatabase:
+    """Вместо db.db: products/workshops - {id: название}, times - {id: (product_id, workshop_id)}"""
+
+    pool_max = 4
+
+    def __init__(self, products=None, workshops=None, times=None):
+        self.products = dict(products or {})
+        self.workshops = dict(workshops or {})
+        self.times = dict(times or {})
+        self.pending_update = []
+        self.statements = []
+        self.commits = 0
+        self.rollbacks = 0
+        self._ids = itertools.count(1000)
+
+    @contextmanager
+    def connection(self):
+        # как DatabaseConnection.connection: commit при выходе, rollback при ошибке
+        conn = FakeConnection(self)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    @contextmanager
+    def cursor(self):
+        with self.connection() as conn:
+            with conn.cursor() as cursor:
+                yield cursor
+
+    def execute_values(self, cursor, sql, argslist, template=None, page_size=100, fetch=False):
+        """Вместо psycopg2.extras.execute_values"""
+        self.statements.append(sql)
+        rows = []
+        if sql.startswith('INSERT INTO products_update'):
+            self.pending_update = [row[0] for row in argslist]
+        elif sql.startswith('INSERT INTO public."Products_import"'):
+            for values in argslist:
+                row_id = next(self._ids)
+                self.products[row_id] = values[1]
+                rows.append((row_id,))
+        elif sql.startswith('INSERT INTO public."Product_workshops_import"'):
+            for product_id, workshop_id, _ in argslist:
+                row_id = next(self._ids)
+                self.times[row_id] = (product_id, workshop_id)
+                rows.append((row_id, product_id))
+        else:
+            raise AssertionError(f"неожиданный запрос: {sql}")
+        return rows if fetch else None
+
+    def deletes(self):
+        return [query for query in self.statements if query.startswith('DELETE')]
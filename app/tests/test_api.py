@@ -0,0 +1,161 @@
+import json
+from unittest import mock
+
+import psycopg2
+from tornado.testing import AsyncHTTPTestCase
+
+import api
+import calculator
+from conftest import install
+from fake_db import FakeDatabase
+
+FACTORS = calculator.FactorTable(
+    [{'name': 'Шкаф', 'coefficient': 1.5}],
+    [{'name': 'Дуб', 'loss_percent': 0.8}],
+)
+
+PRODUCT = {
+    'product_type': 'Мебель',
+    'name': 'Кресло',
+    'article': 123,
+    'min_price': 1000.0,
+    'main_material': 'Дуб',
+}
+
+
+class APITestCase(AsyncHTTPTestCase):
+
+    def setUp(self):
+        self.database = FakeDatabase(
+            products={1: 'Стол', 2: 'Шкаф'},
+            workshops={10: 'Сборочный'},
+            times={100: (1, 10)},
+        )
+        self.addCleanup(install(self.database))
+        patcher = mock.patch.object(calculator, 'get_factor_table', return_value=FACTORS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def get_app(self):
+        return api.make_app()
+
+    def request(self, method, path, payload=None, body=None):
+        if payload is not None:
+            body = json.dumps(payload)
+        elif body is None and method in ('POST', 'PUT'):
+            body = ''
+        response = self.fetch(path, method=method, body=body)
+        data = json.loads(response.body) if response.body else None
+        return response, data
+
+    def test_health(self):
+        response, data = self.request('GET', '/api/health')
+        self.assertEqual(response.code, 200)
+        self.assertEqual(data, {'status': 'ok', 'products': 2})
+
+    def test_health_unavailable(self):
+        with mock.patch.object(api.db, 'ping', side_effect=psycopg2.OperationalError('нет связи')):
+            response, data = self.request('GET', '/api/health')
+        self.assertEqual(response.code, 503)
+        self.assertEqual(data['status'], 'unavailable')
+
+    def test_create_products(self):
+        response, data = self.request('POST', '/api/products', [PRODUCT, PRODUCT])
+        self.assertEqual(response.code, 201)
+        self.assertEqual(len(data['ids']), 2)
+
+    def test_create_product_invalid(self):
+        response, data = self.request('POST', '/api/products', {**PRODUCT, 'article': 'abc'})
+        self.assertEqual(response.code, 400)
+        self.assertIn('article', data['error'])
+
+    def test_create_product_not_json(self):
+        response, _ = self.request('POST', '/api/products', body='{')
+        self.assertEqual(response.code, 400)
+
+    def test_update_product(self):
+        response, data = self.request('PUT', '/api/products/1', {'min_price': 5})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(data, {'id': 1, 'updated': True})
+
+    def test_update_product_not_found(self):
+        response, _ = self.request('PUT', '/api/products/99', {'min_price': 5})
+        self.assertEqual(response.code, 404)
+
+    def test_update_product_without_fields(self):
+        response, _ = self.request('PUT', '/api/products/1', {'unknown': 5})
+        self.assertEqual(response.code, 400)
+
+    def test_delete_product(self):
+        response, _ = self.request('DELETE', '/api/products/2')
+        self.assertEqual(response.code, 204)
+        self.assertNotIn(2, self.database.products)
+
+        response, _ = self.request('DELETE', '/api/products/2')
+        self.assertEqual(response.code, 404)
+
+    def test_id_out_of_range(self):
+        for method, path in (('GET', '/api/products/99999999999'),
+                             ('PUT', '/api/products/99999999999'),
+                             ('DELETE', '/api/products/2147483648'),
+                             ('GET', '/api/products/99999999999/production-times'),
+                             ('DELETE', '/api/production-times/99999999999')):
+            with self.subTest(method=method, path=path):
+                response, _ = self.request(method, path, {'min_price': 5} if method == 'PUT' else None)
+                self.assertEqual(response.code, 404)
+        # до базы такой id не доходит
+        self.assertEqual(self.database.statements, [])
+
+    def test_add_production_time(self):
+        response, data = self.request('POST', '/api/products/2/production-times',
+                                      {'workshop_name': 'Сборочный', 'production_time': 1.5})
+        self.assertEqual(response.code, 201)
+        self.assertEqual(self.database.times[data['id']], (2, 10))
+
+    def test_add_production_time_unknown_workshop(self):
+        response, _ = self.request('POST', '/api/products/2/production-times',
+                                   {'workshop_id': 77, 'production_time': 1.5})
+        self.assertEqual(response.code, 404)
+
+    def test_add_production_time_invalid(self):
+        response, _ = self.request('POST', '/api/products/2/production-times',
+                                   {'workshop_id': 10, 'production_time': -1})
+        self.assertEqual(response.code, 400)
+
+    def test_delete_production_time(self):
+        response, _ = self.request('DELETE', '/api/production-times/100')
+        self.assertEqual(response.code, 204)
+
+        response, _ = self.request('DELETE', '/api/production-times/100')
+        self.assertEqual(response.code, 404)
+
+    def test_calculate(self):
+        payload = {'product_type': 'Шкаф', 'material': 'Дуб', 'param1': 2, 'param2': 3, 'quantity': 10}
+        response, data = self.request('POST', '/api/calculate', payload)
+        self.assertEqual(response.code, 200)
+        self.assertEqual(data['raw_material'], calculator.calculate_raw_material(2, 3, 1.5, 0.8, 10))
+        # тот же URL отдаёт и Arrow - кэш должен различать ответы по Accept
+        self.assertIn('Accept', [value.strip() for value in response.headers['Vary'].split(',')])
+
+    def test_calculate_errors(self):
+        payload = {'product_type': 'Шкаф', 'material': 'Дуб', 'param1': 2, 'param2': 3, 'quantity': 10}
+        for changes in ({'quantity': 0}, {'param1': 'abc'}, {'material': 'Сосна'},
+                        {'quantity': float('inf')}, {'param1': float('inf')}):
+            with self.subTest(changes=changes):
+                response, _ = self.request('POST', '/api/calculate', {**payload, **changes})
+                self.assertEqual(response.code, 400)
+
+        response, _ = self.request('POST', '/api/calculate', {'product_type': 'Шкаф'})
+        self.assertEqual(response.code, 400)
+
+    def test_calculate_batch(self):
+        items = [
+            {'product_type': 'Шкаф', 'material': 'Дуб', 'param1': 2, 'param2': 3, 'quantity': 10},
+            {'product_type': 'Шкаф', 'material': 'Сосна', 'param1': 2, 'param2': 3, 'quantity': 10},
+        ]
+        response, data = self.request('POST', '/api/calculate', {'items': items})
+        self.assertEqual(response.code, 200)
+        self.assertEqual(data['rows'], 2)
+        self.assertEqual(data['invalid_rows'], 1)
+        self.assertEqual(data['items'][0]['raw_material'], calculator.calculate(**items[0], factors=FACTORS))
@@ -0,0 +1,120 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import calculator
+
+PRODUCT_TYPES = [
+    {'name': 'Шкаф', 'coefficient': 1.5},
+    {'name': 'Стол', 'coefficient': 2.35},
+    {'name': 'Полка', 'coefficient': 1.5},
+]
+MATERIAL_TYPES = [
+    {'name': 'Дуб', 'loss_percent': 0.8},
+    {'name': 'Сосна', 'loss_percent': 0.55},
+]
+FACTORS = calculator.FactorTable(PRODUCT_TYPES, MATERIAL_TYPES)
+
+
+def test_factor_table_completeness():
+    assert FACTORS.is_complete()
+    assert not calculator.FactorTable(PRODUCT_TYPES, []).is_complete()
+    assert not calculator.FactorTable([], MATERIAL_TYPES).is_complete()
+
+
+def test_memo_shared_by_equal_coefficients():
+    calculator._memo_raw_material.cache_clear()
+    first = calculator.calculate('Шкаф', 'Дуб', 2.5, 3, 7, FACTORS)
+    # у полки тот же коэффициент - расчёт берётся из памяти
+    second = calculator.calculate('Полка', 'Дуб', 2.5, 3, 7, FACTORS)
+
+    assert first == second == calculator.calculate_raw_material(2.5, 3, 1.5, 0.8, 7)
+    assert calculator.memo_stats()['hits'] == 1
+
+
+def _plan(rows):
+    return pd.DataFrame(rows, columns=calculator.BATCH_COLUMNS)
+
+
+def test_batch_matches_scalar_formula():
+    rng = np.random.default_rng(7)
+    size = 2000
+    plan = _plan({
+        'product_type': rng.choice(['Шкаф', 'Стол', 'Полка'], size),
+        'material': rng.choice(['Дуб', 'Сосна'], size),
+        'param1': rng.uniform(0, 50, size).round(2),
+        'param2': rng.uniform(0, 50, size).round(2),
+        'quantity': rng.integers(1, 500, size),
+    })
+    coefficients = {pt['name']: pt['coefficient'] for pt in PRODUCT_TYPES}
+    losses = {mt['name']: mt['loss_percent'] for mt in MATERIAL_TYPES}
+
+    result = calculator.calculate_raw_material_batch(plan, factors=FACTORS)
+
+    expected = [
+        calculator.calculate_raw_material(row.param1, row.param2, coefficients[row.product_type],
+                                          losses[row.material], row.quantity)
+        for row in plan.itertuples()
+    ]
+    assert result['raw_material'].tolist() == expected
+    assert (result['error'] == '').all()
+
+
+def test_batch_reports_invalid_rows():
+    plan = _plan([
+        ('Шкаф', 'Дуб', 2, 3, 10),
+        ('Диван', 'Дуб', 2, 3, 10),
+        ('Шкаф', 'Мрамор', 2, 3, 10),
+        ('Шкаф', 'Дуб', -1, 3, 10),
+        ('Шкаф', 'Дуб', 2, 3, 0),
+        ('Шкаф', 'Дуб', float('inf'), 3, 10),
+        ('Шкаф', 'Дуб', 'abc', 3, 10),
+    ])
+
+    result = calculator.calculate_raw_material_batch(plan, factors=FACTORS)
+
+    errors = calculator.BATCH_ERRORS
+    assert result['error'].tolist() == ['', errors['type'], errors['material']] + [errors['params']] * 4
+    assert result['raw_material'].isna().tolist() == [False] + [True] * 6
+    assert calculator.summarize_batch(result) == {
+        'rows': 7,
+        'invalid_rows': 6,
+        'total_raw_material': calculator.calculate_raw_material(2, 3, 1.5, 0.8, 10),
+    }
+
+
+def test_batch_categorical_columns():
+    plan = _plan([
+        ('Стол', 'Сосна', 2, 3, 10),
+        ('Диван', 'Дуб', 2, 3, 10),
+        ('Шкаф', 'Дуб', 2, 3, 10),
+    ]).astype({'product_type': 'category', 'material': 'category'})
+
+    result = calculator.calculate_raw_material_batch(plan, factors=FACTORS)
+
+    assert result['raw_material'].tolist() == [
+        calculator.calculate_raw_material(2, 3, 2.35, 0.55, 10),
+        pd.NA,
+        calculator.calculate_raw_material(2, 3, 1.5, 0.8, 10),
+    ]
+    assert result['error'].tolist() == ['', calculator.BATCH_ERRORS['type'], '']
+
+
+def test_batch_missing_columns():
+    with pytest.raises(ValueError, match='quantity'):
+        calculator.calculate_raw_material_batch(pd.DataFrame({'product_type': ['Шкаф']}), factors=FACTORS)
+
+
+@pytest.mark.parametrize('text', [
+    'Тип продукции;Материал;Параметр 1;Параметр 2;Количество\nШкаф;Дуб;2;3;10\n',
+    # BOM от Excel
+    '\ufeffproduct_type,material,param1,param2,quantity\nШкаф,Дуб,2,3,10\n',
+])
+def test_read_batch_csv(text):
+    plan = calculator.read_batch_csv(io.BytesIO(text.encode('utf-8')))
+
+    assert plan.columns.tolist() == calculator.BATCH_COLUMNS
+    result = calculator.calculate_raw_material_batch(plan, factors=FACTORS)
+    assert result['raw_material'].tolist() == [calculator.calculate_raw_material(2, 3, 1.5, 0.8, 10)]
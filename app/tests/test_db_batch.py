@@ -0,0 +1,116 @@
+import db
+
+PRODUCT = {
+    'product_type': 'Мебель',
+    'name': 'Кресло',
+    'article': 123,
+    'min_price': 1000.0,
+    'main_material': 'Дуб',
+}
+
+
+def test_add_products_many_atomic_rolls_back_on_bad_row(fake_db):
+    result = db.add_products_many([PRODUCT, {**PRODUCT, 'article': 'abc'}])
+
+    assert result.failed == [(1, "некорректное значение article: 'abc'")]
+    assert result.ok == []
+    assert not result.committed
+    assert fake_db.rollbacks == 1
+    assert len(fake_db.products) == 3
+
+
+def test_add_products_many_partial(fake_db):
+    result = db.add_products_many([{**PRODUCT, 'min_price': -1}, PRODUCT], atomic=False)
+
+    assert result.failed == [(0, "отрицательное значение min_price")]
+    assert len(result.ok) == 1
+    assert result.committed
+    assert fake_db.products[result.ok[0]] == 'Кресло'
+
+
+def test_update_products_many_reports_each_bad_row(fake_db):
+    result = db.update_products_many([
+        {'id': 1, 'min_price': 10},
+        {'id': 'x', 'min_price': 10},
+        {'id': 1, 'min_price': 20},
+        {'id': 99, 'min_price': 10},
+        {'min_price': 10},
+    ], atomic=False)
+
+    assert result.ok == [1]
+    assert result.failed == [
+        (1, "некорректное значение id: 'x'"),
+        (2, "id 1 повторяется"),
+        (3, "продукт 99 не найден"),
+        (4, "не указан id"),
+    ]
+    assert result.committed
+
+
+def test_update_products_many_without_fields(fake_db):
+    result = db.update_products_many([{'id': 1}, {'id': 2}])
+
+    assert result.ok == []
+    assert result.failed == [(0, "нет полей для обновления"), (1, "нет полей для обновления")]
+    assert not result.committed
+    assert not result.success
+
+
+def test_delete_products_many_validates_and_dedupes(fake_db):
+    result = db.delete_products_many([1, 1, 'abc', None, 99, 2], atomic=False)
+
+    assert result.ok == [1, 2]
+    assert result.failed == [
+        (2, "некорректное значение id: 'abc'"),
+        (3, "не указан id"),
+        (4, "продукт 99 не найден"),
+    ]
+    assert fake_db.products == {3: 'Тумба'}
+
+
+def test_delete_products_many_atomic_skips_delete_on_bad_id(fake_db):
+    result = db.delete_products_many([1, 'abc'])
+
+    assert result.failed == [(1, "некорректное значение id: 'abc'")]
+    assert not result.committed
+    assert fake_db.deletes() == []
+    assert 1 in fake_db.products
+
+
+def test_add_production_times_many_bad_ids_go_to_failed(fake_db):
+    result = db.add_production_times_many([
+        {'product_id': 'x', 'workshop_id': 10, 'production_time': 1},
+        {'product_id': 1, 'workshop_id': [10], 'production_time': 1},
+        {'product_id': 1, 'workshop_name': 'Нет такого', 'production_time': 1},
+        {'product_name': 'Шкаф ', 'workshop_name': 'Сборочный', 'production_time': 2.5},
+        {'product_id': 3, 'production_time': 1},
+    ], atomic=False)
+
+    assert result.failed == [
+        (0, "некорректное значение product_id: 'x'"),
+        (1, "некорректное значение workshop_id: [10]"),
+        (2, "цех не найден"),
+        (4, "не указан цех"),
+    ]
+    assert len(result.ok) == 1
+    assert fake_db.times[result.ok[0]] == (2, 10)
+
+
+def test_add_production_times_many_atomic(fake_db):
+    result = db.add_production_times_many([
+        {'product_id': 1, 'workshop_id': 11, 'production_time': 1},
+        {'product_id': 42, 'workshop_id': 11, 'production_time': 1},
+    ])
+
+    assert result.failed == [(1, "продукт не найден")]
+    assert result.ok == []
+    assert not result.committed
+    assert len(fake_db.times) == 2
+
+
+def test_delete_production_times_many_validates_and_dedupes(fake_db):
+    result = db.delete_production_times_many(['100', 100, 'x', 555], atomic=False)
+
+    assert result.ok == [100]
+    assert result.failed == [(2, "некорректное значение id: 'x'"), (3, "запись 555 не найдена")]
+    assert fake_db.times == {101: (2, 11)}
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+import db
+
+
+def test_compact_frame_keeps_money_float64():
+    df = db.compact_frame(pd.DataFrame({
+        'id': [1, 2],
+        'min_price': [160507.0, 2500.5],
+        'production_time_h': [1.5, 2.0],
+    }))
+
+    assert df['min_price'].dtype == np.float64
+    assert df['production_time_h'].dtype == np.float32
+    assert df['id'].dtype == np.int8
+
+
+def test_reprice_compacted_frame():
+    # как «Изменить цену» в display_bulk_edit
+    df = db.compact_frame(pd.DataFrame({'id': [1], 'min_price': [160507.0]}))
+    repriced = (df['min_price'] * 1.1).round(2)
+
+    assert repriced.tolist() == [176557.7]
+
+
+def _cached_frame():
+    return db.compact_frame(pd.DataFrame({
+        'id': [1, 2, 3],
+        'product_type': ['Шкафы', 'Шкафы', 'Столы'],
+        'name': ['Шкаф', 'Шкаф-купе', 'Стол'],
+        'article': [101, 102, 103],
+        'min_price': [1000.0, 2000.0, 3000.0],
+        'production_time_h': [1.5, 2.0, 0.0],
+    }), category_ratio=0.7)
+
+
+def _changed(rows):
+    columns = ['id', 'product_type', 'name', 'article', 'min_price', 'production_time_h']
+    return pd.DataFrame(rows, columns=columns)
+
+
+def test_merge_products_upserts_and_deletes():
+    df = _cached_frame()
+    changed = _changed([(2, 'Шкафы', 'Шкаф-купе 2', 102, 2100.0, 2.0),
+                        (4, 'Столы', 'Стол письменный', 104, 4000.0, 1.0)])
+
+    merged = db.merge_products(df, changed, {2, 3, 4})
+
+    assert merged['id'].tolist() == [1, 2, 4]
+    assert merged['name'].tolist() == ['Шкаф', 'Шкаф-купе 2', 'Стол письменный']
+    assert merged['min_price'].tolist() == [1000.0, 2100.0, 4000.0]
+    # исходный кадр не меняется
+    assert df['id'].tolist() == [1, 2, 3]
+
+
+def test_merge_products_widens_compacted_dtype():
+    df = _cached_frame()
+    assert df['article'].dtype == np.int8
+
+    changed = _changed([(5, 'Шкафы', 'Шкаф большой', 70000, 5000.0, 1.0 / 3)])
+    merged = db.merge_products(df, changed, {5})
+
+    assert merged['article'].tolist() == [101, 102, 103, 70000]
+    assert merged['production_time_h'].iloc[-1] == 1.0 / 3
+
+
+def test_merge_products_new_category():
+    df = _cached_frame()
+    assert isinstance(df['product_type'].dtype, pd.CategoricalDtype)
+
+    changed = _changed([(1, 'Кресла', 'Кресло', 101, 1000.0, 1.5)])
+    merged = db.merge_products(df, changed, {1})
+
+    assert isinstance(merged['product_type'].dtype, pd.CategoricalDtype)
+    assert merged['product_type'].tolist() == ['Кресла', 'Шкафы', 'Столы']
+
+
+def test_clean_price():
+    values = pd.Series(['12 500 руб.', '1 234,50 ₽', '12,500', '12,500.75', '1,5',
+                        '', None, 'договорная', '1.2.3', '100', 250, -5.5], dtype=object)
+
+    prices, coerced = db.clean_price(values)
+
+    assert prices.tolist() == [12500.0, 1234.5, 12500.0, 12500.75, 1.5,
+                               0.0, 0.0, 0.0, 0.0, 100.0, 250.0, -5.5]
+    # числа и числовые строки не считаются
+    assert coerced == 9
+
+
+def test_clean_price_without_text():
+    prices, coerced = db.clean_price(pd.Series([None, 10.0, float('nan')], dtype=object))
+
+    assert prices.tolist() == [0.0, 10.0, 0.0]
+    assert coerced == 2
+
+
+def test_normalize_products_counts_coerced_rows():
+    df = db._normalize_products_df(pd.DataFrame({
+        'id': ['1', '2', '3'],
+        'article': ['101', 'x', None],
+        'min_price': ['1 000 руб.', 2000, 'нет'],
+    }))
+
+    assert df['id'].tolist() == [1, 2, 3]
+    assert df['article'].tolist() == [101, 0, 0]
+    assert df['min_price'].tolist() == [1000.0, 2000.0, 0.0]
+    assert df.attrs['coerced_rows'] == 2
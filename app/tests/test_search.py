@@ -0,0 +1,69 @@
+import pytest
+
+from search import NGramIndex, normalize
+
+PRODUCTS = {
+    1: ('Комплект мебели для гостиной Ольха горная', 1549922),
+    2: ('Стенка для гостиной Вишня темная', 1018556),
+    3: ('Прихожая Венге Винтаж', 3028272),
+    4: ('Тумба с вешалкой Дуб натуральный', 3029272),
+    5: ('Кровать с подъемным механизмом с матрасом 1600х2000 Венге', 6026662),
+    6: ('Ёлочная полка', 5000001),
+}
+
+
+@pytest.fixture
+def index():
+    # как _update_search_index: название и артикул
+    index = NGramIndex()
+    for product_id, (name, article) in PRODUCTS.items():
+        index.add(product_id, name, str(article))
+    return index
+
+
+def ids(matches):
+    return [doc_id for doc_id, _ in matches]
+
+
+def test_normalize():
+    assert normalize('Ёлочная  полка, 1600х2000!') == 'елочная полка 1600х2000'
+
+
+@pytest.mark.parametrize('query, expected', [
+    ('стенко', [2]),
+    ('вишня темня', [2]),
+    ('елочная', [6]),
+    ('ЁЛОЧНАЯ', [6]),
+    ('1018', [2]),
+    ('10185', [2]),
+])
+def test_search_finds_typos_and_article_prefixes(index, query, expected):
+    assert ids(index.search(query)) == expected
+
+
+@pytest.mark.parametrize('query', ['холодильник', 'зззз', '', '!!!'])
+def test_search_no_match(index, query):
+    assert index.search(query) == []
+
+
+def test_search_ranking(index):
+    assert sorted(ids(index.search('венге'))) == [3, 5]
+
+    matches = index.search('прихожая венге')
+    assert ids(matches)[0] == 3
+    assert matches == sorted(matches, key=lambda item: -item[1])
+    assert ids(index.search('прихожая венге', limit=1)) == [3]
+
+
+def test_add_replaces_and_remove(index):
+    index.add(2, 'Шкаф-купе', '1018556')
+    assert ids(index.search('стенка')) == []
+    assert ids(index.search('шкаф купе')) == [2]
+
+    for product_id in (1, 2, 3, 4):
+        assert index.remove(product_id)
+    assert not index.remove(1)
+    # удалённых больше, чем живых - индекс пересобран
+    assert len(index) == 2
+    assert sorted(ids(index.search('венге'))) == [5]
+    assert ids(index.search('полка')) == [6]